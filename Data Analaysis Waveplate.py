@@ -1,24 +1,27 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
+import os
+from waveplate_fit import fit_model, model_function
+from calibration import CalibrationStore
 
-# Define the new model function
-def model_function(x, a, b, c, d):
-    return a * (np.cos(2 * np.pi * x / b - d))**2 + c
+scan_file = "C:/Users/jacob/Downloads/voltage_vs_step.txt"
+rig = os.environ.get('WAVEPLATE_PORT', 'COM6')  # Rig the scan was taken on (its serial port)
+# Step position of the motor now, in the scan's x (0 once Step_size_vs_intensity.ino went back
+# to its origin and the motor was not moved since); None if not known
+motor_position = None
 
 # Read data from the text file
 # Assuming the file has two columns separated by space
-data = pd.read_csv("C:/Users/jacob/Downloads/voltage_vs_step.txt", sep='\s+', header=None)
+data = pd.read_csv(scan_file, sep='\s+', header=None)
 data.columns = ['x', 'y']
 
 # Extract x and y values
 x_data = data['x'].values
 y_data = data['y'].values
 
-# Fit the model to the data
-initial_guess = [1.6, 600, 0.1, 50]  # Initial guess for the parameters
-params, params_covariance = curve_fit(model_function, x_data, y_data, p0=initial_guess)
+# Fit the model to the data (initial guess estimated from the data, analytic Jacobian)
+params, params_covariance, nfev = fit_model(x_data, y_data)
 
 # Extract fitted parameters
 a, b, c, d = params
@@ -33,6 +36,15 @@ mse = np.mean((y_fitted - y_data)**2)
 percent_difference = np.abs((y_fitted - y_data) / y_data) * 100
 average_percent_difference = np.mean(percent_difference)
 
+# Store the fit as the rig's current calibration (GUI.py loads it at startup); motor_position
+# is the step counter GUI.py restores after connecting
+store = CalibrationStore()
+store.invalidate(rig)
+store.add(rig, params, params_covariance, source=scan_file, position=motor_position)
+if motor_position is None:
+    print("Calibration stored without a step position: GUI.py does not use it until the position is "
+          "set with CalibrationStore().set_position()")
+
 # Plot the data and the fitted function
 plt.figure(figsize=(10, 6))
 plt.plot(x_data, y_data, 'o-', label='Data points')  # 'o-' for line connecting points
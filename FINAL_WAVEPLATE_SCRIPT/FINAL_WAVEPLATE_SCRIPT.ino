@@ -6,16 +6,45 @@ const byte motorEnablePin = 7; // Motor enable pin (HIGH: motor on, LOW: motor o
 const int sensorPin = A0; // Input pin for photodetector
 
 // Constants for PID
-const double pidSampleTime = 2000; // PID sample time in milliseconds
+double pidSampleTime = 2000; // PID sample time in milliseconds (modifiable via serial command)
 const double outputLimitMin = -40; // Minimum output limit for PID
 const double outputLimitMax = 40; // Maximum output limit for PID
-const unsigned long readInterval = 50; // Interval for reading sensor input in milliseconds (adjustable)
+unsigned long readInterval = 50; // Current interval for reading sensor input in milliseconds (chosen below)
 const double tolerance = 0.01; // Tolerance for floating-point comparison
 const double minStepSize = 0; // Minimum step size required to move the motor
 
+// Acquisition stage: every read averages oversampleCount conversions, then optionally filters them.
+// Reads are fast while the error is outside the tolerance and slow once locked.
+int oversampleCount = 16; // analogRead() conversions averaged per reading, 1-64 (serial command 'N')
+int filterMode = 0; // 0: none, 1: IIR low-pass, 2: median of the last 5 readings (serial command 'L')
+double filterAlpha = 0.3; // IIR coefficient, 0-1; smaller filters more (serial command 'A')
+unsigned long settlingReadInterval = 20; // Read interval while settling in ms (serial command 'R')
+unsigned long lockedReadInterval = 200; // Read interval while within tolerance in ms (serial command 'Q')
+const unsigned long filterReportInterval = 1000; // Interval between filter/noise reports in ms
+double noiseFloor = 0; // Running standard deviation of the filtered voltage (V)
+double noiseMean = 0, noiseVariance = 0; // Exponentially weighted mean and variance of the filtered voltage
+bool noisePrimed = false;
+const double noiseWeight = 0.1; // Weight of the newest reading in the noise floor (about the last 10 readings)
+double medianWindow[5]; // Last readings for the median filter
+int medianCount = 0, medianNext = 0;
+bool filterPrimed = false; // The IIR filter starts from the first reading
+unsigned long previousReportMillis = 0;
+
 double targetSetpoint = 2; // Target setpoint for PID control (must be within photodiode range)
 double currentInput, currentOutput, currentVoltage, errorGap;
-int off = 0;
+bool pidEnabled = true; // PID state; 'E0' also stops any motion in progress (modifiable via serial command)
+bool binaryTelemetry = false; // Text (false) or binary (true) telemetry (modifiable via serial command 'F')
+unsigned int telemetrySeq = 0; // Sequence number of the binary telemetry frames
+const unsigned long telemetryInterval = 100; // Longest gap between telemetry records in ms (10/s fits 9600 baud)
+unsigned long lastTelemetryMillis = 0;
+long motorPosition = 0; // Absolute step counter (direction 0 counts up); the host's calibration refers to it
+
+// Feedforward mode: the host sends its calibration of the photodiode voltage against motorPosition,
+// V = modelA * cos^2(2 pi x / modelB - modelD) + modelC, and corrections move straight to the step
+// position that gives the setpoint instead of probing for the direction.
+int controlMode = 0; // 0: PID with direction probing, 1: feedforward (modifiable via serial command 'M')
+double modelA = 0, modelB = 0, modelC = 0, modelD = 0; // Model parameters (serial commands 'a', 'b', 'c', 'd')
+const double maxModelResidual = 0.2; // Fall back to probing when the reading is further than this from the model
 
 // Define the PID tuning parameters
 double Kp = 3, Ki = 0.3, Kd = 0.0;
@@ -25,67 +54,581 @@ PID myPID(&currentVoltage, &currentOutput, &targetSetpoint, Kp, Ki, Kd, DIRECT);
 
 unsigned long previousMillis = 0; // Stores the last time the sensor was read
 
+// Motion runs as a millis()-driven state machine (enable -> settle -> step -> settle -> disable),
+// advanced once per loop() so sampling, telemetry and commands carry on while the motor moves
+enum MotionState { MOTION_IDLE, MOTION_ENABLE_SETTLE, MOTION_STEPPING, MOTION_STOP_SETTLE };
+MotionState motionState = MOTION_IDLE;
+const unsigned long motorSettleTime = 100; // Wait after enabling and after the last step in ms
+const unsigned long stepInterval = 2; // Time between single steps in ms
+long stepsRemaining = 0;
+int stepDirection = 0;
+bool holdEnabled = false; // Keep the motor enabled after this move because another one follows
+bool motorEnabled = false;
+unsigned long motionMillis = 0; // Start of the current settle, or time of the last step
+
+// A PID correction is a sequence of moves: probe forward, probe back, then the correction
+// itself (or only the correction in feedforward mode). No new correction starts until it ends.
+enum CorrectionState { CORRECTION_IDLE, CORRECTION_PROBE_OUT, CORRECTION_PROBE_BACK, CORRECTION_MOVE };
+CorrectionState correctionState = CORRECTION_IDLE;
+const long probeSteps = 12; // Steps of the direction probe
+long correctionSteps = 0; // Step size of the correction waiting for the probe
+int correctionDirection = 0;
+
+const unsigned int serialBufferSize = 96; // Longest command line accepted (command_channel.MAX_FRAME_LENGTH)
+String serialBuffer = ""; // Command line received so far
+bool serialOverflow = false; // The line being received is longer than serialBufferSize
+
+int measureRequest = 0; // Readings to average for a requested scan point once the motor is idle (serial command 'Y')
+const int measureConversionsPerLoop = 16; // analogRead() conversions of a scan point taken per loop() (about 2 ms)
+long measureRemaining = 0; // Conversions of the scan point still to take; 0 before it starts
+long measureTotal = 0, measureSum = 0;
+
+// Overvoltage interlock: a single conversion every interlockInterval ms, independent of the read
+// interval, the filter and serial traffic. tripCount consecutive readings above tripLevel latch a
+// fault that disables the PID and the motor; it is only cleared by 'K1', and only once the voltage
+// is back below clearLevel. The fault is reported on the trip and then with every filter report.
+double tripLevel = 4.0; // Fault threshold in V (serial command 'H')
+double clearLevel = 3.8; // Voltage below which the fault may be cleared (serial command 'G')
+const unsigned long interlockInterval = 1; // Time between interlock checks in ms
+const int tripCount = 2; // Consecutive readings above tripLevel that trip the interlock
+bool faultLatched = false;
+int overCount = 0; // Consecutive readings above tripLevel so far
+double interlockVoltage = 0; // Last interlock reading
+double faultVoltage = 0; // Reading that tripped the interlock
+unsigned long previousInterlockMicros = 0;
+unsigned long overSinceMicros = 0; // Time of the first reading above tripLevel
+unsigned long tripLatencyMicros = 0; // First reading above tripLevel -> PID and motor off
+
 void setup() {
   Serial.begin(9600);
   pinMode(motorEnablePin, OUTPUT);
 
   // Initialize the PID controller with the configured parameters
   setupPID();
+  serialBuffer.reserve(serialBufferSize);
 
   myProDriver.begin(); // Initialize the motor driver with default settings
 }
 
 void loop() {
-  if (off = 1){
   unsigned long currentMillis = millis();
 
+  checkInterlock(); // First, so nothing below can delay a trip
   updateParameters(); // Check for serial input
+  updateMotion(currentMillis); // Advance the motor by at most one step
+  updateCorrection(); // Start the next move of a correction once the previous one is done
+
+  // Measure a requested scan point once the motor has stopped and settled, a few conversions
+  // per loop() so commands, motion and the interlock keep running meanwhile
+  if (measureRequest > 0) {
+    if (motionState == MOTION_IDLE && correctionState == CORRECTION_IDLE) {
+      updateMeasurement();
+    } else {
+      measureRemaining = 0; // The motor moved again: start over once it stops
+    }
+  }
+
+  // Report the acquisition settings, noise floor and step position so the host can see them
+  if (currentMillis - previousReportMillis >= filterReportInterval) {
+    previousReportMillis = currentMillis;
+    sendFilterReport();
+    sendPositionReport(); // The host restores the step counter from it ('Z') after a reset
+    if (faultLatched) {
+      sendFault(); // Repeated so a host that missed the trip still sees the fault
+    }
+  }
 
   // Measure input and calculate voltage every readInterval milliseconds
   if (currentMillis - previousMillis >= readInterval) {
     previousMillis = currentMillis;
 
-    // Read the sensor input and calculate the corresponding voltage
-    currentInput = analogRead(sensorPin);
-    currentVoltage = (5.0 / 1023.0) * currentInput;
+    // Read the oversampled, filtered sensor input
+    currentVoltage = readSensorVoltage();
+    currentInput = currentVoltage * (1023.0 / 5.0);
     
     // Calculate the error gap between the target setpoint and the current voltage
     errorGap = (targetSetpoint - currentVoltage);
 
+    // Sample fast while settling and slowly once locked
+    readInterval = (abs(errorGap) >= tolerance) ? settlingReadInterval : lockedReadInterval;
+
     // Check if the error gap is greater than the tolerance and compute PID if true
-    if ((abs(errorGap) >= tolerance) && myPID.Compute()) {
-      double stepSize = round(50 * abs(currentOutput));
-
-      // Only move the motor if the step size is greater than the minimum step size
-      if (stepSize > minStepSize) {
-        enableMotor();
-        delay(100);
-        myProDriver.step(stepSize, getMotorDirection()); // Use output of PID to determine number of steps
-        delay(100);
-        disableMotor();
+    // (only between corrections, so the PID sees the result of its last move)
+    if (pidEnabled && correctionState == CORRECTION_IDLE && (abs(errorGap) >= tolerance) && myPID.Compute()) {
+      double stepSize;
+
+      if (controlMode == 1 && modelValid() && abs(currentVoltage - modelVoltage(motorPosition)) <= maxModelResidual) {
+        // Feedforward: move directly to the step position the model predicts for the setpoint
+        long target = feedforwardTarget();
+        stepSize = abs(target - motorPosition);
+        moveTo(target);
+      } else {
+        stepSize = round(50 * abs(currentOutput));
+
+        // Only move the motor if the step size is greater than the minimum step size;
+        // the direction is found by probing first (see updateCorrection())
+        if (stepSize > minStepSize) {
+          correctionSteps = stepSize;
+          correctionState = CORRECTION_PROBE_OUT;
+          startMove(probeSteps, 0, true); // Step the motor in one direction
+        }
       }
-    Serial.print("Voltage:");
-    Serial.print(currentVoltage);
-    Serial.print(" output:");
-    Serial.print(currentOutput);
-    Serial.print(" stepsize:");
-    Serial.print(stepSize);
-    Serial.print(" Error:");
-    Serial.println(errorGap);
+    sendTelemetry(stepSize);
+
+    }
 
+    // Without a PID update (PID off, locked within tolerance, interlock latched) report the
+    // reading anyway at least every telemetryInterval, so the host's plots and interlock
+    // always see the voltage
+    if (millis() - lastTelemetryMillis >= telemetryInterval) {
+      sendTelemetry(0);
     }
   }
 }
+
+// Function to start a move; replaces any move in progress (the position stays exact
+// because motorPosition is updated on every step)
+void startMove(long steps, int direction, bool hold) {
+  stepsRemaining = steps;
+  stepDirection = direction;
+  holdEnabled = hold;
+  motionMillis = millis();
+  if (motorEnabled) {
+    motionState = MOTION_STEPPING;
+  } else {
+    enableMotor();
+    motionState = MOTION_ENABLE_SETTLE;
+  }
+}
+
+// Function to advance the motion state machine; never blocks for more than one step
+void updateMotion(unsigned long now) {
+  switch (motionState) {
+    case MOTION_IDLE:
+      break;
+    case MOTION_ENABLE_SETTLE:
+      if (now - motionMillis >= motorSettleTime) {
+        motionState = MOTION_STEPPING;
+        motionMillis = now;
+      }
+      break;
+    case MOTION_STEPPING:
+      if (stepsRemaining <= 0) {
+        motionState = MOTION_STOP_SETTLE;
+        motionMillis = now;
+      } else if (now - motionMillis >= stepInterval) {
+        moveMotor(1, stepDirection);
+        stepsRemaining--;
+        motionMillis = now;
+      }
+      break;
+    case MOTION_STOP_SETTLE:
+      if (now - motionMillis >= motorSettleTime) {
+        if (!holdEnabled) {
+          disableMotor();
+        }
+        motionState = MOTION_IDLE;
+      }
+      break;
+  }
+}
+
+// Function to stop any motion and correction in progress (the motor settles, then is disabled)
+void stopMotion() {
+  correctionState = CORRECTION_IDLE;
+  stepsRemaining = 0;
+  holdEnabled = false;
+  if (motionState != MOTION_IDLE) {
+    motionState = MOTION_STOP_SETTLE;
+    motionMillis = millis();
+  } else if (motorEnabled) {
+    disableMotor();
+  }
+}
+
+// Function to check the photodiode against the interlock threshold, at most every interlockInterval ms
+void checkInterlock() {
+  unsigned long now = micros();
+  if (now - previousInterlockMicros < interlockInterval * 1000UL) {
+    return;
+  }
+  previousInterlockMicros = now;
+  interlockVoltage = (5.0 / 1023.0) * analogRead(sensorPin);
+  if (interlockVoltage <= tripLevel) {
+    overCount = 0;
+    return;
+  }
+  if (overCount == 0) {
+    overSinceMicros = now;
+  }
+  overCount++;
+  if (overCount >= tripCount && !faultLatched) {
+    tripInterlock();
+  }
+}
+
+// Function to latch a fault: PID off, motion cancelled and the motor disabled at once
+void tripInterlock() {
+  faultLatched = true;
+  faultVoltage = interlockVoltage;
+  pidEnabled = false;
+  myPID.SetMode(MANUAL);
+  measureRequest = 0;
+  measureRemaining = 0;
+  stopMotion();
+  motionState = MOTION_IDLE; // No settle: the motor is disabled immediately
+  disableMotor();
+  tripLatencyMicros = micros() - overSinceMicros;
+  sendFault();
+}
+
+// Function to report the interlock state: "Fault: 1 V:4.123 limit:4.00 clear:3.80 latency_us:1024 now:3.912"
+// as text (now: the latest interlock reading, so the host can tell when the fault may be cleared),
+// or a binary 'F' frame (layout in telemetry.py)
+void sendFault() {
+  if (binaryTelemetry) {
+    byte frame[24];
+    float voltage = faultVoltage, limit = tripLevel, latency = tripLatencyMicros, clear = clearLevel;
+    int16_t latched = faultLatched;
+    frame[0] = 0xA5;
+    frame[1] = 'F';
+    memcpy(frame + 2, &telemetrySeq, 2);
+    memcpy(frame + 4, &voltage, 4);
+    memcpy(frame + 8, &limit, 4);
+    memcpy(frame + 12, &latency, 4);
+    memcpy(frame + 16, &clear, 4);
+    memcpy(frame + 20, &latched, 2);
+    uint16_t crc = 0xFFFF;
+    for (int i = 1; i < 22; i++) {
+      crc = crc16Update(crc, frame[i]);
+    }
+    memcpy(frame + 22, &crc, 2);
+    Serial.write(frame, sizeof(frame));
+    return;
+  }
+  Serial.print("Fault: ");
+  Serial.print(faultLatched ? 1 : 0);
+  Serial.print(" V:");
+  Serial.print(faultVoltage, 3);
+  Serial.print(" limit:");
+  Serial.print(tripLevel);
+  Serial.print(" clear:");
+  Serial.print(clearLevel);
+  Serial.print(" latency_us:");
+  Serial.print(tripLatencyMicros);
+  Serial.print(" now:");
+  Serial.println(interlockVoltage, 3);
+}
+
+// Function to run the next step of a correction once the motor has finished its current move
+void updateCorrection() {
+  if (motionState != MOTION_IDLE) {
+    return;
+  }
+  switch (correctionState) {
+    case CORRECTION_IDLE:
+      break;
+    case CORRECTION_PROBE_OUT:
+      correctionDirection = getMotorDirection(); // Read at the probe position, after the settle
+      correctionState = CORRECTION_PROBE_BACK;
+      startMove(probeSteps, 1, true); // Step the motor in the opposite direction
+      break;
+    case CORRECTION_PROBE_BACK:
+      correctionState = CORRECTION_MOVE;
+      startMove(correctionSteps, correctionDirection, false); // Use output of PID to determine number of steps
+      break;
+    case CORRECTION_MOVE:
+      correctionState = CORRECTION_IDLE;
+      break;
+  }
+}
+
+// Function to read the sensor: average oversampleCount conversions, then filter the result.
+// The noise floor is the running spread of the successive filtered readings, i.e. of what
+// the PID actually sees (while the motor moves it includes the motion as well).
+double readSensorVoltage() {
+  long sum = 0;
+  for (int i = 0; i < oversampleCount; i++) {
+    sum += analogRead(sensorPin);
+  }
+  double voltage = (5.0 / 1023.0) * sum / oversampleCount;
+
+  if (filterMode == 1) {
+    if (filterPrimed) {
+      voltage = currentVoltage + filterAlpha * (voltage - currentVoltage);
+    }
+  } else if (filterMode == 2) {
+    medianWindow[medianNext] = voltage;
+    medianNext = (medianNext + 1) % 5;
+    medianCount = min(medianCount + 1, 5);
+    voltage = medianOf(medianWindow, medianCount);
+  }
+  filterPrimed = true;
+  updateNoiseFloor(voltage);
+  return voltage;
+}
+
+// Function to add a filtered reading to the exponentially weighted variance of the readings
+void updateNoiseFloor(double voltage) {
+  if (!noisePrimed) {
+    noiseMean = voltage;
+    noiseVariance = 0;
+    noisePrimed = true;
+  } else {
+    double delta = voltage - noiseMean;
+    noiseMean += noiseWeight * delta;
+    noiseVariance = (1 - noiseWeight) * (noiseVariance + noiseWeight * delta * delta);
+  }
+  noiseFloor = sqrt(noiseVariance);
+}
+
+// Function to find the median of up to 5 values without changing them
+double medianOf(const double *values, int count) {
+  double sorted[5];
+  for (int i = 0; i < count; i++) {
+    sorted[i] = values[i];
+    for (int j = i; j > 0 && sorted[j] < sorted[j - 1]; j--) {
+      double swap = sorted[j];
+      sorted[j] = sorted[j - 1];
+      sorted[j - 1] = swap;
+    }
+  }
+  return sorted[count / 2];
+}
+
+// Function to average `readings` oversampled readings, unfiltered
+double readAverageVoltage(int readings) {
+  long sum = 0;
+  for (int i = 0; i < readings * oversampleCount; i++) {
+    sum += analogRead(sensorPin);
+  }
+  return (5.0 / 1023.0) * sum / ((long) readings * oversampleCount);
+}
+
+// Function to take the next conversions of the requested scan point, and send it once all
+// measureRequest oversampled readings are in
+void updateMeasurement() {
+  if (measureRemaining == 0) {
+    measureTotal = (long) measureRequest * oversampleCount;
+    measureRemaining = measureTotal;
+    measureSum = 0;
+  }
+  for (int i = 0; i < measureConversionsPerLoop && measureRemaining > 0; i++) {
+    measureSum += analogRead(sensorPin);
+    measureRemaining--;
+  }
+  if (measureRemaining == 0) {
+    sendScanPoint((5.0 / 1023.0) * measureSum / measureTotal);
+    measureRequest = 0;
+  }
+}
+
+// Function to send a measured scan point: "Scan: <position> <voltage>" as text, or a binary
+// 'P' frame with the voltage in the voltage field and the position in the setpoint field
+void sendScanPoint(double voltage) {
+  if (binaryTelemetry) {
+    byte frame[24] = {0};
+    float scanVoltage = voltage, position = motorPosition;
+    frame[0] = 0xA5;
+    frame[1] = 'P';
+    memcpy(frame + 2, &telemetrySeq, 2);
+    memcpy(frame + 4, &scanVoltage, 4);
+    memcpy(frame + 8, &position, 4);
+    uint16_t crc = 0xFFFF;
+    for (int i = 1; i < 22; i++) {
+      crc = crc16Update(crc, frame[i]);
+    }
+    memcpy(frame + 22, &crc, 2);
+    Serial.write(frame, sizeof(frame));
+    return;
+  }
+  Serial.print("Scan: ");
+  Serial.print(motorPosition);
+  Serial.print(" ");
+  Serial.println(voltage, 4);
+}
+
+// Function to report the step counter: "Position: <steps>" as text, or a binary 'O' frame with
+// the position in the setpoint field
+void sendPositionReport() {
+  if (binaryTelemetry) {
+    byte frame[24] = {0};
+    float voltage = currentVoltage, position = motorPosition;
+    frame[0] = 0xA5;
+    frame[1] = 'O';
+    memcpy(frame + 2, &telemetrySeq, 2);
+    memcpy(frame + 4, &voltage, 4);
+    memcpy(frame + 8, &position, 4);
+    uint16_t crc = 0xFFFF;
+    for (int i = 1; i < 22; i++) {
+      crc = crc16Update(crc, frame[i]);
+    }
+    memcpy(frame + 22, &crc, 2);
+    Serial.write(frame, sizeof(frame));
+    return;
+  }
+  Serial.print("Position: ");
+  Serial.println(motorPosition);
+}
+
+// Function to restart the filters after their settings change
+void resetFilter() {
+  filterPrimed = false;
+  medianCount = 0;
+  medianNext = 0;
+  noisePrimed = false;
+  noiseFloor = 0;
+}
+
+// Function to report the acquisition settings: "Filter: N16 L1 A0.30 R20 Q200 interval:20 noise:0.0012"
+// as text, or a binary 'R' frame (layout in telemetry.py)
+void sendFilterReport() {
+  if (binaryTelemetry) {
+    byte frame[24];
+    float noise = noiseFloor, alpha = filterAlpha, count = oversampleCount, interval = readInterval;
+    int16_t mode = filterMode;
+    frame[0] = 0xA5;
+    frame[1] = 'R';
+    memcpy(frame + 2, &telemetrySeq, 2);
+    memcpy(frame + 4, &noise, 4);
+    memcpy(frame + 8, &alpha, 4);
+    memcpy(frame + 12, &count, 4);
+    memcpy(frame + 16, &interval, 4);
+    memcpy(frame + 20, &mode, 2);
+    uint16_t crc = 0xFFFF;
+    for (int i = 1; i < 22; i++) {
+      crc = crc16Update(crc, frame[i]);
+    }
+    memcpy(frame + 22, &crc, 2);
+    Serial.write(frame, sizeof(frame));
+    return;
+  }
+  Serial.print("Filter: N");
+  Serial.print(oversampleCount);
+  Serial.print(" L");
+  Serial.print(filterMode);
+  Serial.print(" A");
+  Serial.print(filterAlpha);
+  Serial.print(" R");
+  Serial.print(settlingReadInterval);
+  Serial.print(" Q");
+  Serial.print(lockedReadInterval);
+  Serial.print(" interval:");
+  Serial.print(readInterval);
+  Serial.print(" noise:");
+  Serial.println(noiseFloor, 4);
+}
+
+// Function to check that the host has sent a usable model
+bool modelValid() {
+  return modelA != 0 && modelB != 0;
+}
+
+// Function to evaluate the model voltage at an absolute step position
+double modelVoltage(long position) {
+  double c = cos(2 * PI * position / modelB - modelD);
+  return modelA * c * c + modelC;
+}
+
+// Function to find the step position nearest to motorPosition where the model gives the setpoint.
+// The current model residual is treated as an offset so the move also corrects slow drift.
+long feedforwardTarget() {
+  double offset = currentVoltage - modelVoltage(motorPosition);
+  double fraction = constrain((targetSetpoint - offset - modelC) / modelA, 0.0, 1.0);
+  double phase = acos(sqrt(fraction)); // cos^2(theta) = fraction for theta = +-phase + k pi
+  double theta = 2 * PI * motorPosition / modelB - modelD;
+  long k0 = lround(theta / PI);
+  long best = motorPosition;
+  double bestDistance = -1;
+  for (long k = k0 - 1; k <= k0 + 1; k++) {
+    for (int sign = -1; sign <= 1; sign += 2) {
+      double candidate = (sign * phase + k * PI + modelD) * modelB / (2 * PI);
+      double distance = abs(candidate - motorPosition);
+      if (bestDistance < 0 || distance < bestDistance) {
+        bestDistance = distance;
+        best = lround(candidate);
+      }
+    }
+  }
+  return best;
+}
+
+// Function to send one telemetry record in the selected format
+void sendTelemetry(double stepSize) {
+  lastTelemetryMillis = millis();
+  if (binaryTelemetry) {
+    telemetrySeq++;
+    sendBinaryFrame('T', telemetrySeq, stepSize);
+    return;
+  }
+  // Voltage and error to 4 decimals: the host takes the setpoint as voltage + error
+  Serial.print("Voltage:");
+  Serial.print(currentVoltage, 4);
+  Serial.print(" output:");
+  Serial.print(currentOutput);
+  Serial.print(" stepsize:");
+  Serial.print(stepSize);
+  Serial.print(" Error:");
+  Serial.println(errorGap, 4);
+}
+
+// Function to update a CRC-16/CCITT-FALSE checksum with one byte
+uint16_t crc16Update(uint16_t crc, byte data) {
+  crc ^= (uint16_t) data << 8;
+  for (int i = 0; i < 8; i++) {
+    crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+  }
+  return crc;
+}
+
+// Function to send a 24-byte binary frame (layout in telemetry.py):
+// sync 0xA5 | type | seq | voltage | setpoint | output | error | step size | CRC-16
+void sendBinaryFrame(char type, unsigned int seq, double stepSize) {
+  byte frame[24];
+  float voltage = currentVoltage, setpoint = targetSetpoint, output = currentOutput, error = errorGap;
+  int16_t steps = (int16_t) stepSize;
+  frame[0] = 0xA5;
+  frame[1] = type;
+  memcpy(frame + 2, &seq, 2);      // AVR is little-endian, as the host expects
+  memcpy(frame + 4, &voltage, 4);
+  memcpy(frame + 8, &setpoint, 4);
+  memcpy(frame + 12, &output, 4);
+  memcpy(frame + 16, &error, 4);
+  memcpy(frame + 20, &steps, 2);
+  uint16_t crc = 0xFFFF;
+  for (int i = 1; i < 22; i++) {
+    crc = crc16Update(crc, frame[i]);
+  }
+  memcpy(frame + 22, &crc, 2);
+  Serial.write(frame, sizeof(frame));
+}
+
+// Function to step the motor and keep track of its absolute position
+void moveMotor(long steps, int direction) {
+  myProDriver.step(steps, direction);
+  motorPosition += (direction == 0) ? steps : -steps;
+}
+
+// Function to move the motor straight to an absolute step position (replaces any correction in progress)
+void moveTo(long target) {
+  long delta = target - motorPosition;
+  correctionState = (delta == 0) ? CORRECTION_IDLE : CORRECTION_MOVE;
+  if (delta == 0) {
+    return;
+  }
+  startMove(abs(delta), delta > 0 ? 0 : 1, false);
 }
 
 // Function to enable the motor
 void enableMotor() {
   digitalWrite(motorEnablePin, HIGH);
+  motorEnabled = true;
 }
 
 // Function to disable the motor
 void disableMotor() {
   digitalWrite(motorEnablePin, LOW);
+  motorEnabled = false;
 }
 
 // Function to initialize the PID controller
@@ -95,20 +638,12 @@ void setupPID() {
   myPID.SetMode(AUTOMATIC); // Set the PID controller to automatic mode
 }
 
-// Function to determine motor direction based on the error gap
+// Function to determine motor direction based on the error gap, called once the probe
+// move (probeSteps in direction 0) has settled
 int getMotorDirection() {
-  enableMotor();
-  delay(100);
-  myProDriver.step(12, 0); // Step the motor in one direction
-  
-  delay(100);
-  // Read the sensor input and calculate the corresponding voltage
-  double secondInput = analogRead(sensorPin);
-  double secondVoltage = (5.0 / 1023.0) * secondInput;
+  // Read the sensor input (oversampled, unfiltered) and calculate the corresponding voltage
+  double secondVoltage = readAverageVoltage(1);
   double newGap = targetSetpoint - secondVoltage;
-  delay(100);
-  myProDriver.step(12, 1); // Step the motor in the opposite direction
-  delay(100);
   // Determine the direction based on the new gap compared to the error gap
   int direction = (newGap > errorGap) ? 1 : 0;
   // If the PID output is negative, reverse the direction
@@ -118,29 +653,216 @@ int getMotorDirection() {
   return direction;
 }
 
+// Serial commands:
+// Legacy single command, no reply: 'S', 'P', 'I', 'D', 'E', 'T' or 'F' followed by a value, e.g. "S2.5"
+// ('F1' switches telemetry to binary frames, 'F0' back to text, 'X' moves to an absolute
+// step position, 'Z' sets the current step position, 'M1' selects feedforward control and 'M0'
+// direction probing, 'a'/'b'/'c'/'d' set the feedforward model, 'N' sets the oversampling count,
+// 'L' the filter (0 none, 1 IIR, 2 median), 'A' the IIR coefficient, 'R' and 'Q' the read
+// intervals while settling and while locked, 'Y' measures a scan point (averaging that many
+// readings) once the motor is idle and answers "Scan: <position> <voltage>", 'H' and 'G' set the
+// interlock's trip and clear levels, 'K1' clears a latched fault; 'E1' is ignored while latched)
+// Framed batch: "!<seq> S2.5 P3.3 I0.3*HH" where HH is the hex XOR of the characters between
+// '!' and '*'. All values are applied together and answered with "ACK <seq>", or none are
+// applied and the reply is "NAK <seq> <reason>". Lines longer than serialBufferSize are dropped
+// whole (a frame is answered with "NAK <seq> length") rather than applied truncated.
+// Characters are collected without blocking, so a command is handled as soon as its newline arrives.
 void updateParameters() {
-  if (Serial.available() > 0) {
-    String serialInput = Serial.readStringUntil('\n');
+  while (Serial.available() > 0) {
+    char received = Serial.read();
+    if (received != '\n') {
+      if (serialBuffer.length() < serialBufferSize) {
+        serialBuffer += received;
+      } else {
+        serialOverflow = true;
+      }
+      continue;
+    }
+    String serialInput = serialBuffer;
+    serialBuffer = "";
+    serialInput.trim();
+    if (serialOverflow) {
+      serialOverflow = false;
+      if (serialInput.charAt(0) == '!') {
+        sendNak(serialInput.substring(1, serialInput.indexOf(' ')).toInt(), "length");
+      }
+      continue;
+    }
+    if (serialInput.length() == 0) {
+      continue;
+    }
+    if (serialInput.charAt(0) == '!') {
+      handleFrame(serialInput);
+      continue;
+    }
     char command = serialInput.charAt(0);
     double value = serialInput.substring(1).toDouble();
-    
-    switch (command) {
-      case 'S':
-        targetSetpoint = value;
-        break;
-      case 'P':
-        Kp = value;
-        myPID.SetTunings(Kp, Ki, Kd);
-        break;
-      case 'I':
-        Ki = value;
-        myPID.SetTunings(Kp, Ki, Kd);
-        break;
-      case 'D':
-        Kd = value;
-        myPID.SetTunings(Kp, Ki, Kd);
-        break;
-    }
+    applyParameter(command, value);
   }
 }
 
+// Function to check whether a command character is one applyParameter() understands
+bool isParameterCommand(char command) {
+  return command == 'S' || command == 'P' || command == 'I' || command == 'D' || command == 'E' || command == 'T' ||
+         command == 'F' || command == 'X' || command == 'Z' || command == 'M' ||
+         command == 'a' || command == 'b' || command == 'c' || command == 'd' ||
+         command == 'N' || command == 'L' || command == 'A' || command == 'R' || command == 'Q' || command == 'Y' ||
+         command == 'H' || command == 'G' || command == 'K';
+}
+
+// Function to apply one parameter command
+void applyParameter(char command, double value) {
+  switch (command) {
+    case 'S':
+      targetSetpoint = value;
+      break;
+    case 'P':
+      Kp = value;
+      myPID.SetTunings(Kp, Ki, Kd);
+      break;
+    case 'I':
+      Ki = value;
+      myPID.SetTunings(Kp, Ki, Kd);
+      break;
+    case 'D':
+      Kd = value;
+      myPID.SetTunings(Kp, Ki, Kd);
+      break;
+    case 'E':
+      pidEnabled = (value != 0) && !faultLatched;
+      myPID.SetMode(pidEnabled ? AUTOMATIC : MANUAL); // Re-initializes the PID when it is turned back on
+      if (!pidEnabled) {
+        stopMotion();
+      }
+      break;
+    case 'T':
+      pidSampleTime = value;
+      myPID.SetSampleTime(pidSampleTime);
+      break;
+    case 'F':
+      binaryTelemetry = (value != 0);
+      break;
+    case 'X':
+      moveTo(lround(value));
+      break;
+    case 'Z':
+      motorPosition = lround(value);
+      break;
+    case 'M':
+      controlMode = (int) value;
+      break;
+    case 'a':
+      modelA = value;
+      break;
+    case 'b':
+      modelB = value;
+      break;
+    case 'c':
+      modelC = value;
+      break;
+    case 'd':
+      modelD = value;
+      break;
+    case 'N':
+      oversampleCount = constrain((int) value, 1, 64);
+      resetFilter();
+      break;
+    case 'L':
+      filterMode = constrain((int) value, 0, 2);
+      resetFilter();
+      break;
+    case 'A':
+      filterAlpha = constrain(value, 0.01, 1.0);
+      resetFilter();
+      break;
+    case 'R':
+      settlingReadInterval = max((long) value, 1L);
+      break;
+    case 'Q':
+      lockedReadInterval = max((long) value, 1L);
+      break;
+    case 'Y':
+      measureRequest = constrain((int) value, 1, 64);
+      measureRemaining = 0; // A new request restarts the measurement
+      break;
+    case 'H':
+      tripLevel = value;
+      break;
+    case 'G':
+      clearLevel = value;
+      break;
+    case 'K':
+      if (value != 0 && faultLatched && interlockVoltage < clearLevel) {
+        faultLatched = false;
+        overCount = 0;
+      }
+      sendFault(); // Tells the host whether the fault was cleared
+      break;
+  }
+}
+
+// Function to send a negative acknowledgement for a frame
+void sendNak(long seq, const char *reason) {
+  if (binaryTelemetry) {
+    sendBinaryFrame('N', seq, 0);
+    return;
+  }
+  Serial.print("NAK ");
+  Serial.print(seq);
+  Serial.print(" ");
+  Serial.println(reason);
+}
+
+// Function to validate a framed batch of commands, apply it and acknowledge it
+void handleFrame(String frame) {
+  int star = frame.lastIndexOf('*');
+  int firstSpace = frame.indexOf(' ');
+  int seqEnd = (firstSpace > 0 && firstSpace < star) ? firstSpace : star;
+  long seq = frame.substring(1, seqEnd < 0 ? frame.length() : seqEnd).toInt();
+  if (star < 0) {
+    sendNak(seq, "format");
+    return;
+  }
+
+  // Verify the checksum
+  byte checksum = 0;
+  for (int i = 1; i < star; i++) {
+    checksum ^= frame.charAt(i);
+  }
+  byte received = (byte) strtol(frame.substring(star + 1).c_str(), NULL, 16);
+  if (checksum != received) {
+    sendNak(seq, "checksum");
+    return;
+  }
+
+  // Check every command before applying any of them. The ACK goes out in the
+  // telemetry format that was active when the frame arrived.
+  bool wasBinary = binaryTelemetry;
+  for (int pass = 0; pass < 2; pass++) {
+    int start = seqEnd + 1;
+    while (start < star) {
+      int end = frame.indexOf(' ', start);
+      if (end < 0 || end > star) {
+        end = star;
+      }
+      if (end > start) {
+        char command = frame.charAt(start);
+        if (pass == 0 && !isParameterCommand(command)) {
+          sendNak(seq, "command");
+          return;
+        }
+        if (pass == 1) {
+          applyParameter(command, frame.substring(start + 1, end).toDouble());
+        }
+      }
+      start = end + 1;
+    }
+  }
+
+  if (wasBinary) {
+    sendBinaryFrame('A', seq, 0);
+  } else {
+    Serial.print("ACK ");
+    Serial.println(seq);
+  }
+}
@@ -1,79 +1,75 @@
 import sys
 import os
-import serial
-import time
-import datetime
-import matplotlib
 import json
 
+import matplotlib
+
 matplotlib.use('Qt5Agg')
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton
 from PyQt5.QtGui import QDoubleValidator, QIntValidator
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from daemon_client import DaemonError, daemon_status
+from device_manager import RigChannel
+from history_toolbar import HistoryToolbar
+from plot_renderer import BlitRenderer, stepped_limits
 
+# Serial port of the Arduino; any pyserial URL, 'sim://' for the simulated Arduino, or
+# 'daemon://127.0.0.1:8765/<rig>' to attach to a running acquisition_daemon.py, which keeps
+# the rig's settings and data log (settings.json then only holds the window settings)
+SERIAL_PORT = os.environ.get('WAVEPLATE_PORT', 'COM6')
+ATTACHED = SERIAL_PORT.startswith('daemon://')
+
+# Settings of the window itself; the rest of settings.json are the rig's settings
+# (keys and defaults in device_manager.DEFAULT_SETTINGS)
+WINDOW_SETTINGS = {
+    "Render_mode": 'blit',  # 'blit' redraws only the lines, 'full' redraws the whole figure
+    "Max_fps": 10,  # Upper limit on plot repaints per second
+}
 
-# Attempt to initialize serial connection
-def initialize_serial():
-    try:
-        arduinoData = serial.Serial('COM6', 9600)
-        time.sleep(2)
-        print("Arduino connected")
-        return arduinoData
-    except serial.SerialException as e:
-        print(f"Error opening serial port: {e}")
-        return None
-
-
-arduinoData = initialize_serial()
-
-# Update parameters function
-def update_parameters(command, value):
-    if arduinoData and arduinoData.is_open:
-        try:
-            if command in ['S', 'P', 'I', 'D', 'E', 'T']:
-                arduinoData.write(f"{command}{value}\n".encode())
-                time.sleep(0.1)  # Allow some time for the Arduino to process the command
-        except serial.SerialException as e:
-            print(f"Error writing to serial port: {e}")
-
-
-Voltage = []
-Setpoint = []
-TimeStamps = []
-ElapsedTime = []
-Error = []
 
 first_update = True
-def ensure_data_folder_exists():
-    folder_name = "Time & Voltage Data"
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
-    return folder_name
+def load_settings():
+    try:
+        with open("settings.json", "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def write_settings(settings):
+    with open("settings.json", "w") as file:
+        json.dump(settings, file)
+
 
 class PIDControlApp(QWidget):
     def __init__(self):
         super().__init__()
-        self.Kp = 0.8
-        self.Ki = 0.5
-        self.Kd = 0
-        self.setpoint_value = 2.5
-        self.sample_time_value = 2000
-        self.num_points = 200
-        self.PIDenabled = False  # PID is initially enabled
-        self.load_settings()
-
-        self.data_folder = ensure_data_folder_exists()
-        self.data_file = None
-        self.data_file_count = 0  # Counter for data points
-        self.initDataFile()
-
-        self.start_time = time.time()
+        settings = {**WINDOW_SETTINGS, **load_settings()}
+        self.render_mode = settings["Render_mode"]
+        self.max_fps = float(settings["Max_fps"])
+
+        # The rig: serial reader thread, command channel, interlock, plot histories, data
+        # logger and settings, the same RigChannel that drives each rig of multi_rig_gui.py.
+        # Its data files go straight into "Time & Voltage Data".
+        rig_settings = {key: value for key, value in settings.items() if key not in WINDOW_SETTINGS}
+        pid_enabled = False
+        if ATTACHED:
+            # The daemon's settings and PID state; nothing is pushed on attach and nothing logged here
+            try:
+                status = daemon_status(SERIAL_PORT)
+                rig_settings, pid_enabled = status["settings"], status["pid_enabled"]
+            except (OSError, DaemonError) as e:
+                print(f"Could not read the settings of {SERIAL_PORT}: {e}")
+        self.rig = RigChannel(SERIAL_PORT, SERIAL_PORT, rig_settings, subfolder=False, attached=ATTACHED)
+        self.rig.pid_enabled = pid_enabled
+        self.browsing = False  # True while the toolbar shows a zoomed/panned view instead of the live window
         self.initUI()
         self.initPlot()
 
+        # Opens the port on the reader thread, then pushes the saved settings (and again after every reconnect)
+        self.rig.start()
+
     def initUI(self):
         self.setWindowTitle('PID Control')
         self.setGeometry(100, 100, 1200, 800)
@@ -154,19 +150,35 @@ class PIDControlApp(QWidget):
         clear_graph_button.clicked.connect(self.clear_graph)
         toolbar_and_controls_layout.addWidget(clear_graph_button)
 
-        self.setpoint_input.setText(str(self.setpoint_value))
-        self.p_input.setText(str(self.Kp))
-        self.i_input.setText(str(self.Ki))
-        self.d_input.setText(str(self.Kd))
-        self.sample_time_input.setText(str(self.sample_time_value))
-        self.points_input.setText(str(self.num_points))
+        # Acquisition statistics (received / dropped / overrun samples)
+        self.stats_label = QLabel('Samples: 0  Dropped: 0  Overrun: 0  Log dropped: 0')
+        self.stats_label.setStyleSheet("font-size: 12px; margin-left: 10px;")
+        toolbar_and_controls_layout.addWidget(self.stats_label)
+
+        # Render-time counter
+        self.render_label = QLabel('Render: 0.0 ms avg')
+        self.render_label.setStyleSheet("font-size: 12px; margin-left: 10px;")
+        toolbar_and_controls_layout.addWidget(self.render_label)
+
+        # End-to-end latency (serial read to pixels) and throughput
+        self.latency_label = QLabel('Latency p50/p99: 0/0 ms  Rate: 0.0/s')
+        self.latency_label.setStyleSheet("font-size: 12px; margin-left: 10px;")
+        toolbar_and_controls_layout.addWidget(self.latency_label)
+
+        settings = self.rig.settings
+        self.setpoint_input.setText(str(settings["Setpoint"]))
+        self.p_input.setText(str(settings["Kp"]))
+        self.i_input.setText(str(settings["Ki"]))
+        self.d_input.setText(str(settings["Kd"]))
+        self.sample_time_input.setText(str(settings["Sample_time"]))
+        self.points_input.setText(str(settings["Num_points"]))
 
         self.setpoint_input.setValidator(QDoubleValidator(0.5, 3.5, 3))  # Float: 0.5 to 3.5
         self.p_input.setValidator(QDoubleValidator(0.0, 1000.0, 3))  # Allow any reasonable float
         self.i_input.setValidator(QDoubleValidator(0, 1000.0, 3))
         self.d_input.setValidator(QDoubleValidator(0, 1000.0, 3))
         self.sample_time_input.setValidator(QIntValidator(1500, 10000))  # Integer: 1500 to 10000
-        self.points_input.setValidator(QIntValidator(10, 1000))  # Integer: 10 to 1000
+        self.points_input.setValidator(QIntValidator(10, 100000))  # Long windows are drawn decimated
 
         # Add toolbar_and_controls_layout to main_layout
         main_layout.addLayout(toolbar_and_controls_layout)
@@ -179,7 +191,7 @@ class PIDControlApp(QWidget):
         fig, ax = plt.subplots()
         line1, = ax.plot([], [], 'ro-', label='Actual Voltage', markersize=2, linewidth=1)
         line2, = ax.plot([], [], 'bo-', label='Setpoint', markersize=2, linewidth=1)
-        ax.set_xlim(0, self.sample_time_value*self.num_points/1000)
+        ax.set_xlim(0, self.rig.settings["Sample_time"]*self.rig.settings["Num_points"]/1000)
         ax.set_title('Real-time Arduino Data', fontsize=8)
         ax.set_ylabel('Voltage (V)', fontsize=8)
         ax.set_xlabel('Time (s)', fontsize=8)
@@ -188,198 +200,151 @@ class PIDControlApp(QWidget):
         ax.grid(True)
 
         self.canvas = FigureCanvas(fig)
-        self.toolbar = NavigationToolbar(self.canvas, self)
+        self.toolbar = HistoryToolbar(self.canvas, self, on_browse=self.browse_history, on_home=self.show_live)
 
         # Add the toolbar and canvas to the main layout
         layout = self.layout()
         layout.addWidget(self.toolbar)
         layout.addWidget(self.canvas)
 
-    def initDataFile(self):
-        if self.data_file:
-            self.data_file.close()
-        # Create a new data file with a timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.data_filename = os.path.join(self.data_folder, f"data_log_{timestamp}.txt")
-        self.data_file = open(self.data_filename, "w")
-        self.data_file.write("Time(s)\tVoltage(V)\tSet Point(V)\t Error\n")  # Write headers
+        # Blit only line1/line2 and cap repaints at max_fps
+        self.renderer = BlitRenderer(self.canvas, ax, (line1, line2), max_fps=self.max_fps,
+                                     blit=(self.render_mode == 'blit'))
 
     def save_settings(self):
-        settings = {
-            "Setpoint": self.setpoint_value,
-            "Kp": self.Kp,
-            "Ki": self.Ki,
-            "Kd": self.Kd,
-            "Sample_time": self.sample_time_value,
-            "Num_points": self.num_points
-        }
-        with open("settings.json", "w") as file:
-            json.dump(settings, file)
-
-    def load_settings(self):
-        try:
-            with open("settings.json", "r") as file:
-                settings = json.load(file)
-                self.setpoint_value = float(settings.get("Setpoint", 2.5))
-                self.Kp = float(settings.get("Kp", 0.8))
-                self.Ki = float(settings.get("Ki", 0.5))
-                self.Kd = float(settings.get("Kd", 0.0))
-                self.sample_time_value = int(settings.get("Sample_time", 2000))
-                self.num_points = int(settings.get("Num_points", 200))
-        except FileNotFoundError:
-            pass
+        window_settings = {"Render_mode": self.render_mode, "Max_fps": self.max_fps}
+        if ATTACHED:
+            write_settings({**load_settings(), **window_settings})  # The daemon saves the rig's settings
+            return
+        settings = {**self.rig.settings, **window_settings}
+        self.rig.data_logger.submit(write_settings, settings)  # Written on the logging thread
 
     def closeEvent(self, event):
         self.save_settings()  # Save current settings
+        self.rig.close()  # Stop the acquisition thread, write the latency log and everything still queued
         super().closeEvent(event)  # Call the parent class's closeEvent
 
     def toggle_pid(self):
-        self.PIDenabled = not self.PIDenabled  # Toggle PID state
-        update_parameters('E', int(self.PIDenabled))  # Send enable/disable command to Arduino
-        self.enable_button.setText('PID Enabled' if self.PIDenabled else 'PID Disabled')  # Update button text
-
-        # Log the manual toggle event
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if self.PIDenabled:
-            self.data_file.write(f"Event: PID Enabled manually at {current_time}\n")
-        else:
-            self.data_file.write(f"Event: PID Disabled manually at {current_time}\n")
-        self.data_file.flush()
+        # Enabling clears an interlock fault, but only once the voltage is below the clear level
+        if self.rig.set_pid_enabled(not self.rig.pid_enabled):
+            self.show_pid_state()
+
+    # Button text, and a red window while the interlock has the PID disabled
+    def show_pid_state(self):
+        self.enable_button.setText('PID Enabled' if self.rig.pid_enabled else 'PID Disabled')
+        self.setStyleSheet('background-color: red;' if self.rig.tripped else '')
 
     def update_num_points(self):
-        self.num_points = int(self.points_input.text())
+        self.rig.resize(int(self.points_input.text()))
 
     def update_pid_param(self, param, value):
-        update_parameters(param, value)
-        if param == 'P':
-            self.Kp = value
-            self.p_input.setText(str(self.Kp))  # Update display
-        elif param == 'I':
-            self.Ki = value
-            self.i_input.setText(str(self.Ki))  # Update display
-        elif param == 'D':
-            self.Kd = value
-            self.d_input.setText(str(self.Kd))  # Update display
-        elif param == 'S':
-            self.setpoint_value = value
-            self.setpoint_input.setText(str(self.setpoint_value))  # Update display
-        elif param == 'T':
-            self.sample_time_value = value
-            self.sample_time_input.setText(str(self.sample_time_value))  # Update display
+        inputs = {'S': self.setpoint_input, 'P': self.p_input, 'I': self.i_input, 'D': self.d_input,
+                  'T': self.sample_time_input}
+        value = int(value) if param == 'T' else float(value)
+        self.rig.set_parameter(param, value)  # Also jumps to the calibrated step position on a setpoint change
+        inputs[param].setText(str(value))  # Update display
+
+    # Points the plot can show without decimation: about one per pixel of the axes
+    def plot_width(self):
+        return max(100, int(ax.bbox.width))
+
+    # Draw the part of the long history inside the current axis limits (toolbar zoom/pan)
+    def browse_history(self):
+        self.browsing = True
+        t, voltage, setpoint, _ = self.rig.long_history.select(*ax.get_xlim(), self.plot_width())
+        line1.set_data(t, voltage)
+        line2.set_data(t, setpoint)
+        self.renderer.request()
+
+    # Back to the scrolling live window (toolbar Home)
+    def show_live(self):
+        self.browsing = False
+        self.renderer.invalidate()
 
     def clear_graph(self):
-        global Voltage, Setpoint, TimeStamps, Error
-        Voltage.clear()
-        Setpoint.clear()
-        TimeStamps.clear()
-        Error.clear()
+        self.rig.clear()
+        self.browsing = False
         line1.set_data([], [])
         line2.set_data([], [])
-        self.canvas.draw()
-
-    def __del__(self):
-        self.data_file.close()
-
-def init():
-    line1.set_data([], [])
-    line2.set_data([], [])
-    return line1, line2
-
-
-def update(frame):
-    global arduinoData, first_update
-    if arduinoData and arduinoData.is_open:
-        try:
-            if arduinoData.in_waiting > 0:  # Check if there is data available to read
-                arduinoString = arduinoData.readline().decode('utf-8').rstrip()  # Read and decode the line of text from the serial port
-                try:
-                    values = arduinoString.split()
-                    if len(values) != 2:
-                        raise ValueError(f"Expected 2 values, got {len(values)}: {values}")
-                    actualVoltage, setpoint = map(float, values)  # Parse the string to get both values
-
-                    # Append data and time
-                    Voltage.append(actualVoltage)
-                    Setpoint.append(setpoint)
-                    elapsed_time = time.time() - pid_app.start_time
-                    TimeStamps.append(elapsed_time)
-
-                    # Calculate error
-                    error = actualVoltage - setpoint
-                    Error.append(error)
-                    pid_app.error_label.setText(f'Error: {error:.2f}')
-
-                    # Log warning if error exceeds 5V
-                    if abs(actualVoltage) > 4 and pid_app.PIDenabled:  # Check if PID is currently enabled
-                        pid_app.PIDenabled = False  # Disable PID
-                        update_parameters('E', 0)  # Send command to disable PID
-                        pid_app.enable_button.setText('PID Disabled')  # Update button text
-                        pid_app.setStyleSheet('background-color: red;')  # Change GUI background
-
-                        # Log the event in the data file
-                        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        pid_app.data_file.write(f"Event: PID Disabled due to Voltage Limit at {current_time}\n")
-                        pid_app.data_file.flush()  # Ensure the event is written immediately
-
-                        print(f"Warning: PID Disabled due to Voltage Limit at {current_time}\n")
-
-                    else:
-                        pid_app.setStyleSheet('')
-
-                    # Save data to file
-                    pid_app.data_file.write(f"{elapsed_time:.2f}\t{actualVoltage:.4f}\t{setpoint:.4f}\t{error:.2f}\n")
-                    pid_app.data_file.flush()  # Ensure data is written to file immediately
-
-                    pid_app.data_file_count += 1
-
-                    # Check if the file has reached 50,000 points / create a new file
-                    if pid_app.data_file_count >= 50000:
-                        pid_app.initDataFile()
-
-                    # Trim data lists to the specified number of points
-                    while len(Voltage) > pid_app.num_points:
-                        Voltage.pop(0)
-                        Setpoint.pop(0)
-                        TimeStamps.pop(0)
-                        Error.pop(0)
-
-                    line1.set_data(TimeStamps, Voltage)
-                    line2.set_data(TimeStamps, Setpoint)
-
-                    # Adjust x,y-axis limits dynamically
-                    if Voltage and Setpoint:  # Ensure lists are not empty
-                        min_voltage = min(min(Voltage), min(Setpoint)) - 0.1
-                        max_voltage = max(max(Voltage), max(Setpoint)) + 0.1
-                        ax.set_ylim(min_voltage, max_voltage)
-                        ax.set_xlim(min(TimeStamps), max(TimeStamps))
-
-                    if first_update:
-                        pid_app.clear_graph()  # Ensures line1, line2, Voltage, and Setpoint are the same length for plotting
-                        first_update = False
-                    else:
-                        pid_app.canvas.draw()
-                except ValueError as e:
-                    print(f"Error parsing data: {e}")  # Debug: print non-numeric data or parsing issues
-        except serial.SerialException as e:
-            print(f"Error reading from serial port: {e}")
-            arduinoData.close()
-            arduinoData = initialize_serial()  # Attempt to reconnect if the COM port is disconnected
-    return line1, line2
-
-# Initialize the plot
-fig, ax = plt.subplots()
+        self.renderer.invalidate()
+        self.renderer.render(force=True)
+
+def update():
+    global first_update
+    rig = pid_app.rig
+    # History, long history, data log, latency and settling of everything received since the
+    # last redraw; interlock trips are logged here too (the PID was already disabled on the reader thread)
+    received = rig.process()
+    stats = rig.stats()
+    noise = f"{stats['noise'] * 1000:.1f} mV" if stats['noise'] is not None else "-"
+    pid_app.stats_label.setText(f"Samples: {stats['received']}  Dropped: {stats['dropped']}  Overrun: {stats['overrun']}  "
+                                f"Log dropped: {stats['log_dropped']}  Noise: {noise}  {rig.settling.status_text()}  {rig.interlock.status_text()}")
+    pid_app.show_pid_state()
+    if not received:
+        return
+
+    history = rig.history
+    pid_app.error_label.setText(f'Error: {rig.last_error:.2f}')
+
+    if pid_app.browsing:
+        pid_app.browse_history()  # Keep the user's limits; new samples show up if they are in view
+        return
+
+    if len(history) > pid_app.plot_width():
+        # More points than pixels: draw the min/max envelope of the window instead
+        t, voltage, setpoint_values, _ = rig.long_history.select(history.min('time'), history.max('time'),
+                                                                 pid_app.plot_width())
+        line1.set_data(t, voltage)
+        line2.set_data(t, setpoint_values)
+    else:
+        line1.set_data(history.time, history.voltage)
+        line2.set_data(history.time, history.setpoint)
+
+    # Adjust x,y-axis limits dynamically
+    if len(history):  # Ensure history is not empty
+        min_voltage = history.min('voltage', 'setpoint') - 0.1
+        max_voltage = history.max('voltage', 'setpoint') + 0.1
+        min_time, max_time = history.min('time'), history.max('time')
+        if pid_app.renderer.blit:
+            # Only move the limits (and redraw the background) when the data leaves them
+            ylim = stepped_limits(ax.get_ylim(), min_voltage, max_voltage)
+            xlim = stepped_limits(ax.get_xlim(), min_time, max_time)
+            if ylim:
+                ax.set_ylim(ylim)
+            if xlim:
+                ax.set_xlim(xlim)
+        else:
+            ax.set_ylim(min_voltage, max_voltage)
+            ax.set_xlim(min_time, max_time)
+
+    if first_update:
+        pid_app.clear_graph()  # Ensures line1, line2 and the history start out empty together
+        first_update = False
+    else:
+        pid_app.renderer.request()
+
+
+# Repaint the plot if new data arrived, at most max_fps times per second
+def render():
+    if pid_app.renderer.render():
+        pid_app.rig.latency.drawn()
+        pid_app.render_label.setText(pid_app.renderer.stats_text())
+        pid_app.latency_label.setText(pid_app.rig.latency.status_text())
 
 # Start the GUI application
 app = QApplication(sys.argv)
 pid_app = PIDControlApp()
 pid_app.show()
 
-# Start animation
-ani = animation.FuncAnimation(fig, update, init_func=init, blit=False, interval=1000, cache_frame_data=False)
+# Process incoming samples and repaint the plot from the Qt event loop
+def on_timer():
+    update()
+    render()
+
+
+timer = QTimer()
+timer.timeout.connect(on_timer)
+timer.start(max(10, int(1000 / max(pid_app.max_fps, 1))))
 
 # Run the Qt application event loop
 sys.exit(app.exec_())
-
-# Close the serial connection when done
-if arduinoData and arduinoData.is_open:
-    arduinoData.close()
@@ -1,19 +1,25 @@
+import os
+import sys
 import serial
 import time
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from simulated_arduino import open_transport
+from command_channel import CommandChannel
 
-def update_parameter(ser, command, value):
-    ser.write(f"{command}{value}\n".encode())
-    time.sleep(0.1)  # Allow some time for the Arduino to process the command
+# Send one or more parameters in a single frame and wait for the Arduino's acknowledgement
+def update_parameter(ser, command=None, value=None, **params):
+    if command is not None:
+        params = {command: value, **params}
+    return CommandChannel(ser, read_replies=True).send(params)
 
 # Function to read and parse data from the serial port
 def read_serial_data(ser):
     if ser.in_waiting > 0:
         line = ser.readline().decode('utf-8').rstrip()
-        if line.startswith("Error:"):
+        if "Error:" in line:  # e.g. "Voltage:2.01 output:0.30 stepsize:15.00 Error:-0.01"
             try:
-                error_gap = float(line.split(":")[1].strip())
+                error_gap = float(line.split("Error:")[1].strip())
                 return error_gap
             except ValueError:
                 pass
@@ -34,21 +40,21 @@ if __name__ == "__main__":
     ser = None  # Initialize ser to None
 
     try:
-        ser = serial.Serial('COM5', 9600)  # Update 'COM3' to the appropriate port for your Arduino
+        # Serial port from the command line or WAVEPLATE_PORT, e.g. COM5, 'sim://?format=verbose'
+        # or a rig of a running acquisition_daemon.py, 'daemon://127.0.0.1:8765/<rig>?format=verbose'
+        port = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('WAVEPLATE_PORT', 'COM5')
+        ser = open_transport(port, 9600, timeout=0.5)
         time.sleep(2)  # Wait for the serial connection to initialize
 
         # Update the setpoint and PID parameters
         new_setpoint = 2  # Change to your desired setpoint
-        update_parameter(ser, 'S', new_setpoint)
-
         new_Kp = 3.3 # Change to your desired Kp
         new_Ki = 0.3  # Change to your desired Ki
         new_Kd = 0.00  # Change to your desired Kd
-        update_parameter(ser, 'P', new_Kp)
-        update_parameter(ser, 'I', new_Ki)
-        update_parameter(ser, 'D', new_Kd)
-
-        print("Parameters updated. Reading data...")
+        if update_parameter(ser, S=new_setpoint, P=new_Kp, I=new_Ki, D=new_Kd):
+            print("Parameters updated. Reading data...")
+        else:
+            print("Arduino did not acknowledge the parameters. Reading data...")
 
         # Initialize plot
         fig, ax = plt.subplots()
@@ -1,3 +1,5 @@
+// Manual scan sketch. calibration_sweep.py calibrates faster through FINAL_WAVEPLATE_SCRIPT.ino
+// (coarse-to-fine, stops once the fit is good enough) without reflashing the board.
 #include "SparkFun_ProDriver_TC78H670FTG_Arduino_Library.h" //Click here to get the library: http://librarymanager/All#SparkFun_ProDriver
 
 const byte enable = 7; //EN pin when HIGH and LOW, motor is on and off
@@ -0,0 +1,261 @@
+# Headless acquisition service: owns the serial ports, control settings and data logs of
+# one or more rigs (device_manager.DeviceManager) and serves them on a local TCP socket, so
+# acquisition and logging carry on while GUIs and scripts attach and detach.
+#
+# Protocol: one JSON object per line in both directions. Requests carry a "cmd" and an
+# optional "id", which is echoed in the reply {"type": "reply", "id": ..., "ok": true, "result": ...}
+# (or "ok": false with an "error"):
+#   {"cmd": "rigs"}                                  names, ports and state of every rig
+#   {"cmd": "status", "rig": "rig0"}                 settings, PID state, interlock and reader stats
+#   {"cmd": "set", "rig": "rig0", "params": {"S": 2.5, "P": 3.3}}   parameter commands (COMMANDS)
+#   {"cmd": "history", "rig": "rig0", "points": 200} the last plotted samples
+#   {"cmd": "event", "rig": "rig0", "message": "..."}  an event line in the rig's data log
+#   {"cmd": "subscribe", "rig": "rig0"}              stream {"type": "samples", "rig": ..., "time": [...],
+#                                                    "voltage": [...], "setpoint": [...]} (rig null: all rigs)
+#   {"cmd": "unsubscribe", "rig": "rig0"}
+# A client that reads too slowly loses stream messages (counted in "dropped"), never replies,
+# and never holds up acquisition. Requests for a rig hold its lock, so they never run in the
+# middle of the poll thread's processing. Settings changed with "set" are saved into the
+# configuration file. daemon_client.py has the client side and the daemon:// transport.
+#
+# Usage: python acquisition_daemon.py [port ...] [--host 127.0.0.1] [--port 8765]
+#        (rigs from rigs.json, or one rig per serial port given; see device_manager.py)
+import argparse
+import json
+import queue
+import socketserver
+import threading
+import time
+
+from command_channel import COMMANDS
+from device_manager import DEFAULT_SETTINGS, RIGS_FILE, DeviceManager
+
+DEFAULT_HOST = "127.0.0.1"  # Local clients only
+DEFAULT_PORT = 8765
+POLL_INTERVAL = 0.05  # Seconds between moving samples from the readers to the logs and clients
+CLIENT_QUEUE_SIZE = 1000  # Stream messages a client may fall behind before new ones are dropped
+# Parameter commands remembered in the rig's settings as they are (pushed again on reconnect)
+SETTING_COMMANDS = {'N': "Oversample", 'L': "Filter_mode", 'A': "Filter_alpha", 'R': "Read_interval_settling",
+                    'Q': "Read_interval_locked"}
+
+
+class DaemonError(Exception):
+    pass
+
+
+# One connected client: requests are handled on the server's thread for the connection,
+# everything sent to it goes through a queue drained by its own writer thread
+class ClientHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.acquisition = self.server.acquisition
+        self.subscriptions = set()  # Rig names; None subscribes to every rig
+        self.dropped = 0
+        self.outbox = queue.Queue(CLIENT_QUEUE_SIZE)
+        self.writer = threading.Thread(target=self._write_loop, name="daemon-client-writer", daemon=True)
+        self.writer.start()
+        self.acquisition.add_client(self)
+
+    def handle(self):
+        for line in self.rfile:
+            request = {}
+            try:
+                request = json.loads(line)
+                reply = {"type": "reply", "id": request.get("id"), "ok": True,
+                         "result": self.acquisition.handle(self, request)}
+            except (DaemonError, ValueError, KeyError, TypeError, AttributeError) as e:
+                reply = {"type": "reply", "id": request.get("id") if isinstance(request, dict) else None,
+                         "ok": False, "error": str(e)}
+            self.outbox.put(reply)  # Replies wait for room rather than being dropped
+
+    def finish(self):
+        self.acquisition.remove_client(self)
+        self.outbox.put(None)
+        self.writer.join(1.0)
+        super().finish()
+
+    def wants(self, rig_name):
+        return None in self.subscriptions or rig_name in self.subscriptions
+
+    # Queue a stream message; dropped if the client is not keeping up
+    def publish(self, message):
+        try:
+            self.outbox.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                break
+            try:
+                self.wfile.write(json.dumps(message).encode() + b"\n")
+            except OSError:
+                break
+
+
+class DaemonServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, acquisition):
+        self.acquisition = acquisition
+        super().__init__(address, ClientHandler)
+
+
+# Runs a DeviceManager on its own polling thread and serves it to clients; settings changed
+# by clients are saved into config_file (None: not saved)
+class AcquisitionDaemon:
+    def __init__(self, manager, address=(DEFAULT_HOST, DEFAULT_PORT), poll_interval=POLL_INTERVAL, config_file=None):
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.config_file = config_file
+        self.clients = []
+        self._clients_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        for rig in manager:
+            rig.sample_handler = self._publish_samples
+        self.server = DaemonServer(address, self)
+        self.address = self.server.server_address  # Actual port when 0 was asked for
+
+    def start(self):
+        self.manager.start()
+        threading.Thread(target=self._poll_loop, name="daemon-poll", daemon=True).start()
+        threading.Thread(target=self.server.serve_forever, name="daemon-server", daemon=True).start()
+        print(f"Acquisition daemon serving {len(self.manager)} rig(s) on {self.address[0]}:{self.address[1]}")
+
+    def stop(self):
+        self._stop_event.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.manager.close()
+
+    def _poll_loop(self):
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            self.manager.poll()
+            self._stop_event.wait(max(0.0, self.poll_interval - (time.monotonic() - start)))
+
+    def add_client(self, client):
+        with self._clients_lock:
+            self.clients.append(client)
+
+    def remove_client(self, client):
+        with self._clients_lock:
+            self.clients.remove(client)
+
+    def _publish_samples(self, rig, samples):
+        with self._clients_lock:
+            clients = [client for client in self.clients if client.wants(rig.name)]
+        if not clients:
+            return
+        time_, voltage, setpoint = zip(*samples)
+        message = {"type": "samples", "rig": rig.name, "time": time_, "voltage": voltage, "setpoint": setpoint}
+        for client in clients:
+            client.publish(message)
+
+    def _rig(self, request):
+        name = request.get("rig")
+        if name is None and len(self.manager) == 1:
+            return self.manager.rigs[0]
+        try:
+            return self.manager[name]
+        except KeyError:
+            raise DaemonError(f"Unknown rig {name!r}")
+
+    def _rig_state(self, rig):
+        return {"name": rig.name, "port": rig.port_name, "pid_enabled": rig.pid_enabled, "tripped": rig.tripped,
+                "last_error": rig.last_error}
+
+    # Apply parameter commands the way the GUI does: 'E' and 'K' go through the interlock,
+    # 'S'/'P'/'I'/'D'/'T', the filter and the trip levels are remembered in the rig's settings,
+    # the rest goes to the Arduino. Called with the rig's lock held.
+    def _set(self, rig, params):
+        for command in params:
+            if command not in COMMANDS:
+                raise DaemonError(f"Unknown command {command!r}")
+        params = dict(params)
+        if 'K' in params and params.pop('K'):
+            if rig.interlock.latched and not rig.interlock.reset():
+                raise DaemonError(f"Fault not cleared: the voltage is still above {rig.interlock.clear_level:.2f} V")
+            rig.update_parameters(K=1)  # Also clears the Arduino's own fault
+        if 'E' in params:
+            enabled = bool(params.pop('E'))
+            if enabled != rig.pid_enabled and not rig.set_pid_enabled(enabled, reason="by a client"):
+                raise DaemonError(f"PID not enabled: the voltage is still above {rig.interlock.clear_level:.2f} V")
+        if 'H' in params:
+            rig.interlock.trip_level = rig.settings["Trip_level"] = float(params['H'])
+        if 'G' in params:
+            rig.interlock.clear_level = rig.settings["Trip_clear_level"] = float(params['G'])
+        for command in [c for c in SETTING_COMMANDS if c in params]:
+            key = SETTING_COMMANDS[command]
+            rig.settings[key] = type(DEFAULT_SETTINGS[key])(params[command])
+        for command in [c for c in ('S', 'P', 'I', 'D', 'T') if c in params]:
+            rig.set_parameter(command, params.pop(command))
+        if params:
+            rig.update_parameters(**params)
+
+    def _save(self):
+        if self.config_file:
+            with self._save_lock:
+                self.manager.save(self.config_file)
+
+    def handle(self, client, request):
+        cmd = request.get("cmd")
+        if cmd == "rigs":
+            return [self._rig_state(rig) for rig in self.manager]
+        if cmd in ("status", "set", "history", "event"):
+            rig = self._rig(request)
+            with rig.lock:
+                return self._handle_rig(rig, cmd, request)
+        if cmd == "subscribe":
+            name = request.get("rig")
+            client.subscriptions.add(None if name is None else self._rig(request).name)
+            return None
+        if cmd == "unsubscribe":
+            name = request.get("rig")
+            client.subscriptions.discard(None if name is None else self._rig(request).name)
+            return {"dropped": client.dropped}
+        raise DaemonError(f"Unknown command {cmd!r}")
+
+    def _handle_rig(self, rig, cmd, request):
+        if cmd == "status":
+            return {**self._rig_state(rig), "settings": dict(rig.settings), "stats": rig.stats(),
+                    "interlock": rig.interlock.summary(), "clients": len(self.clients)}
+        if cmd == "set":
+            settings = dict(rig.settings)
+            try:
+                self._set(rig, request["params"])
+            finally:
+                if rig.settings != settings:
+                    self._save()
+            return None
+        if cmd == "history":
+            history = rig.history
+            points = int(request.get("points", len(history)))
+            return {field: getattr(history, field)[-points:].tolist() if points else []
+                    for field in ("time", "voltage", "setpoint")}
+        rig.log_event(str(request["message"]))
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless waveplate acquisition with a local socket API")
+    parser.add_argument('ports', nargs='*', help="serial ports or sim:// URLs (default: the rigs of rigs.json)")
+    parser.add_argument('--config', default=RIGS_FILE, help="rig configuration file")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="address to listen on (keep it local)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    args = parser.parse_args()
+
+    manager = DeviceManager.from_config(args.config, ports=args.ports)
+    daemon = AcquisitionDaemon(manager, (args.host, args.port), config_file=args.config)
+    daemon.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping the acquisition daemon...")
+    finally:
+        daemon.stop()
@@ -0,0 +1,52 @@
+# Benchmark: how long the vectorized gain search takes, and how well its predicted settling
+# time and overshoot match the simulated firmware for the chosen gains and the defaults.
+# Run from the repository root: python benchmarks/bench_autotune.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pid_autotune import PlantModel, simulate, tune
+from simulated_arduino import SimulatedFirmware, WaveplateModel
+
+
+# Settling time (band 0.02 V) and overshoot of the simulated firmware on the same 0.8 -> 1.2 V step
+def firmware_step(plant, Kp, Ki, Kd, low=0.8, high=1.2, sample_time_ms=2000, duration_s=60, tick_ms=10):
+    model = WaveplateModel(plant.a, plant.b, plant.c, plant.d, noise=plant.noise, seed=0)
+    firmware = SimulatedFirmware(model, setpoint=high, Kp=Kp, Ki=Ki, Kd=Kd, sample_time_ms=sample_time_ms,
+                                 position=round(plant.position_for(low)))
+    firmware.apply_parameter('N', 1)
+    firmware.apply_parameter('E', 1)
+    last_outside, overshoot = 0.0, 0.0
+    for k in range(int(duration_s * 1000 / tick_ms)):
+        firmware.tick(k * tick_ms)
+        error = high - model.voltage(firmware.position)
+        overshoot = max(overshoot, -error)
+        if abs(error) > 0.02:
+            last_outside = k * tick_ms / 1000
+    return last_outside, 100 * overshoot / (high - low)
+
+
+def run():
+    plant = PlantModel(noise=0.005)
+    start = time.perf_counter()
+    results = tune(plant)
+    search_s = time.perf_counter() - start
+    best = results.iloc[0]
+    rows = []
+    for name, gains in (("tuned", (best.Kp, best.Ki, best.Kd)), ("GUI default", (0.8, 0.5, 0.0))):
+        predicted = simulate(plant, *gains, duration=120.0).iloc[0]
+        settling, overshoot = firmware_step(plant, *gains)
+        rows.append({"gains": name, "Kp": gains[0], "Ki": gains[1], "Kd": gains[2],
+                     "predicted_settling_s": float(predicted.settling_s), "predicted_overshoot_pct": float(predicted.overshoot_pct),
+                     "firmware_settling_s": settling, "firmware_overshoot_pct": overshoot})
+    return {"candidates": len(results), "search_s": search_s, "rows": rows}
+
+
+if __name__ == "__main__":
+    result = run()
+    print(f"{result['candidates']} candidates simulated in {result['search_s']:.2f} s")
+    for row in result["rows"]:
+        print(f"{row['gains']:>12} (Kp {row['Kp']:.3f}, Ki {row['Ki']:.3f}, Kd {row['Kd']:.2f}): "
+              f"predicted {row['predicted_settling_s']:.1f} s / {row['predicted_overshoot_pct']:.0f}%, "
+              f"simulated firmware {row['firmware_settling_s']:.1f} s / {row['firmware_overshoot_pct']:.0f}%")
@@ -0,0 +1,75 @@
+# Benchmark: acquisition_daemon.py with a simulated rig at `rate` samples/s. Measures the
+# samples/s and delay to subscribed clients, and checks that clients attaching and detaching
+# (through the daemon:// transport as well) leave no gap in the daemon's data log.
+# Run from the repository root: python benchmarks/bench_daemon.py
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from acquisition_daemon import AcquisitionDaemon
+from daemon_client import DaemonClient
+from data_logger import read_records
+from device_manager import DeviceManager
+from log_index import find_logs
+from simulated_arduino import open_transport
+
+
+def run(rate=200, n_clients=4, duration_s=3.0, reattach=5):
+    with tempfile.TemporaryDirectory() as folder:
+        manager = DeviceManager([{"name": "rig0", "port": f"sim://?seed=0&rate={rate}", "Use_calibration": False}],
+                                data_folder=folder)
+        daemon = AcquisitionDaemon(manager, ("127.0.0.1", 0))
+        daemon.start()
+        rig = manager["rig0"]
+        while rig.serial_reader.port is None:
+            time.sleep(0.1)
+        time.sleep(0.5)
+
+        clients = [DaemonClient(daemon.address) for _ in range(n_clients)]
+        for client in clients:
+            client.subscribe("rig0")
+        received, delays = 0, []
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        while time.perf_counter() - wall_start < duration_s:
+            for client in clients:
+                batch = client.samples(timeout=0.01)
+                while batch is not None:
+                    received += len(batch["time"])
+                    # Logged time is time.monotonic() - start_time on the daemon (same process here)
+                    delays.append(time.monotonic() - rig.start_time - batch["time"][-1])
+                    batch = client.samples(timeout=0)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        for client in clients:
+            client.close()
+
+        # Attach and detach the serial-port view a few times while the daemon keeps logging
+        for _ in range(reattach):
+            port = open_transport(f"daemon://127.0.0.1:{daemon.address[1]}/rig0", timeout=0.5)
+            port.readline()
+            port.close()
+        time.sleep(0.5)
+        daemon.stop()
+        records = np.concatenate([read_records(path) for path in find_logs([rig.data_folder])])
+        gaps = np.diff(records["time"])
+        return {
+            "rate": rate,
+            "clients": n_clients,
+            "samples_per_s_per_client": received / wall / n_clients,
+            "delay_p50_ms": float(np.percentile(delays, 50) * 1000),
+            "delay_max_ms": float(np.max(delays) * 1000),
+            "cpu_pct": 100 * cpu / wall,
+            "logged": len(records),
+            "max_log_gap_ms": float(gaps.max() * 1000),
+        }
+
+
+if __name__ == "__main__":
+    row = run()
+    print(f"{row['clients']} clients at {row['rate']} samples/s: {row['samples_per_s_per_client']:.0f} samples/s each, "
+          f"delay p50 {row['delay_p50_ms']:.1f} ms, max {row['delay_max_ms']:.1f} ms, CPU {row['cpu_pct']:.1f}%")
+    print(f"daemon log: {row['logged']} samples, longest gap {row['max_log_gap_ms']:.1f} ms across client attach/detach")
@@ -0,0 +1,60 @@
+# Benchmark: spurious motor moves while holding the setpoint, for the firmware's acquisition
+# settings (oversampling count and filter), in simulated time with a noisy photodiode.
+# The loop starts locked at the setpoint with gains that keep it locked: at 1 V the model's
+# slope is about 17 mV/step, so the firmware's default Kp 3 (150 steps/V at step_scale 50)
+# would overshoot every correction 2.5x and oscillate; Kp 0.6 corrects half the error per move.
+# Run from the repository root: python benchmarks/bench_filter.py
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from simulated_arduino import SimulatedFirmware, WaveplateModel, model_target
+
+CONFIGURATIONS = (
+    ("single read", {'N': 1, 'L': 0}),
+    ("16x oversampled", {'N': 16, 'L': 0}),
+    ("16x + IIR 0.3", {'N': 16, 'L': 1, 'A': 0.3}),
+    ("16x + median", {'N': 16, 'L': 2}),
+)
+
+
+def run_configuration(params, duration_s=600, tick_ms=10, noise=0.01, setpoint=1.0, seed=0, Kp=0.6, Ki=0.05):
+    model = WaveplateModel(noise=noise, seed=seed)
+    position = model_target(setpoint, 100, model.a, model.b, model.c, model.d)
+    firmware = SimulatedFirmware(model, setpoint=setpoint, position=position, Kp=Kp, Ki=Ki)
+    for command, value in {'E': 1, **params}.items():
+        firmware.apply_parameter(command, value)
+
+    moves, readings, errors = 0, 0, []
+    now_ms = 0.0
+    while now_ms < duration_s * 1000:
+        now_ms += tick_ms
+        last_read, last_steps = firmware._last_read_ms, firmware.moved_steps
+        firmware.tick(now_ms)
+        if firmware._last_read_ms != last_read:
+            readings += 1
+            errors.append(model.voltage(firmware.position) - setpoint)
+        if firmware.moved_steps != last_steps:
+            moves += 1
+    return {
+        "moves_per_min": moves / (duration_s / 60),
+        "readings_per_s": readings / duration_s,
+        "reported_noise_mv": 1000 * firmware.noise_floor,
+        "rms_error_mv": 1000 * float(np.sqrt(np.mean(np.square(errors)))),
+    }
+
+
+def run(seeds=range(3)):
+    results = []
+    for name, params in CONFIGURATIONS:
+        rows = [run_configuration(params, seed=seed) for seed in seeds]
+        results.append({"configuration": name, **{key: float(np.mean([row[key] for row in rows])) for key in rows[0]}})
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(f"{row['configuration']:>16}: {row['moves_per_min']:.1f} moves/min, {row['readings_per_s']:.1f} readings/s, "
+              f"reported noise {row['reported_noise_mv']:.2f} mV, true RMS error {row['rms_error_mv']:.1f} mV")
@@ -0,0 +1,73 @@
+# Benchmark: the original cos^2 fit (fixed initial guess, finite-difference derivatives)
+# against waveplate_fit's data-driven initial guess and analytic Jacobian.
+# Synthetic scans start at random motor positions; recorded scans can be added by passing
+# files, directories or glob patterns on the command line.
+# Run from the repository root: python benchmarks/bench_fit.py [scan files...]
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from scipy.optimize import OptimizeWarning
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from waveplate_fit import find_scans, fit_model, load_scan, model_function
+
+
+# Scans of the period-600 model starting at random positions, with photodiode noise
+def synthetic_scans(n_scans=100, n_points=60, step=20, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    scans = []
+    for _ in range(n_scans):
+        true = (rng.uniform(1.2, 2.0), rng.uniform(560, 640), rng.uniform(0.0, 0.3), rng.uniform(0, np.pi))
+        x = rng.uniform(0, 600) + step * np.arange(n_points)
+        y = model_function(x, *true) + rng.normal(0, noise, n_points)
+        scans.append((x, y, true))
+    return scans
+
+
+# Converged = period within 1% of the truth (or, for recorded scans, fit MSE within 2x the noise-free best)
+def run_method(scans, method):
+    times, nfevs, converged, mses = [], [], 0, []
+    for x, y, true in scans:
+        start = time.perf_counter()
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", OptimizeWarning)
+                params, _, nfev = fit_model(x, y, method)
+        except RuntimeError:
+            times.append(time.perf_counter() - start)
+            continue
+        times.append(time.perf_counter() - start)
+        nfevs.append(nfev)
+        mses.append(float(np.mean((model_function(x, *params) - y)**2)))
+        if true is not None and abs(params[1] - true[1]) / true[1] < 0.01:
+            converged += 1
+    return {
+        "method": method,
+        "scans": len(scans),
+        "mean_time_ms": 1000 * float(np.mean(times)),
+        "mean_nfev": float(np.mean(nfevs)) if nfevs else float('nan'),
+        "converged": converged if scans and scans[0][2] is not None else None,
+        "failed": len(scans) - len(nfevs),
+        "median_mse": float(np.median(mses)) if mses else float('nan'),
+    }
+
+
+def run(recorded=()):
+    results = {"synthetic": [run_method(synthetic_scans(), method) for method in ('legacy', 'analytic')]}
+    files = find_scans(list(recorded)) if recorded else []
+    if files:
+        scans = [(*load_scan(file), None) for file in files]
+        results["recorded"] = [run_method(scans, method) for method in ('legacy', 'analytic')]
+    return results
+
+
+if __name__ == "__main__":
+    for name, rows in run(sys.argv[1:]).items():
+        print(f"{name} scans")
+        for row in rows:
+            converged = f"{row['converged']}/{row['scans']}" if row['converged'] is not None else "-"
+            print(f"  {row['method']:>8}: {row['mean_time_ms']:.2f} ms/fit, {row['mean_nfev']:.1f} evaluations, "
+                  f"converged {converged}, failed {row['failed']}, median MSE {row['median_mse']:.2e}")
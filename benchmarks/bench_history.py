@@ -0,0 +1,72 @@
+# Micro-benchmark: per-sample cost of the plot history as the number of points grows.
+# Compares the old list append / pop(0) / min() / max() update with DataHistory.
+# Run from the repository root: python benchmarks/bench_history.py
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_history import DataHistory
+
+
+# The per-sample work update() used to do with four global lists
+def list_history(num_points, samples):
+    Voltage, Setpoint, TimeStamps, Error = [], [], [], []
+    start = time.perf_counter()
+    for t, v, s in samples:
+        Voltage.append(v)
+        Setpoint.append(s)
+        TimeStamps.append(t)
+        Error.append(v - s)
+        while len(Voltage) > num_points:
+            Voltage.pop(0)
+            Setpoint.pop(0)
+            TimeStamps.pop(0)
+            Error.pop(0)
+        min(min(Voltage), min(Setpoint))
+        max(max(Voltage), max(Setpoint))
+        min(TimeStamps)
+        max(TimeStamps)
+    return (time.perf_counter() - start) / len(samples)
+
+
+def array_history(num_points, samples):
+    history = DataHistory(num_points)
+    start = time.perf_counter()
+    for t, v, s in samples:
+        history.push(t, v, s, v - s)
+        history.min('voltage', 'setpoint')
+        history.max('voltage', 'setpoint')
+        history.min('time')
+        history.max('time')
+        history.voltage
+    return (time.perf_counter() - start) / len(samples)
+
+
+def make_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    voltage = 2.5 + 0.05 * rng.standard_normal(n)
+    return [(i * 0.05, float(v), 2.5) for i, v in enumerate(voltage)]
+
+
+# The list version is quadratic, so it is only timed up to max_list_points
+def run(sizes=(10, 100, 1000, 10000, 100000), n_samples=5000, max_list_points=10000):
+    results = []
+    for num_points in sizes:
+        samples = make_samples(n_samples + num_points)
+        list_cost = list_history(num_points, samples) * 1e6 if num_points <= max_list_points else None
+        results.append({
+            "num_points": num_points,
+            "list_us_per_sample": list_cost,
+            "array_us_per_sample": array_history(num_points, samples) * 1e6,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'num_points':>10}  {'lists (us/sample)':>18}  {'DataHistory (us/sample)':>24}")
+    for row in run():
+        list_cost = f"{row['list_us_per_sample']:.2f}" if row['list_us_per_sample'] is not None else "skipped"
+        print(f"{row['num_points']:>10}  {list_cost:>18}  {row['array_us_per_sample']:>24.2f}")
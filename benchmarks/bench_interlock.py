@@ -0,0 +1,104 @@
+# Benchmark: overvoltage trip latency of the firmware interlock (simulated time, 1 ms ticks)
+# and of the host interlock on the serial reader thread (wall-clock time, simulated port),
+# against the previous check in the GUI's 10 Hz update(). Also checks the latch: the PID and
+# motion stop, 'E1' is refused while latched and 'K1' only clears below the clear level.
+# Run from the repository root: python benchmarks/bench_interlock.py
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from interlock import Interlock
+from serial_reader import SerialReader
+from simulated_arduino import SimulatedFirmware, WaveplateModel, open_transport
+
+
+# Firmware: a spike of `spike` V for spike_ms while the PID is correcting; returns the latency (ms)
+def run_firmware(seed=0, spike=3.0, spike_ms=50, tick_ms=1.0):
+    firmware = SimulatedFirmware(WaveplateModel(noise=0.003, seed=seed), setpoint=1.0, position=100,
+                                 sample_time_ms=200)
+    firmware.apply_parameter('E', 1)
+    now_ms = 0.0
+    for _ in range(2000):  # 2 s of normal operation
+        now_ms += tick_ms
+        firmware.tick(now_ms)
+    assert not firmware.fault_latched, "tripped without a spike"
+
+    spike_start = now_ms
+    firmware.model.offset = spike
+    while not firmware.fault_latched and now_ms - spike_start < spike_ms:
+        now_ms += tick_ms
+        firmware.tick(now_ms)
+    latency_ms = now_ms - spike_start
+    assert firmware.fault_latched, "spike did not trip the interlock"
+    assert not firmware.pid_enabled and firmware._motion is None, "PID or motion still running after the trip"
+    assert firmware.take_fault_report().startswith("Fault: 1"), "no fault report after the trip"
+
+    firmware.apply_parameter('E', 1)
+    assert not firmware.pid_enabled, "'E1' accepted while latched"
+    firmware.apply_parameter('K', 1)
+    assert firmware.fault_latched, "'K1' accepted above the clear level"
+    firmware.model.offset = 0.0
+    now_ms += tick_ms
+    firmware.tick(now_ms)
+    firmware.apply_parameter('K', 1)
+    assert not firmware.fault_latched, "'K1' refused below the clear level"
+    firmware.apply_parameter('E', 1)
+    assert firmware.pid_enabled, "'E1' refused after clearing the fault"
+    return latency_ms
+
+
+# Host: spikes on a simulated port at `rate` samples/s, with the firmware interlock out of the
+# way (trip level 100 V); returns the interlock's latencies (ms) and the trips it saw
+def run_host(rate=50, spikes=10, duration_s=0.3, telemetry_format='text'):
+    port = open_transport(f"sim://?seed=1&rate={rate}", 9600, timeout=1)
+    firmware = port.firmware
+    firmware.apply_parameter('H', 100.0)
+    firmware.binary_telemetry = telemetry_format == 'binary'
+    written = []
+
+    interlock = Interlock(trip_level=4.0, clear_level=3.8, on_trip=lambda reason: written.append(time.monotonic()))
+    reader = SerialReader(port, interlock=interlock)
+    reader.start()
+    time.sleep(0.5)
+    spike_times = []
+    for _ in range(spikes):
+        firmware.model.offset = 5.0
+        spike_times.append(time.monotonic())
+        time.sleep(duration_s)
+        firmware.model.offset = 0.0
+        time.sleep(duration_s)
+        interlock.reset()
+    reader.stop()
+    port.close()
+    # From the spike starting to the trip action; includes waiting for the next sample
+    end_to_end = [1000 * (t - s) for s, t in zip(spike_times, written)]
+    return {
+        "format": telemetry_format,
+        "trips": interlock.trip_count,
+        "reader_p50_ms": float(np.percentile(np.asarray(interlock.latencies) * 1000, 50)),
+        "reader_max_ms": float(np.max(interlock.latencies) * 1000),
+        "spike_to_trip_max_ms": float(np.max(end_to_end)),
+    }
+
+
+def run(rate=50, gui_interval_ms=100):
+    firmware_ms = [run_firmware(seed) for seed in range(5)]
+    host = [run_host(rate, telemetry_format=f) for f in ('text', 'binary')]
+    return {
+        "firmware_latency_ms": float(np.max(firmware_ms)),
+        "host": host,
+        # Previous check in update(): a sample waits up to one sample period and one timer period
+        "gui_timer_worst_ms": 1000 / rate + gui_interval_ms,
+    }
+
+
+if __name__ == "__main__":
+    result = run()
+    print(f"firmware interlock: trips {result['firmware_latency_ms']:.0f} ms after the spike (simulated time)")
+    for row in result["host"]:
+        print(f"host interlock ({row['format']}): {row['trips']} trips, reader-thread latency p50 {row['reader_p50_ms']:.3f} ms, "
+              f"max {row['reader_max_ms']:.3f} ms; spike to 'E0' max {row['spike_to_trip_max_ms']:.1f} ms")
+    print(f"previous GUI-timer check: up to {result['gui_timer_worst_ms']:.0f} ms plus GUI redraw time")
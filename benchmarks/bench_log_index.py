@@ -0,0 +1,96 @@
+# Benchmark: answering "the voltage around every PID trip" over an archive of text logs,
+# by parsing every file line by line (the previous read_records) against log_index's
+# block parser, cold (building the sidecar indexes) and warm (indexes already on disk).
+# Run from the repository root: python benchmarks/bench_log_index.py
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_logger import RECORD_DTYPE, read_records
+from log_index import LogArchive, find_logs
+
+TRIP = "PID Disabled due to Voltage Limit"
+
+
+# n_files text logs of rows samples at 10 Hz, with a trip event every trip_every samples
+def write_archive(folder, n_files=20, rows=50000, trip_every=7000, seed=0):
+    rng = np.random.default_rng(seed)
+    t = 0.0
+    for k in range(n_files):
+        times = t + 0.1 * np.arange(rows)
+        voltages = 1.0 + 0.05 * rng.standard_normal(rows)
+        lines = [f"{a:.2f}\t{v:.4f}\t{1.0:.4f}\t{v - 1.0:.2f}\n" for a, v in zip(times, voltages)]
+        for row in range(trip_every, rows, trip_every)[::-1]:
+            lines.insert(row, f"Event: {TRIP} at 2024-05-{k + 1:02d} 12:00:00\n")
+        with open(os.path.join(folder, f"data_log_202405{k + 1:02d}_120000.txt"), "w") as file:
+            file.write("Time(s)\tVoltage(V)\tSet Point(V)\t Error\n")
+            file.writelines(lines)
+        t = times[-1] + 0.1
+
+
+# The previous read_records: filter the lines in Python, then np.loadtxt
+def read_lines(path):
+    with open(path, "r") as file:
+        next(file, None)
+        lines = [line for line in file if not line.startswith("Event:")]
+    table = np.loadtxt(lines, delimiter="\t", ndmin=2)
+    records = np.empty(len(table), dtype=RECORD_DTYPE)
+    for column, name in enumerate(RECORD_DTYPE.names):
+        records[name] = table[:, column]
+    return records
+
+
+# Full scan: read every file, find the event lines, cut out +-10 s around them
+def scan_all(folder, reader):
+    windows = []
+    for path in find_logs([folder]):
+        records = reader(path)
+        with open(path, "r") as file:
+            event_rows, row = [], 0
+            next(file)
+            for line in file:
+                if line.startswith("Event:"):
+                    if TRIP in line:
+                        event_rows.append(row)
+                else:
+                    row += 1
+        for row in event_rows:
+            t = records["time"][row - 1]
+            windows.append(records[(records["time"] >= t - 10) & (records["time"] <= t + 10)])
+    return windows
+
+
+def run(n_files=20):
+    with tempfile.TemporaryDirectory() as folder:
+        write_archive(folder, n_files)
+        size_mb = sum(os.path.getsize(path) for path in find_logs([folder])) / 1e6
+        results = {"files": n_files, "archive_mb": size_mb}
+
+        # Reading the whole archive
+        for name, reader in (("read_lines_s", read_lines), ("read_blocks_s", read_records)):
+            start = time.perf_counter()
+            for path in find_logs([folder]):
+                reader(path)
+            results[name] = time.perf_counter() - start
+
+        for name, query in (("line_parse_s", lambda: scan_all(folder, read_lines)),
+                            ("block_parse_s", lambda: scan_all(folder, read_records)),
+                            ("index_cold_s", lambda: [e[4] for e in LogArchive([folder]).around_events(TRIP)]),
+                            ("index_warm_s", lambda: [e[4] for e in LogArchive([folder]).around_events(TRIP)])):
+            start = time.perf_counter()
+            windows = query()
+            results[name] = time.perf_counter() - start
+            results[name.replace("_s", "_samples")] = sum(len(w) for w in windows)
+        return results
+
+
+if __name__ == "__main__":
+    result = run()
+    print(f"{result['files']} files, {result['archive_mb']:.0f} MB: read line by line in {result['read_lines_s']:.2f} s, "
+          f"block by block in {result['read_blocks_s']:.2f} s")
+    for name in ("line_parse", "block_parse", "index_cold", "index_warm"):
+        print(f"{name:>12}: {result[name + '_s']:.2f} s, {result[name + '_samples']} samples around trips")
@@ -0,0 +1,74 @@
+# Benchmark: per-sample cost of data logging for each log format (data_logger.LOGGER_FORMATS):
+# the logger itself on the calling thread, the caller-side cost of AsyncLogger.log() (what
+# GUI.py's update() pays), the time to open a new file (initDataFile / rotation) and the
+# bytes written per sample.
+# Run from the repository root: python benchmarks/bench_logging.py
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_logger import LOGGER_FORMATS, AsyncLogger, make_logger, read_records
+
+
+def make_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    voltage = 2.0 + 0.01 * rng.standard_normal(n)
+    return [(0.05 * i, float(v), 2.0, float(v) - 2.0) for i, v in enumerate(voltage)]
+
+
+def run_format(log_format, samples, rotations=20):
+    with tempfile.TemporaryDirectory() as folder:
+        # Synchronous: every write and flush on this thread
+        logger = make_logger(log_format, folder, max_records=len(samples) + 1)
+        start = time.perf_counter()
+        for sample in samples:
+            logger.log(*sample)
+        logger.close()
+        sync_s = time.perf_counter() - start
+        size = os.path.getsize(logger.filename)
+        written = len(read_records(logger.filename))
+
+        # Opening new files, as initDataFile() / rotation do
+        logger = make_logger(log_format, folder)
+        start = time.perf_counter()
+        for _ in range(rotations):
+            logger.open_file()
+        logger.close()
+        open_s = (time.perf_counter() - start) / rotations
+
+        # Asynchronous: the caller only queues, the writer thread does the rest
+        async_logger = AsyncLogger(lambda: make_logger(log_format, folder, max_records=len(samples) + 1),
+                                   max_queue_size=len(samples) + 1)
+        start = time.perf_counter()
+        for sample in samples:
+            async_logger.log(*sample)
+        caller_s = time.perf_counter() - start
+        async_logger.close()
+        drained_s = time.perf_counter() - start
+    return {
+        "format": log_format,
+        "sync_us_per_sample": 1e6 * sync_s / len(samples),
+        "async_caller_us_per_sample": 1e6 * caller_s / len(samples),
+        "async_total_us_per_sample": 1e6 * drained_s / len(samples),
+        "open_file_ms": 1000 * open_s,
+        "bytes_per_sample": size / len(samples),
+        "round_trip_ok": written == len(samples),
+        "async_dropped": async_logger.dropped_count,
+    }
+
+
+def run(n_samples=100000):
+    samples = make_samples(n_samples)
+    return [run_format(log_format, samples) for log_format in sorted(LOGGER_FORMATS)]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(f"{row['format']:>10}: {row['sync_us_per_sample']:.2f} us/sample on the caller's thread, "
+              f"{row['async_caller_us_per_sample']:.2f} us/sample through AsyncLogger "
+              f"({row['async_total_us_per_sample']:.2f} us until written), new file {row['open_file_ms']:.2f} ms, "
+              f"{row['bytes_per_sample']:.1f} bytes/sample, read back: {row['round_trip_ok']}")
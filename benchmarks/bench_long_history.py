@@ -0,0 +1,64 @@
+# Benchmark: drawing long time spans from MultiResolutionHistory against drawing every
+# sample, on an offscreen 800-pixel-wide plot (Agg), plus the per-sample push cost.
+# Run from the repository root: python benchmarks/bench_long_history.py
+import os
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_history import MultiResolutionHistory
+
+
+def draw_time(fig, line, t, v, repeats=5):
+    line.set_data(t, v)
+    line.axes.set_xlim(t[0], t[-1])
+    line.axes.set_ylim(v.min() - 0.1, v.max() + 0.1)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fig.canvas.draw()
+    return (time.perf_counter() - start) / repeats
+
+
+def run(n_samples=100000, spans=(100, 1000, 10000, 100000), width=800, seed=0):
+    rng = np.random.default_rng(seed)
+    t = 0.1 * np.arange(n_samples)  # 10 samples/s: 100000 samples is ~2.8 hours
+    v = 1.0 + 0.2 * np.sin(t / 600) + 0.01 * rng.standard_normal(n_samples)
+    history = MultiResolutionHistory()
+    start = time.perf_counter()
+    for row in zip(t, v, np.ones(n_samples)):
+        history.push(*row)
+    push_us = (time.perf_counter() - start) / n_samples * 1e6
+
+    fig, ax = plt.subplots(figsize=(width / 100, 4), dpi=100)
+    line, = ax.plot([], [], 'ro-', markersize=2, linewidth=1)
+    rows = []
+    for span in spans:
+        full_t, full_v = t[-span:], v[-span:]
+        start = time.perf_counter()
+        sel_t, sel_v, _, level = history.select(full_t[0], full_t[-1], width)
+        select_ms = (time.perf_counter() - start) * 1000
+        rows.append({
+            "samples": span,
+            "level": level,
+            "points": len(sel_t),
+            "select_ms": select_ms,
+            "full_draw_ms": draw_time(fig, line, full_t, full_v) * 1000,
+            "decimated_draw_ms": draw_time(fig, line, sel_t, sel_v) * 1000,
+            "envelope_exact": bool(sel_v.min() <= full_v.min() and sel_v.max() >= full_v.max()),
+        })
+    plt.close(fig)
+    return {"push_us": push_us, "rows": rows}
+
+
+if __name__ == "__main__":
+    result = run()
+    print(f"push: {result['push_us']:.1f} us/sample")
+    for row in result["rows"]:
+        print(f"{row['samples']:>7} samples: level {row['level']}, {row['points']:>4} points, select {row['select_ms']:.2f} ms, "
+              f"draw {row['full_draw_ms']:.1f} ms -> {row['decimated_draw_ms']:.1f} ms, envelope kept: {row['envelope_exact']}")
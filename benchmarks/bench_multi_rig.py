@@ -0,0 +1,54 @@
+# Benchmark: CPU cost per rig of device_manager.DeviceManager with N simulated rigs
+# streaming at `rate` samples/s, polled at the GUI's 10 Hz timer rate (no plotting).
+# The process CPU time includes the simulators themselves, so it is an upper bound.
+# Run from the repository root: python benchmarks/bench_multi_rig.py
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from device_manager import DeviceManager
+
+
+def run_rigs(n_rigs, rate=50, duration_s=5.0, poll_hz=10):
+    with tempfile.TemporaryDirectory() as folder:
+        rigs = [{"name": f"rig{i}", "port": f"sim://?seed={i}&rate={rate}", "Use_calibration": False}
+                for i in range(n_rigs)]
+        manager = DeviceManager(rigs, data_folder=folder)
+        manager.start()
+        while any(rig.serial_reader.port is None for rig in manager):
+            time.sleep(0.1)  # Ports open (and wait for the Arduino reset) on the reader threads
+        time.sleep(0.5)
+        manager.poll()
+
+        samples, poll_time = 0, 0.0
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        while time.perf_counter() - wall_start < duration_s:
+            start = time.perf_counter()
+            samples += sum(manager.poll().values())
+            poll_time += time.perf_counter() - start
+            time.sleep(1 / poll_hz)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        overrun = sum(rig.stats()["overrun"] for rig in manager)
+        manager.close()
+    return {
+        "rigs": n_rigs,
+        "samples_per_s": samples / wall,
+        "cpu_pct": 100 * cpu / wall,
+        "cpu_pct_per_rig": 100 * cpu / wall / n_rigs,
+        "poll_ms_per_rig": 1000 * poll_time / (wall * poll_hz) / n_rigs,
+        "overrun": overrun,
+    }
+
+
+def run(rig_counts=(1, 4, 8, 16)):
+    return [run_rigs(n) for n in rig_counts]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(f"{row['rigs']:>3} rigs: {row['samples_per_s']:.0f} samples/s, CPU {row['cpu_pct']:.1f}% "
+              f"({row['cpu_pct_per_rig']:.2f}% per rig), GUI-thread poll {row['poll_ms_per_rig']:.3f} ms per rig, "
+              f"{row['overrun']} overrun")
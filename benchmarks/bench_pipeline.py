@@ -0,0 +1,134 @@
+# Benchmark: samples/s the GUI.py acquisition pipeline sustains without Qt, i.e. the serial
+# reader's parsing plus the per-sample work of GUI.py's update() (plot history, long history,
+# async data logger, latency monitor, settling timer).
+#   - ceiling: pre-generated telemetry bytes fed straight into SerialReader.handle_bytes(),
+#     for text lines and binary frames, drained and processed every `drain_every` chunks
+#   - live: the simulated Arduino streaming at a fixed rate, drained at the GUI's 10 Hz
+# Run from the repository root: python benchmarks/bench_pipeline.py
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import telemetry
+from data_history import DataHistory, MultiResolutionHistory
+from data_logger import AsyncLogger, make_logger
+from latency_monitor import LatencyMonitor, SettlingTimer
+from serial_reader import SerialReader
+from simulated_arduino import open_transport
+
+
+# The per-sample part of GUI.py's update() (see there), without the Qt widgets
+class Consumer:
+    def __init__(self, folder, num_points=200, log_format='text'):
+        self.history = DataHistory(num_points)
+        self.long_history = MultiResolutionHistory()
+        self.data_logger = AsyncLogger(lambda: make_logger(log_format, folder, max_records=50000), max_queue_size=100000)
+        self.latency = LatencyMonitor()
+        self.settling = SettlingTimer()
+        self.start_time = time.monotonic()
+        self.processed = 0
+
+    def update(self, samples):
+        for t_read, actualVoltage, setpoint, t_parse in samples:
+            elapsed_time = t_read - self.start_time
+            error = actualVoltage - setpoint
+            self.history.push(elapsed_time, actualVoltage, setpoint, error)
+            self.long_history.push(elapsed_time, actualVoltage, setpoint)
+            self.data_logger.log(elapsed_time, actualVoltage, setpoint, error)
+            self.latency.record(t_read, t_parse, time.monotonic())
+            self.settling.update(elapsed_time, error)
+        self.processed += len(samples)
+
+    def close(self):
+        self.data_logger.close()
+        return self.data_logger.dropped_count
+
+
+def make_stream(n_samples, telemetry_format, seed=0):
+    rng = np.random.default_rng(seed)
+    voltage = 2.0 + 0.01 * rng.standard_normal(n_samples)
+    if telemetry_format == 'binary':
+        return b"".join(telemetry.encode_frame(telemetry.TELEMETRY, i % 65536, v, 2.0, 0.0, 2.0 - v, 0)
+                        for i, v in enumerate(voltage))
+    return "".join(f"Voltage:{v:.4f} output:0.00 stepsize:0.00 Error:{2.0 - v:.4f}\n" for v in voltage).encode()
+
+
+# Everything on one thread, so the rate is the pipeline's CPU ceiling
+def run_ceiling(telemetry_format, n_samples=200000, chunk_size=4096, drain_every=16):
+    stream = make_stream(n_samples, telemetry_format)
+    chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+    with tempfile.TemporaryDirectory() as folder:
+        reader = SerialReader(None, capacity=n_samples)
+        consumer = Consumer(folder)
+        parse_time = process_time = 0.0
+        for i, chunk in enumerate(chunks):
+            start = time.perf_counter()
+            reader.handle_bytes(chunk, time.monotonic())
+            parse_time += time.perf_counter() - start
+            if i % drain_every == drain_every - 1 or i == len(chunks) - 1:
+                start = time.perf_counter()
+                consumer.update(reader.buffer.drain())
+                process_time += time.perf_counter() - start
+        dropped = consumer.close()
+    return {
+        "format": telemetry_format,
+        "samples": consumer.processed,
+        "parse_us_per_sample": 1e6 * parse_time / n_samples,
+        "update_us_per_sample": 1e6 * process_time / n_samples,
+        "samples_per_s": n_samples / (parse_time + process_time),
+        "log_dropped": dropped,
+    }
+
+
+# The reader thread against a simulated port at `rate` lines/s, drained by update() at 10 Hz
+def run_live(rate, duration_s=2.0, poll_hz=10):
+    port = open_transport(f"sim://?seed=0&rate={rate}", 9600, timeout=0.1)
+    with tempfile.TemporaryDirectory() as folder:
+        reader = SerialReader(port)
+        consumer = Consumer(folder)
+        reader.start()
+        time.sleep(0.2)
+        reader.buffer.drain()
+        received_before = reader.received_count
+        update_time = 0.0
+        wall_start = time.perf_counter()
+        while time.perf_counter() - wall_start < duration_s:
+            time.sleep(1 / poll_hz)
+            start = time.perf_counter()
+            consumer.update(reader.buffer.drain())
+            update_time += time.perf_counter() - start
+        wall = time.perf_counter() - wall_start
+        received = reader.received_count - received_before
+        reader.stop()
+        port.close()
+        stats = reader.stats()
+        dropped = consumer.close()
+    return {
+        "rate": rate,
+        "samples_per_s": received / wall,
+        "update_ms_per_poll": 1000 * update_time / (wall * poll_hz),
+        "overrun": stats["overrun"],
+        "parse_dropped": stats["dropped"],
+        "log_dropped": dropped,
+    }
+
+
+def run(n_samples=200000, rates=(100, 1000, 5000), duration_s=2.0):
+    return {
+        "ceiling": [run_ceiling(f, n_samples) for f in ('text', 'binary')],
+        "live": [run_live(rate, duration_s) for rate in rates],
+    }
+
+
+if __name__ == "__main__":
+    result = run()
+    for row in result["ceiling"]:
+        print(f"{row['format']:>6} ceiling: {row['samples_per_s']:.0f} samples/s (parse {row['parse_us_per_sample']:.1f} us, "
+              f"update {row['update_us_per_sample']:.1f} us per sample), {row['log_dropped']} log drops")
+    for row in result["live"]:
+        print(f"live at {row['rate']:>5}/s: {row['samples_per_s']:.0f} samples/s received, update {row['update_ms_per_poll']:.1f} ms "
+              f"per 10 Hz poll, {row['overrun']} overrun, {row['parse_dropped']} unparsed, {row['log_dropped']} log drops")
@@ -0,0 +1,87 @@
+# Benchmark: live-plot redraw time as a function of num_points, on an offscreen (Agg) canvas
+# the size of GUI.py's plot, following update()/render(): new samples scroll the window,
+# limits move with stepped_limits, and BlitRenderer draws. Modes: 'full' (Render_mode full),
+# 'blit', and 'blit' with the min/max envelope of MultiResolutionHistory once the window
+# holds more points than the plot is wide (what GUI.py does).
+# Run from the repository root: python benchmarks/bench_redraw.py
+import os
+import sys
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_history import DataHistory, MultiResolutionHistory
+from plot_renderer import BlitRenderer, stepped_limits
+
+WIDTH = 800  # Plot width in pixels
+
+
+def run_mode(num_points, mode, frames=30, samples_per_frame=5, seed=0):
+    rng = np.random.default_rng(seed)
+    n = num_points + frames * samples_per_frame
+    t = 0.05 * np.arange(n)
+    v = 2.0 + 0.05 * np.sin(t / 5) + 0.01 * rng.standard_normal(n)
+    history = DataHistory(num_points)
+    long_history = MultiResolutionHistory()
+    for row in zip(t[:num_points], v[:num_points]):
+        history.push(row[0], row[1], 2.0, row[1] - 2.0)
+        long_history.push(row[0], row[1], 2.0)
+
+    fig, ax = plt.subplots(figsize=(WIDTH / 100, 5), dpi=100)
+    line1, = ax.plot([], [], 'ro-', label='Voltage')
+    line2, = ax.plot([], [], 'b-', label='Setpoint')
+    ax.legend(loc='upper right')
+    renderer = BlitRenderer(fig.canvas, ax, (line1, line2), max_fps=0, blit=(mode != 'full'))
+    renderer.render(force=True)  # First full draw caches the background
+    renderer.full_draws = renderer.blits = 0
+    renderer.total_render_time = 0.0
+
+    for frame in range(frames):
+        first = num_points + frame * samples_per_frame
+        for i in range(first, first + samples_per_frame):
+            history.push(t[i], v[i], 2.0, v[i] - 2.0)
+            long_history.push(t[i], v[i], 2.0)
+        if mode == 'decimated' and len(history) > WIDTH:
+            x, voltage, setpoint, _ = long_history.select(history.min('time'), history.max('time'), WIDTH)
+            line1.set_data(x, voltage)
+            line2.set_data(x, setpoint)
+        else:
+            line1.set_data(history.time, history.voltage)
+            line2.set_data(history.time, history.setpoint)
+        low, high = history.min('voltage', 'setpoint') - 0.1, history.max('voltage', 'setpoint') + 0.1
+        if renderer.blit:
+            ylim = stepped_limits(ax.get_ylim(), low, high)
+            xlim = stepped_limits(ax.get_xlim(), history.min('time'), history.max('time'))
+            if ylim:
+                ax.set_ylim(ylim)
+            if xlim:
+                ax.set_xlim(xlim)
+        else:
+            ax.set_ylim(low, high)
+            ax.set_xlim(history.min('time'), history.max('time'))
+        renderer.request()
+        renderer.render(force=True)
+    plt.close(fig)
+    return {
+        "num_points": num_points,
+        "mode": mode,
+        "mean_ms": renderer.mean_render_ms(),
+        "full_draws": renderer.full_draws,
+        "blits": renderer.blits,
+    }
+
+
+def run(sizes=(100, 1000, 10000, 100000), frames=30):
+    return [run_mode(num_points, mode, frames) for num_points in sizes for mode in ('full', 'blit', 'decimated')]
+
+
+if __name__ == "__main__":
+    print(f"{'num_points':>10}  {'full (ms)':>10}  {'blit (ms)':>10}  {'decimated (ms)':>15}")
+    rows = run()
+    for i in range(0, len(rows), 3):
+        full, blit, decimated = rows[i:i + 3]
+        print(f"{full['num_points']:>10}  {full['mean_ms']:>10.2f}  {blit['mean_ms']:>10.2f}  {decimated['mean_ms']:>15.2f}")
@@ -0,0 +1,70 @@
+# Benchmark: settling time after setpoint changes with the firmware's direction-probing PID
+# against feedforward control from the cos^2 calibration ('M1'), in simulated time.
+# The feedforward model is deliberately slightly off (calibration error) so the PID still trims.
+# Run from the repository root: python benchmarks/bench_settling.py
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from latency_monitor import SettlingTimer
+from simulated_arduino import SimulatedFirmware, WaveplateModel
+
+SETPOINTS = (1.0, 1.5, 0.5, 1.2, 0.3, 1.6, 0.8)
+
+
+def run_mode(control_mode, setpoints=SETPOINTS, tick_ms=50, timeout_s=120, seed=0, model_error=0.01):
+    model = WaveplateModel(noise=0.003, seed=seed)
+    firmware = SimulatedFirmware(model, setpoint=setpoints[0], position=100)
+    firmware.apply_parameter('E', 1)
+    firmware.apply_parameter('M', control_mode)
+    # Calibration error: amplitude and period off by model_error (relative), phase by model_error (rad)
+    calibration = (model.a * (1 + model_error), model.b * (1 + model_error), model.c, model.d + model_error)
+    for command, value in zip('abcd', calibration):
+        firmware.apply_parameter(command, value)
+
+    timer = SettlingTimer(tolerance=0.02, hold_samples=5)
+    now_ms = 0.0
+    times, moves = [], []
+    for setpoint in setpoints[1:]:
+        firmware.apply_parameter('S', setpoint)
+        timer.start(now_ms / 1000)
+        steps_before = firmware.moved_steps
+        settle_time = None
+        deadline = now_ms + timeout_s * 1000
+        while settle_time is None and now_ms < deadline:
+            now_ms += tick_ms
+            voltage = firmware.tick(now_ms)
+            settle_time = timer.update(now_ms / 1000, setpoint - voltage)
+        times.append(timeout_s if settle_time is None else settle_time)
+        moves.append(firmware.moved_steps - steps_before)
+    return {
+        "mode": "feedforward" if control_mode else "probe",
+        "changes": len(times),
+        "mean_settle_s": float(np.mean(times)),
+        "max_settle_s": float(np.max(times)),
+        "timeouts": sum(t >= timeout_s for t in times),
+        "mean_steps": float(np.mean(moves)),
+    }
+
+
+def run(seeds=range(5)):
+    results = []
+    for control_mode in (0, 1):
+        rows = [run_mode(control_mode, seed=seed) for seed in seeds]
+        results.append({
+            "mode": rows[0]["mode"],
+            "changes": sum(row["changes"] for row in rows),
+            "mean_settle_s": float(np.mean([row["mean_settle_s"] for row in rows])),
+            "max_settle_s": float(np.max([row["max_settle_s"] for row in rows])),
+            "timeouts": sum(row["timeouts"] for row in rows),
+            "mean_steps": float(np.mean([row["mean_steps"] for row in rows])),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(f"{row['mode']:>11}: settles in {row['mean_settle_s']:.1f} s on average (max {row['max_settle_s']:.1f} s), "
+              f"{row['mean_steps']:.0f} steps per change, {row['timeouts']}/{row['changes']} timed out")
@@ -0,0 +1,84 @@
+# Benchmark: time to calibrate one rig with Step_size_vs_intensity.ino's fixed-delay scan
+# (one reading every 20 steps over a full period, fitted afterwards) against the
+# coarse-to-fine CalibrationSweep, in simulated time against the simulated firmware.
+# Run from the repository root: python benchmarks/bench_sweep.py
+import os
+import sys
+import warnings
+
+import numpy as np
+from scipy.optimize import OptimizeWarning
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from calibration_sweep import CalibrationSweep
+from simulated_arduino import SimulatedFirmware, WaveplateModel
+from waveplate_fit import fit_model
+
+LINK_MS = 60  # Command frame, ACK and scan point at 9600 baud
+LEGACY_DELAY_MS = 200 + 200 + 300 + 1200  # delay() calls around every point of the old scan
+
+
+# Worst error of the step position the fit assigns to the true phase at the ends of the scan
+# (cos^2 repeats every half period, so the error is taken modulo b / 2)
+def position_error(params, model, span):
+    a, b, c, d = params
+    x = np.array([0.0, span])
+    theta = 2 * np.pi * x / model.b - model.d
+    error = (theta + d) * b / (2 * np.pi) - x
+    return float(np.max(np.abs((error + b / 4) % (b / 2) - b / 4)))
+
+
+# measure(position) against a SimulatedFirmware, advancing simulated time until the point arrives
+class SimulatedMeasurer:
+    def __init__(self, firmware, tick_ms=5):
+        self.firmware = firmware
+        self.tick_ms = tick_ms
+        self.now_ms = 0.0
+
+    def __call__(self, position=None):
+        self.now_ms += LINK_MS
+        self.firmware.tick(self.now_ms)
+        if position is not None:
+            self.firmware.apply_parameter('X', position)
+        self.firmware.apply_parameter('Y', 4)
+        while self.firmware.scan_point is None:
+            self.now_ms += self.tick_ms
+            self.firmware.tick(self.now_ms)
+        point, self.firmware.scan_point = self.firmware.scan_point, None
+        return point
+
+
+def run_legacy(model, interval=20, span=600, step_time_ms=2.0):
+    x = np.arange(0, span + 1, interval)
+    y = np.array([model.read(position) for position in x])
+    elapsed_ms = len(x) * (LEGACY_DELAY_MS + interval * step_time_ms) + 2 * 2400 + span * step_time_ms  # Plus the walk back
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", OptimizeWarning)
+        params, _, _ = fit_model(x, y)
+    return {"method": "legacy scan", "seconds": elapsed_ms / 1000, "points": len(x),
+            "position_error": position_error(params, model, span)}
+
+
+def run_sweep(model):
+    measurer = SimulatedMeasurer(SimulatedFirmware(model))
+    result = CalibrationSweep(measurer).run()
+    params = (result['a'], result['b'], result['c'], result['d'])
+    return {"method": "sweep", "seconds": measurer.now_ms / 1000, "points": result['n_points'],
+            "position_error": position_error(params, model, 600)}
+
+
+def run(seeds=range(5), noises=(0.01, 0.05)):
+    results = []
+    for noise in noises:
+        for method in (run_legacy, run_sweep):
+            rows = [method(WaveplateModel(noise=noise, seed=seed)) for seed in seeds]
+            results.append({"method": rows[0]["method"], "noise": noise,
+                            **{key: float(np.mean([row[key] for row in rows]))
+                               for key in ("seconds", "points", "position_error")}})
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(f"{row['method']:>12} ({1000 * row['noise']:.0f} mV noise): {row['seconds']:.1f} s, "
+              f"{row['points']:.0f} points, step position error {row['position_error']:.2f} steps")
@@ -0,0 +1,248 @@
+# Runs the benchmarks of this folder headless (Agg, simulated Arduino, synthetic logs and
+# scans, all seeded) and saves their results as one JSON file, so runs can be compared:
+#
+#   python benchmarks/run_benchmarks.py                      # everything -> benchmarks/results/<time>_<commit>.json
+#   python benchmarks/run_benchmarks.py pipeline redraw --quick
+#   python benchmarks/run_benchmarks.py --compare benchmarks/results/before.json     # run, then compare
+#   python benchmarks/run_benchmarks.py --compare before.json --current after.json   # compare two saved runs
+#   python benchmarks/run_benchmarks.py fit --scans "scans/*.txt"                    # also fit recorded scans
+#   python benchmarks/run_benchmarks.py --repeat 3           # keep the best of 3 runs of every metric
+#
+# The comparison lists every metric that changed by more than --threshold (relative) in
+# its bad direction: times (_ms, _us, _s), CPU (_pct), drops, failures and errors going up,
+# rates (per_s) and convergence going down, checks (True) turning False. The exit code is 1
+# if anything regressed. Timings depend on the machine: compare runs made on the same one.
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+import numpy as np
+
+BENCH_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.join(BENCH_FOLDER, '..')
+RESULTS_FOLDER = os.path.join(BENCH_FOLDER, "results")
+sys.path.insert(0, BENCH_FOLDER)
+sys.path.insert(0, REPO_FOLDER)
+
+# name: (module, run() options for --quick)
+SUITES = {
+    "pipeline": ("bench_pipeline", {"n_samples": 50000, "rates": (100, 1000), "duration_s": 1.0}),
+    "logging": ("bench_logging", {"n_samples": 20000}),
+    "redraw": ("bench_redraw", {"sizes": (100, 1000, 10000), "frames": 10}),
+    "fit": ("bench_fit", {}),
+    "history": ("bench_history", {"sizes": (10, 100, 1000, 10000), "n_samples": 2000}),
+    "long_history": ("bench_long_history", {"n_samples": 20000, "spans": (100, 1000, 10000)}),
+    "log_index": ("bench_log_index", {"n_files": 4}),
+    "interlock": ("bench_interlock", {}),
+    "daemon": ("bench_daemon", {"duration_s": 1.0, "reattach": 2}),
+    "multi_rig": ("bench_multi_rig", {"rig_counts": (1, 4)}),
+    "filter": ("bench_filter", {"seeds": (0,)}),
+    "settling": ("bench_settling", {"seeds": (0,)}),
+    "sweep": ("bench_sweep", {"seeds": (0, 1)}),
+    "autotune": ("bench_autotune", {}),
+}
+
+# Fields that say which configuration a row of results is, rather than measure it
+ID_KEYS = ("format", "mode", "method", "configuration", "num_points", "samples", "rigs", "rate", "noise",
+           "files", "clients", "scans", "changes")
+RATE = "_per_s"  # samples_per_s, readings_per_s, samples_per_s_per_client: higher is better
+HIGHER_IS_BETTER = ("converged", "speedup")
+LOWER_IS_BETTER = ("dropped", "overrun", "failed", "nfev", "error", "timeouts", "gap", "crc", "lost")
+TIME_SUFFIXES = ("_ms", "_us", "_s", "_pct", "_per_sample", "_per_rig", "_per_poll")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_FOLDER, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# JSON for the values the benchmarks return (NumPy scalars, tuples, ranges)
+def to_json(value):
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, range)):
+        return [to_json(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# +1 if a larger value is better, -1 if smaller is better, 0 if it is only informational
+def direction(path):
+    key = path.rsplit('.', 1)[-1].split('[')[0]
+    if key.endswith(RATE) or RATE + '_' in key or any(word in key for word in HIGHER_IS_BETTER):
+        return 1
+    if any(word in key for word in LOWER_IS_BETTER) or key.endswith(TIME_SUFFIXES) or '_us_' in key:
+        return -1
+    return 0
+
+
+# Merge repeated results of one benchmark, keeping the best value of every metric
+# (informational values and everything that is not a number come from the first run)
+def best_of(results, key=""):
+    first = results[0]
+    if isinstance(first, dict):
+        return {k: best_of([r[k] for r in results], k) if all(isinstance(r, dict) and k in r for r in results)
+                else v for k, v in first.items()}
+    if isinstance(first, list):
+        if all(isinstance(r, list) and len(r) == len(first) for r in results):
+            return [best_of([r[i] for r in results], key) for i in range(len(first))]
+        return first
+    if isinstance(first, (int, float)) and not isinstance(first, bool) and all(
+            isinstance(r, (int, float)) and not isinstance(r, bool) and np.isfinite(r) for r in results):
+        sign = direction(key)
+        if sign > 0:
+            return max(results)
+        if sign < 0:
+            return min(results)
+    return first
+
+
+def run_suite(name, quick=False, scans=(), repeat=1):
+    module_name, quick_options = SUITES[name]
+    options = dict(quick_options) if quick else {}
+    if name == "fit" and scans:
+        options["recorded"] = list(scans)
+    module = importlib.import_module(module_name)
+    start = time.perf_counter()
+    results, error = [], None
+    try:
+        for _ in range(repeat):
+            results.append(to_json(module.run(**options)))
+    except Exception as e:  # One broken benchmark should not lose the others' results
+        error = f"{type(e).__name__}: {e}"
+    return {"options": to_json(options), "repeat": len(results), "seconds": time.perf_counter() - start,
+            "error": error, "result": best_of(results) if results else None}
+
+
+# {"suite.rows[mode=blit,num_points=1000].mean_ms": value, ...} for every number and flag
+def flatten(value, path=""):
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            if key not in ID_KEYS:
+                items.update(flatten(item, f"{path}.{key}" if path else key))
+        return items
+    if isinstance(value, list):
+        items = {}
+        for i, item in enumerate(value):
+            labels = [f"{key}={item[key]}" for key in ID_KEYS if isinstance(item, dict) and key in item]
+            items.update(flatten(item, f"{path}[{','.join(labels) if labels else i}]"))
+        return items
+    if isinstance(value, (bool, int, float)):
+        return {path: value}
+    return {}
+
+
+# [(metric, baseline, current, relative change, regressed)] for metrics that moved more than threshold
+def compare(baseline, current, threshold=0.25):
+    rows = []
+    for suite, run in current["suites"].items():
+        if suite not in baseline["suites"]:
+            continue
+        old = flatten(baseline["suites"][suite]["result"], suite)
+        new = flatten(run["result"], suite)
+        for path in sorted(set(old) & set(new)):
+            a, b = old[path], new[path]
+            if isinstance(a, bool) or isinstance(b, bool):
+                if a != b:
+                    rows.append((path, a, b, None, bool(a) and not b))
+                continue
+            if not (np.isfinite(a) and np.isfinite(b)) or a == b:
+                continue
+            change = (b - a) / abs(a) if a else float('inf')
+            if abs(change) <= threshold:
+                continue
+            sign = direction(path)
+            rows.append((path, a, b, change, sign != 0 and change * sign < 0))
+    return rows
+
+
+def print_comparison(rows, baseline, current):
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('time')}):")
+    if not rows:
+        print("  no metric changed by more than the threshold")
+    for path, a, b, change, regressed in rows:
+        mark = "REGRESSION" if regressed else "          "
+        values = f"{a} -> {b}" if change is None else f"{a:.4g} -> {b:.4g} ({change:+.0%})"
+        print(f"  {mark} {path}: {values}")
+    if baseline["environment"].get("machine") != current["environment"].get("machine") or \
+            baseline["environment"].get("cpus") != current["environment"].get("cpus"):
+        print("  note: the runs were made on different machines; timings are not comparable")
+
+
+def default_output(environment):
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(RESULTS_FOLDER, f"{stamp}_{environment['commit'] or 'nogit'}.json")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmarks and save the results as JSON")
+    parser.add_argument('suites', nargs='*', metavar='suite', help=f"benchmarks to run (default: all): {', '.join(SUITES)}")
+    parser.add_argument('--quick', action='store_true', help="smaller workloads, for a quick check")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per benchmark; the best value of each metric is kept")
+    parser.add_argument('--scans', nargs='*', default=(), help="recorded scan files for the fit benchmark")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="results file to compare against")
+    parser.add_argument('--current', help="with --compare: compare this saved results file instead of running")
+    parser.add_argument('--threshold', type=float, default=0.25, help="relative change that counts (default 0.25)")
+    args = parser.parse_args()
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown benchmark(s) {', '.join(unknown)}; choose from {', '.join(SUITES)}")
+
+    if args.current:
+        with open(args.current, "r") as file:
+            current = json.load(file)
+    else:
+        current = {"environment": environment(), "quick": args.quick, "suites": {}}
+        for name in args.suites or SUITES:
+            print(f"Running {name}...", flush=True)
+            run = run_suite(name, args.quick, args.scans, max(1, args.repeat))
+            current["suites"][name] = run
+            status = f"failed: {run['error']}" if run["error"] else "done"
+            print(f"  {status} in {run['seconds']:.1f} s", flush=True)
+        output = args.output or default_output(current["environment"])
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"Results saved to {output}")
+
+    failed = [name for name, run in current["suites"].items() if run["error"]]
+    regressed = []
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+        if baseline.get("quick") != current.get("quick"):
+            print("note: comparing a --quick run with a full run; workloads differ")
+        rows = compare(baseline, current, args.threshold)
+        print_comparison(rows, baseline, current)
+        regressed = [row for row in rows if row[4]]
+    sys.exit(1 if failed or regressed else 0)
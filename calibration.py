@@ -0,0 +1,145 @@
+import datetime
+import json
+import os
+
+import numpy as np
+
+from waveplate_fit import PARAMETERS, fit_model, load_scan, model_function
+
+CALIBRATION_FILE = "calibration.json"
+
+
+# Fitted step-to-intensity calibration of one rig: voltage = a cos^2(2 pi x / b - d) + c,
+# where x is the firmware's absolute step counter. Inverts the model through a
+# precomputed lookup table of the phase on the monotonic branch.
+# The step counter restarts at 0 whenever the Arduino resets (every time the port is
+# opened), so the calibration also keeps `position`, the last known counter value in its
+# frame; the host sends 'Z<position>' after connecting to put the counter back. Without
+# a position the calibration cannot be placed and is not used.
+class Calibration:
+    def __init__(self, a, b, c, d, covariance=None, rig=None, timestamp=None, source=None, position=None,
+                 lut_size=2048):
+        self.a, self.b, self.c, self.d = float(a), float(b), float(c), float(d)
+        self.covariance = None if covariance is None else np.asarray(covariance, dtype=float)
+        self.rig = rig
+        self.timestamp = timestamp
+        self.source = source
+        self.position = None if position is None else int(position)
+
+        # phi(v) = arccos(sqrt((v - c) / a)) in [0, pi/2], tabulated over the reachable voltages
+        self._lut_voltage = np.linspace(self.min_voltage, self.max_voltage, lut_size)
+        fraction = np.clip((self._lut_voltage - self.c) / self.a, 0.0, 1.0)
+        self._lut_phase = np.arccos(np.sqrt(fraction))
+
+    @property
+    def params(self):
+        return self.a, self.b, self.c, self.d
+
+    @property
+    def min_voltage(self):
+        return min(self.c, self.a + self.c)
+
+    @property
+    def max_voltage(self):
+        return max(self.c, self.a + self.c)
+
+    def voltage(self, step):
+        return model_function(step, *self.params)
+
+    # All step positions giving `voltage` within [low, high]
+    def steps_for_voltage(self, voltage, low, high):
+        phase = np.interp(np.clip(voltage, self.min_voltage, self.max_voltage), self._lut_voltage, self._lut_phase)
+        # theta = 2 pi x / b - d must be +-phase + k pi
+        theta_range = sorted((2 * np.pi * low / self.b - self.d, 2 * np.pi * high / self.b - self.d))
+        k = np.arange(int(np.floor(theta_range[0] / np.pi)) - 1, int(np.ceil(theta_range[1] / np.pi)) + 2)
+        theta = np.concatenate((phase + k * np.pi, -phase + k * np.pi))
+        steps = (theta + self.d) * self.b / (2 * np.pi)
+        return np.sort(steps[(steps >= low) & (steps <= high)])
+
+    # Step position nearest to `near` that gives `voltage`
+    def target_step(self, voltage, near=0.0):
+        steps = self.steps_for_voltage(voltage, near - abs(self.b), near + abs(self.b))
+        return int(round(steps[np.argmin(np.abs(steps - near))]))
+
+    def to_dict(self):
+        return {
+            "rig": self.rig,
+            "timestamp": self.timestamp,
+            "source": self.source,
+            "position": self.position,
+            **dict(zip(PARAMETERS, self.params)),
+            "covariance": None if self.covariance is None else self.covariance.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(*(entry[name] for name in PARAMETERS), covariance=entry.get("covariance"),
+                   rig=entry.get("rig"), timestamp=entry.get("timestamp"), source=entry.get("source"),
+                   position=entry.get("position"))
+
+
+# Persistent calibrations keyed by rig (serial port) in a JSON file, newest last.
+# Entries are never deleted; invalidate() marks them so latest() skips them.
+class CalibrationStore:
+    def __init__(self, filename=CALIBRATION_FILE):
+        self.filename = filename
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, "r") as file:
+                self._entries = json.load(file)
+        except FileNotFoundError:
+            self._entries = {}
+
+    def save(self):
+        temporary = self.filename + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(self._entries, file, indent=1)
+        os.replace(temporary, self.filename)  # Never leave a half-written store behind
+
+    # position: step counter of the rig when the calibration was taken (see Calibration)
+    def add(self, rig, params, covariance=None, source=None, position=None):
+        entry = Calibration(*params, covariance=covariance, rig=rig, source=source, position=position,
+                            timestamp=datetime.datetime.now().isoformat(timespec='seconds')).to_dict()
+        entry["valid"] = True
+        self._entries.setdefault(rig, []).append(entry)
+        self.save()
+        return Calibration.from_dict(entry)
+
+    # Newest valid calibration of a rig, or None
+    def latest(self, rig):
+        for entry in reversed(self._entries.get(rig, [])):
+            if entry.get("valid", True):
+                return Calibration.from_dict(entry)
+        return None
+
+    def history(self, rig):
+        return [dict(entry) for entry in self._entries.get(rig, [])]
+
+    # Mark every calibration of a rig as stale (e.g. after the optics were touched)
+    def invalidate(self, rig):
+        for entry in self._entries.get(rig, []):
+            entry["valid"] = False
+        self.save()
+
+    # Record the rig's current step counter in its newest valid calibration. Reloads the
+    # file first, so stores of other rigs (other RigChannels) do not overwrite each other.
+    def set_position(self, rig, position):
+        self.load()
+        for entry in reversed(self._entries.get(rig, [])):
+            if entry.get("valid", True):
+                entry["position"] = int(position)
+                self.save()
+                return
+
+    # Fit a new scan, store it as the rig's current calibration and return it. position is
+    # where the motor is now, in the scan's steps (e.g. 0 once Step_size_vs_intensity.ino went
+    # back to its origin); where a scan left the motor is not known from its points, so
+    # without it the calibration is stored without a position and not used until set_position().
+    def refresh(self, rig, scan_file, position=None):
+        x_data, y_data = load_scan(scan_file)
+        params, params_covariance, _ = fit_model(x_data, y_data)
+        self.invalidate(rig)
+        return self.add(rig, params, params_covariance, source=str(scan_file), position=position)
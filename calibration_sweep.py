@@ -0,0 +1,183 @@
+# Host-driven calibration sweep for FINAL_WAVEPLATE_SCRIPT.ino, replacing the fixed-delay
+# scan of Step_size_vs_intensity.ino. A coarse pass over one period finds the period and
+# extrema, then points are added in small batches where they reduce the fit uncertainty
+# most, refitting after every batch, until the calibrated step position is known to within
+# `position_tolerance` steps.
+#
+# Usage: python calibration_sweep.py [port]   (default WAVEPLATE_PORT or COM6; 'sim://' works)
+import os
+import queue
+import sys
+import time
+import warnings
+
+import numpy as np
+from scipy.optimize import OptimizeWarning, curve_fit
+
+from calibration import CalibrationStore
+from command_channel import CommandChannel
+from serial_reader import SerialReader
+from simulated_arduino import open_transport
+from waveplate_fit import estimate_parameters, model_function, model_jacobian
+
+
+# Measures scan points through the firmware's 'X' (move) and 'Y' (measure) commands.
+# Pass handle_point as the SerialReader's scan_handler.
+class PortMeasurer:
+    def __init__(self, channel, readings=4, timeout=10.0):
+        self.channel = channel
+        self.readings = readings  # Oversampled readings the firmware averages per point
+        self.timeout = timeout
+        self._points = queue.Queue()
+
+    def handle_point(self, position, voltage):
+        self._points.put((position, voltage))
+
+    # Move to `position` (None: stay) and return the measured (position, voltage)
+    def __call__(self, position=None):
+        while not self._points.empty():
+            self._points.get_nowait()  # Stale points from an earlier request
+        params = {'Y': self.readings} if position is None else {'X': int(position), 'Y': self.readings}
+        if not self.channel.send(params):
+            raise RuntimeError(f"Scan request not acknowledged: {params}")
+        try:
+            return self._points.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No scan point received for position {position}") from None
+
+
+class CalibrationSweep:
+    def __init__(self, measure, period_guess=600, coarse_points=12, batch_size=6, max_points=120,
+                 position_tolerance=0.5, voltage_tolerance=0.005, on_point=None):
+        self.measure = measure  # measure(position) -> (position, voltage); measure() stays put
+        self.period_guess = period_guess
+        self.coarse_points = coarse_points
+        self.batch_size = batch_size
+        self.max_points = max_points
+        self.position_tolerance = position_tolerance  # Standard error of the calibrated step position
+        self.voltage_tolerance = voltage_tolerance  # Standard error of the amplitude and offset
+        self.on_point = on_point  # Called with (position, voltage) as points arrive
+        self.x, self.y = [], []
+        self.params = None
+        self.covariance = None
+        self.fits = 0
+
+    def _measure(self, position=None):
+        position, voltage = self.measure(position)
+        self.x.append(position)
+        self.y.append(voltage)
+        if self.on_point:
+            self.on_point(position, voltage)
+        return position
+
+    # Refit all points so far, starting from the previous fit; returns False if the fit failed
+    def _fit(self):
+        x, y = np.asarray(self.x, dtype=float), np.asarray(self.y, dtype=float)
+        p0 = self.params if self.params is not None else estimate_parameters(x, y)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", OptimizeWarning)
+                params, covariance = curve_fit(model_function, x, y, p0=p0, jac=model_jacobian)
+        except RuntimeError:
+            params, covariance = np.asarray(estimate_parameters(x, y)), None
+        self.fits += 1
+        self.params = params
+        self.covariance = covariance if covariance is not None and np.all(np.isfinite(covariance)) else None
+        return self.covariance is not None
+
+    # Largest standard error of the step position x = (theta + d) b / (2 pi) over the scanned range
+    def position_error(self):
+        if self.covariance is None:
+            return np.inf
+        _, b, _, _ = self.params
+        x = np.array([min(self.x), max(self.x)], dtype=float)
+        gradient = np.zeros((len(x), 4))
+        gradient[:, 1] = x / b  # dx/db at fixed theta
+        gradient[:, 3] = b / (2 * np.pi)  # dx/dd
+        variance = np.einsum('ij,jk,ik->i', gradient, self.covariance, gradient)
+        return float(np.sqrt(np.max(variance)))
+
+    def converged(self):
+        if self.covariance is None:
+            return False
+        errors = np.sqrt(np.diag(self.covariance))
+        return (self.position_error() <= self.position_tolerance
+                and errors[0] <= self.voltage_tolerance and errors[2] <= self.voltage_tolerance)
+
+    # Greedy batch of unmeasured positions with the largest prediction variance, updating
+    # the covariance after each pick as if the point had been measured
+    def _next_positions(self, low, high):
+        candidates = np.arange(low, high + 1, max(1, int(self.period_guess // 150)))
+        candidates = candidates[~np.isin(candidates, self.x)]
+        jacobian = model_jacobian(candidates, *self.params)
+        residual = np.asarray(self.y) - model_function(np.asarray(self.x, dtype=float), *self.params)
+        noise = max(float(np.var(residual)), 1e-8)
+        covariance = self.covariance.copy()
+        chosen = []
+        for _ in range(min(self.batch_size, len(candidates))):
+            spread = jacobian @ covariance
+            variance = np.einsum('ij,ij->i', spread, jacobian)
+            variance[chosen] = -np.inf
+            best = int(np.argmax(variance))
+            chosen.append(best)
+            gain = spread[best]
+            covariance -= np.outer(gain, gain) / (noise + variance[best])
+        return candidates[chosen]
+
+    # Run the sweep from the current position; returns a summary like waveplate_fit.fit_scan()
+    def run(self):
+        start = self._measure()
+        span = int(round(self.period_guess))
+        for position in np.linspace(start, start + span, self.coarse_points).round().astype(int)[1:]:
+            self._measure(position)
+        self._fit()
+
+        forward = False  # Serpentine order keeps the travel between batches short
+        while not self.converged() and len(self.x) < self.max_points:
+            if self.covariance is None:
+                # No usable fit yet: fill in between the points taken so far
+                offset = (self.fits % 4 + 1) / 5
+                positions = (start + (np.arange(self.batch_size) + offset) * span / self.batch_size).round().astype(int)
+            else:
+                positions = np.sort(self._next_positions(start, start + span))
+            for position in (positions if forward else positions[::-1]):
+                self._measure(position)
+            forward = not forward
+            self._fit()
+
+        errors = np.sqrt(np.diag(self.covariance)) if self.covariance is not None else np.full(4, np.nan)
+        return {
+            **dict(zip(('a', 'b', 'c', 'd'), self.params)),
+            **{f"{name}_err": err for name, err in zip(('a', 'b', 'c', 'd'), errors)},
+            "covariance": self.covariance,
+            "position_error": self.position_error(),
+            "converged": self.converged(),
+            "n_points": len(self.x),
+            "fits": self.fits,
+        }
+
+
+if __name__ == "__main__":
+    port_name = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('WAVEPLATE_PORT', 'COM6')
+    port = open_transport(port_name, 9600, timeout=0.5)
+    channel = CommandChannel(port)
+    measurer = PortMeasurer(channel)
+    reader = SerialReader(port, reply_handler=channel.handle_reply, scan_handler=measurer.handle_point)
+    reader.start()
+    time.sleep(2)  # Wait for the Arduino to reset after the port opens
+
+    channel.send({'E': 0})  # The PID must not move the motor during the sweep
+    started = time.monotonic()
+    sweep = CalibrationSweep(measurer, on_point=lambda position, voltage: print(f"{position}\t{voltage:.4f}"))
+    result = sweep.run()
+    print(f"{result['n_points']} points in {time.monotonic() - started:.1f} s, position error "
+          f"{result['position_error']:.2f} steps, converged: {result['converged']}")
+    print(f"y = {result['a']:.4f} (cos(2πx/{result['b']:.4f} - {result['d']:.4f}))^2 + {result['c']:.4f}")
+
+    if result['converged']:
+        store = CalibrationStore()
+        store.invalidate(port_name)
+        # The motor stays at the last measured point: the step counter the GUI restores after connecting
+        store.add(port_name, sweep.params, sweep.covariance, source="calibration_sweep", position=sweep.x[-1])
+    reader.stop()
+    port.close()
@@ -0,0 +1,195 @@
+import queue
+import threading
+import time
+
+import serial
+
+# Parameter commands understood by the firmware ('F' selects text (0) or binary (1) telemetry,
+# 'X' moves to an absolute step position, 'Z' sets the firmware's step counter, 'M' selects
+# probing (0) or feedforward (1) control, 'a'/'b'/'c'/'d' set the feedforward model, 'N' sets
+# the oversampling count, 'L' the filter (0 none, 1 IIR, 2 median), 'A' the IIR coefficient,
+# 'R' / 'Q' the read intervals in ms while settling / locked, 'Y' requests a scan point,
+# 'H' / 'G' the interlock's trip / clear levels in V, 'K1' clears a latched interlock fault)
+COMMANDS = ('S', 'P', 'I', 'D', 'E', 'T', 'F', 'X', 'Z', 'M', 'a', 'b', 'c', 'd', 'N', 'L', 'A', 'R', 'Q', 'Y',
+            'H', 'G', 'K')
+# Longest line the firmware accepts (serialBufferSize in FINAL_WAVEPLATE_SCRIPT.ino); it drops
+# longer lines and answers a frame with "NAK <seq> length"
+MAX_FRAME_LENGTH = 96
+
+
+# XOR of the payload characters, sent as two hex digits (NMEA style)
+def checksum(payload):
+    value = 0
+    for char in payload.encode():
+        value ^= char
+    return value
+
+
+# A value as sent to the firmware: whole numbers (step positions, counts, flags) exactly,
+# the rest to 6 significant digits, about what the firmware's float keeps
+def format_value(value):
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.6g}"
+
+
+# Frame several parameters into one line: "!<seq> S2.5 P3.3 I0.3*<checksum>\n";
+# raises ValueError if the frame is longer than the firmware accepts
+def encode_frame(seq, params):
+    for command in params:
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command {command!r}, expected one of {COMMANDS}")
+    payload = " ".join([str(seq)] + [f"{command}{format_value(value)}" for command, value in params.items()])
+    frame = f"!{payload}*{checksum(payload):02X}"
+    if len(frame) > MAX_FRAME_LENGTH:
+        raise ValueError(f"Frame of {len(frame)} characters is longer than the firmware's {MAX_FRAME_LENGTH}: {frame}")
+    return (frame + "\n").encode()
+
+
+class ChecksumError(ValueError):
+    def __init__(self, seq):
+        super().__init__(f"Checksum mismatch in frame {seq}")
+        self.seq = seq
+
+
+# Parse a frame back into (seq, [(command, value), ...]); raises ValueError if it is malformed
+def decode_frame(line):
+    line = line.strip()
+    if not line.startswith('!') or '*' not in line:
+        raise ValueError(f"Not a command frame: {line!r}")
+    payload, _, received = line[1:].rpartition('*')
+    tokens = payload.split()
+    if not tokens:
+        raise ValueError(f"Empty command frame: {line!r}")
+    seq = int(tokens[0])
+    if int(received, 16) != checksum(payload):
+        raise ChecksumError(seq)
+    params = []
+    for token in tokens[1:]:
+        if token[0] not in COMMANDS:
+            raise ValueError(f"Unknown command {token[0]!r}")
+        params.append((token[0], float(token[1:])))
+    return seq, params
+
+
+# True for the firmware's "ACK <seq>" / "NAK <seq> <reason>" replies
+def is_reply(line):
+    return line.startswith("ACK") or line.startswith("NAK")
+
+
+# Sends framed parameter updates and waits for the firmware's acknowledgement,
+# retrying on NAK or timeout. port is a serial-like object or a callable returning
+# the current one. Replies are either fed in by the serial reader thread through
+# handle_reply(), or (read_replies=True) read straight from the port while waiting.
+class CommandChannel:
+    def __init__(self, port, ack_timeout=0.5, retries=3, read_replies=False):
+        self._get_port = port if callable(port) else (lambda: port)
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.read_replies = read_replies
+        self.sent_count = 0
+        self.acked_count = 0
+        self.failed_count = 0
+        self.retry_count = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._replies = {}  # seq -> "ACK" / "NAK"
+        self._waiting = set()  # Sequence numbers still expecting a reply
+        self._reply_event = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()  # One write to the port at a time: frames and write() never interleave
+        self._jobs = None
+
+    def _next_seq(self):
+        with self._lock:
+            self._seq = (self._seq + 1) % 10000
+            self._waiting.add(self._seq)
+            return self._seq
+
+    # Called with every "ACK"/"NAK" line received from the firmware
+    def handle_reply(self, line):
+        parts = line.split()
+        try:
+            seq = int(parts[1])
+        except (IndexError, ValueError):
+            return
+        with self._lock:
+            if seq in self._waiting:  # Ignore late replies to frames that already timed out
+                self._replies[seq] = parts[0]
+                self._reply_event.notify_all()
+
+    def _wait_reply(self, port, seq, deadline):
+        if self.read_replies:
+            while time.monotonic() < deadline:
+                line = port.readline().decode('utf-8', errors='replace').strip()
+                if is_reply(line):
+                    self.handle_reply(line)
+                    if seq in self._replies:
+                        break
+        with self._lock:
+            while seq not in self._replies:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._reply_event.wait(remaining)
+            self._waiting.discard(seq)
+            return self._replies.pop(seq, None)
+
+    # Write raw bytes (e.g. the interlock's legacy "E0" line) to the port between frames, at
+    # once rather than queued behind them; False if the port is not open
+    def write(self, data):
+        port = self._get_port()
+        if not (port and port.is_open):
+            return False
+        with self._write_lock:
+            port.write(data)
+        return True
+
+    # Send all params ({'S': 2.5, 'P': 3.3, ...}) in one frame; True once acknowledged
+    def send(self, params):
+        if not params:
+            return True
+        for attempt in range(self.retries + 1):
+            port = self._get_port()
+            if not (port and port.is_open):
+                break
+            seq = self._next_seq()
+            try:
+                frame = encode_frame(seq, params)
+            except ValueError as e:  # Retrying cannot help; the caller should split the update
+                print(f"Parameter update not sent: {e}")
+                with self._lock:
+                    self._waiting.discard(seq)
+                break
+            try:
+                with self._write_lock:
+                    port.write(frame)
+            except serial.SerialException as e:
+                print(f"Error writing to serial port: {e}")
+                with self._lock:
+                    self._waiting.discard(seq)
+                break
+            self.sent_count += 1
+            reply = self._wait_reply(port, seq, time.monotonic() + self.ack_timeout)
+            if reply == "ACK":
+                self.acked_count += 1
+                return True
+            if attempt < self.retries:
+                self.retry_count += 1
+        self.failed_count += 1
+        print(f"Parameter update not acknowledged: {params}")
+        return False
+
+    # Queue params to be sent on a background thread; callback(ok) runs on that thread
+    def submit(self, params, callback=None):
+        if self._jobs is None:
+            self._jobs = queue.Queue()
+            threading.Thread(target=self._run, name="command-channel", daemon=True).start()
+        self._jobs.put((dict(params), callback))
+
+    def _run(self):
+        while True:
+            params, callback = self._jobs.get()
+            ok = self.send(params)
+            if callback:
+                callback(ok)
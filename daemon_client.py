@@ -0,0 +1,273 @@
+# Client side of acquisition_daemon.py, for scripts and notebooks:
+#
+#     with DaemonClient() as client:
+#         client.set("rig0", S=2.0)
+#         client.subscribe("rig0")
+#         batch = client.samples(timeout=1.0)  # {"rig": ..., "time": array, "voltage": array, "setpoint": array}
+#
+# DaemonSerial makes the daemon look like the Arduino's serial port ("daemon://127.0.0.1:8765/rig0",
+# see simulated_arduino.open_transport), so GUI.py and PID_Update_Parameters.py attach to a running
+# daemon unchanged: samples arrive as text telemetry lines and parameter lines and frames are
+# forwarded as "set" requests, acknowledged with "ACK <seq>" once the daemon accepted them.
+import json
+import queue
+import socket
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import serial
+
+from command_channel import decode_frame
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+
+
+class DaemonError(Exception):
+    pass
+
+
+class DaemonClient:
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=5.0, on_message=None, max_queued=1000):
+        self.timeout = timeout
+        self.on_message = on_message  # Receives every stream message on the receive thread; None: queue them
+        self.messages = queue.Queue(max_queued)
+        self.dropped = 0  # Stream messages dropped because samples() was not called often enough
+        self.connected = True
+        self._socket = socket.create_connection(address, timeout=timeout)
+        self._socket.settimeout(None)
+        self._file = self._socket.makefile("rb")
+        self._send_lock = threading.Lock()
+        self._replies = {}
+        self._reply_event = threading.Condition()
+        self._next_id = 0
+        self._thread = threading.Thread(target=self._receive_loop, name="daemon-client", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _receive_loop(self):
+        try:
+            for line in self._file:
+                message = json.loads(line)
+                if message.get("type") == "reply":
+                    with self._reply_event:
+                        self._replies[message["id"]] = message
+                        self._reply_event.notify_all()
+                elif self.on_message:
+                    self.on_message(message)
+                else:
+                    try:
+                        self.messages.put_nowait(message)
+                    except queue.Full:
+                        self.dropped += 1
+        except (OSError, ValueError):
+            pass
+        with self._reply_event:
+            self.connected = False
+            self._reply_event.notify_all()
+
+    # Send one request and wait for its reply; returns the result or raises DaemonError
+    def request(self, cmd, **args):
+        with self._reply_event:
+            self._next_id += 1
+            request_id = self._next_id
+        with self._send_lock:
+            try:
+                self._socket.sendall(json.dumps({"cmd": cmd, "id": request_id, **args}).encode() + b"\n")
+            except OSError as e:
+                raise DaemonError(f"Connection to the daemon lost: {e}")
+        deadline = time.monotonic() + self.timeout
+        with self._reply_event:
+            while request_id not in self._replies:
+                remaining = deadline - time.monotonic()
+                if not self.connected or remaining <= 0:
+                    raise DaemonError(f"No reply from the daemon to {cmd!r}")
+                self._reply_event.wait(remaining)
+            reply = self._replies.pop(request_id)
+        if not reply["ok"]:
+            raise DaemonError(reply["error"])
+        return reply["result"]
+
+    def rigs(self):
+        return self.request("rigs")
+
+    def status(self, rig=None):
+        return self.request("status", rig=rig)
+
+    # Parameter commands, e.g. set("rig0", S=2.0, P=3.3) or set("rig0", E=0)
+    def set(self, rig=None, **params):
+        return self.request("set", rig=rig, params=params)
+
+    def enable(self, rig=None, enabled=True):
+        return self.set(rig, E=int(enabled))
+
+    def log_event(self, message, rig=None):
+        return self.request("event", rig=rig, message=message)
+
+    # The last `points` plotted samples as {"time": array, "voltage": array, "setpoint": array}
+    def history(self, rig=None, points=None):
+        result = self.request("history", rig=rig, **({} if points is None else {"points": points}))
+        return {field: np.asarray(values) for field, values in result.items()}
+
+    def subscribe(self, rig=None):
+        return self.request("subscribe", rig=rig)
+
+    def unsubscribe(self, rig=None):
+        return self.request("unsubscribe", rig=rig)
+
+    # Next batch of subscribed samples (arrays), or None after `timeout` seconds
+    def samples(self, timeout=None):
+        try:
+            message = self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return {key: np.asarray(value) if isinstance(value, list) else value for key, value in message.items()}
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+# Serial-port-like view of one rig of the daemon. Implements the parts of serial.Serial used by
+# the scripts, like simulated_arduino.SimulatedSerial. line_format 'gui' sends "voltage setpoint"
+# lines, 'verbose' sends "Voltage:2.0100 Setpoint:2.0000 Error:-0.0100" lines (PID_Update_Parameters.py).
+class DaemonSerial:
+    def __init__(self, address=DEFAULT_ADDRESS, rig=None, line_format='gui', timeout=None):
+        self.rig = rig
+        self.line_format = line_format
+        self.timeout = timeout
+        self.port = f"daemon://{address[0]}:{address[1]}/{rig or ''}"
+        self._rx = bytearray()
+        self._tx = bytearray()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()  # Writers (command channel, interlock) take turns
+        try:
+            self.client = DaemonClient(address, on_message=self._on_message)
+            self.client.subscribe(rig)
+        except (OSError, DaemonError) as e:
+            raise serial.SerialException(f"Could not attach to the acquisition daemon at {self.port}: {e}")
+        self.is_open = True
+
+    def _on_message(self, message):
+        if message.get("type") != "samples":
+            return
+        if self.line_format == 'verbose':
+            lines = [f"Voltage:{v:.4f} Setpoint:{s:.4f} Error:{s - v:.4f}\n"
+                     for v, s in zip(message["voltage"], message["setpoint"])]
+        else:
+            lines = [f"{v:.4f} {s:.4f}\n" for v, s in zip(message["voltage"], message["setpoint"])]
+        with self._condition:
+            self._rx += "".join(lines).encode()
+            self._condition.notify_all()
+
+    # Send a legacy "<command><value>" line or a "!<seq> ..." frame to the daemon; returns
+    # the firmware-style reply to a frame ("ACK <seq>" / "NAK <seq> <reason>"), None for a line
+    def _forward(self, line):
+        if line.startswith('!'):
+            try:
+                seq, params = decode_frame(line)
+            except ValueError as e:
+                return f"NAK {getattr(e, 'seq', 0)} {e}\n"
+            try:
+                self.client.set(self.rig, **dict(params))
+            except DaemonError as e:
+                return f"NAK {seq} {e}\n"
+            return f"ACK {seq}\n"
+        try:
+            self.client.set(self.rig, **{line[0]: float(line[1:])})
+        except (ValueError, DaemonError) as e:
+            print(f"Daemon refused {line!r}: {e}")
+        return None
+
+    @property
+    def in_waiting(self):
+        with self._condition:
+            return len(self._rx)
+
+    def write(self, data):
+        if not (self.is_open and self.client.connected):
+            raise serial.SerialException("The acquisition daemon is not connected")
+        with self._write_lock:
+            self._tx += data
+            while b'\n' in self._tx:
+                line, _, rest = bytes(self._tx).partition(b'\n')
+                self._tx = bytearray(rest)
+                line = line.decode('utf-8', errors='replace').strip()
+                if not line:
+                    continue
+                reply = self._forward(line)
+                if reply:
+                    with self._condition:
+                        self._rx += reply.encode()
+                        self._condition.notify_all()
+        return len(data)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._condition:
+            while len(self._rx) < size and self.is_open:
+                if not self.client.connected:
+                    if not self._rx:
+                        raise serial.SerialException("Connection to the acquisition daemon lost")
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(0.1 if remaining is None else min(remaining, 0.1))
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+        return data
+
+    def readline(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._condition:
+            while b'\n' not in self._rx and self.is_open and self.client.connected:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(0.1 if remaining is None else min(remaining, 0.1))
+            end = self._rx.find(b'\n') + 1 or len(self._rx)
+            data = bytes(self._rx[:end])
+            del self._rx[:end]
+        return data
+
+    def reset_input_buffer(self):
+        with self._condition:
+            self._rx.clear()
+
+    # Detach from the daemon; acquisition carries on there
+    def close(self):
+        with self._condition:
+            self.is_open = False
+            self._condition.notify_all()
+        self.client.close()
+
+
+# (address, rig, options) of a "daemon://127.0.0.1:8765/rig0?format=verbose" URL
+def parse_daemon_url(url):
+    parsed = urlparse(url)
+    query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+    address = (parsed.hostname or DEFAULT_ADDRESS[0], parsed.port or DEFAULT_ADDRESS[1])
+    return address, parsed.path.strip('/') or None, query
+
+
+# Build a DaemonSerial from a "daemon://127.0.0.1:8765/rig0?format=verbose" URL
+def daemon_serial_from_url(url, timeout=None):
+    address, rig, query = parse_daemon_url(url)
+    return DaemonSerial(address, rig, line_format=query.get('format', 'gui'), timeout=timeout)
+
+
+# The daemon's "status" of the rig of a daemon:// URL: its settings, PID and interlock state
+def daemon_status(url, timeout=5.0):
+    address, rig, _ = parse_daemon_url(url)
+    with DaemonClient(address, timeout=timeout) as client:
+        return client.status(rig)
@@ -0,0 +1,243 @@
+from collections import deque
+
+import numpy as np
+
+
+# Sliding-window minimum/maximum of the last N pushed values in O(1) amortized time per push
+class _WindowExtrema:
+    def __init__(self):
+        self._min = deque()  # (sequence number, value) with increasing values
+        self._max = deque()  # (sequence number, value) with decreasing values
+
+    def push(self, seq, value):
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+
+    # Forget values whose sequence number is older than first_seq
+    def evict(self, first_seq):
+        while self._min and self._min[0][0] < first_seq:
+            self._min.popleft()
+        while self._max and self._max[0][0] < first_seq:
+            self._max.popleft()
+
+    def clear(self):
+        self._min.clear()
+        self._max.clear()
+
+    def min(self):
+        return self._min[0][1]
+
+    def max(self):
+        return self._max[0][1]
+
+
+# Fixed-capacity history of the plotted columns backed by one preallocated NumPy array.
+# Every sample is written twice (at i and i + capacity) so the last N samples are always
+# one contiguous slice, which lets line.set_data() take views instead of copies.
+class DataHistory:
+    FIELDS = ('time', 'voltage', 'setpoint', 'error')
+
+    def __init__(self, capacity=200):
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = int(capacity)
+        self._data = np.zeros((len(self.FIELDS), 2 * self.capacity))
+        self._head = 0  # Next write position in [0, capacity)
+        self._count = 0
+        self._seq = 0  # Total number of samples ever pushed
+        self._extrema = {field: _WindowExtrema() for field in self.FIELDS}
+
+    def __len__(self):
+        return self._count
+
+    def push(self, time, voltage, setpoint, error):
+        row = (time, voltage, setpoint, error)
+        self._data[:, self._head] = row
+        self._data[:, self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+        first_seq = self._seq + 1 - self._count
+        for field, value in zip(self.FIELDS, row):
+            extrema = self._extrema[field]
+            extrema.push(self._seq, value)
+            extrema.evict(first_seq)
+        self._seq += 1
+
+    # Ordered, zero-copy view of the last len(self) samples of one column
+    def view(self, field):
+        start = (self._head - self._count) % self.capacity
+        return self._data[self.FIELDS.index(field), start:start + self._count]
+
+    @property
+    def time(self):
+        return self.view('time')
+
+    @property
+    def voltage(self):
+        return self.view('voltage')
+
+    @property
+    def setpoint(self):
+        return self.view('setpoint')
+
+    @property
+    def error(self):
+        return self.view('error')
+
+    def min(self, *fields):
+        return min(self._extrema[field].min() for field in fields)
+
+    def max(self, *fields):
+        return max(self._extrema[field].max() for field in fields)
+
+    def clear(self):
+        self._allocate(self.capacity)
+
+    # Change the capacity, keeping the most recent samples that still fit
+    def resize(self, capacity):
+        capacity = int(capacity)
+        if capacity == self.capacity:
+            return
+        keep = min(self._count, capacity)
+        recent = [self.view(field)[self._count - keep:].copy() for field in self.FIELDS]
+        self._allocate(capacity)
+        for row in zip(*recent):
+            self.push(*row)
+
+
+# Ring buffer of named float columns, written twice like DataHistory so the stored rows
+# are always one contiguous, time-ordered slice
+class _ColumnRing:
+    def __init__(self, fields, capacity):
+        self.fields = fields
+        self.capacity = int(capacity)
+        self._data = np.zeros((len(fields), 2 * self.capacity))
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, row):
+        self._data[:, self._head] = row
+        self._data[:, self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def view(self, field):
+        start = (self._head - self._count) % self.capacity
+        return self._data[self.fields.index(field), start:start + self._count]
+
+    def clear(self):
+        self._head = self._count = 0
+
+
+# Long plot history at several resolutions: the raw samples plus levels of min/max/mean
+# buckets, each level merging `factor` buckets of the one below. select() picks the finest
+# level that covers the requested time span in at most max_points points, so a plot
+# of any span (a few seconds to days) draws about one point per pixel.
+class MultiResolutionHistory:
+    RAW_FIELDS = ('time', 'voltage', 'setpoint')
+    BUCKET_FIELDS = ('time', 'count', 'voltage_min', 'voltage_max', 'voltage_mean', 'setpoint_min', 'setpoint_max')
+
+    def __init__(self, raw_capacity=1 << 17, bucket_capacity=1 << 13, factor=4, levels=7):
+        self.factor = factor
+        self.raw = _ColumnRing(self.RAW_FIELDS, raw_capacity)
+        self.levels = [_ColumnRing(self.BUCKET_FIELDS, bucket_capacity) for _ in range(levels)]
+        self._partial = [None] * levels  # Bucket still being filled on each level
+
+    def __len__(self):
+        return len(self.raw)
+
+    # Merge a raw sample (count 1) or a finished bucket into the partial bucket of a level
+    def _merge(self, level, bucket, parts):
+        partial = self._partial[level]
+        if partial is None:
+            self._partial[level] = [*bucket, parts]
+            partial = self._partial[level]
+        else:
+            t, n, v_min, v_max, v_mean, s_min, s_max = bucket
+            total = partial[1] + n
+            partial[4] += (v_mean - partial[4]) * n / total
+            partial[1] = total
+            partial[2] = min(partial[2], v_min)
+            partial[3] = max(partial[3], v_max)
+            partial[5] = min(partial[5], s_min)
+            partial[6] = max(partial[6], s_max)
+            partial[7] += parts
+        if partial[7] >= self.factor:
+            self._partial[level] = None
+            finished = partial[:7]
+            self.levels[level].push(finished)
+            if level + 1 < len(self.levels):
+                self._merge(level + 1, finished, 1)
+
+    def push(self, time, voltage, setpoint):
+        self.raw.push((time, voltage, setpoint))
+        self._merge(0, (time, 1, voltage, voltage, voltage, setpoint, setpoint), 1)
+
+    def clear(self):
+        self.raw.clear()
+        for level in self.levels:
+            level.clear()
+        self._partial = [None] * len(self.levels)
+
+    # The current partial bucket of a level, including the partial buckets below it
+    def _open_bucket(self, level):
+        merged = None
+        for partial in self._partial[:level + 1]:
+            if partial is None:
+                continue
+            if merged is None:
+                merged = list(partial[:7])
+            else:
+                # Lower levels hold the newer samples: keep the earliest start time
+                n = merged[1] + partial[1]
+                merged[4] = (merged[4] * merged[1] + partial[4] * partial[1]) / n
+                merged[1] = n
+                merged[0] = min(merged[0], partial[0])
+                merged[2], merged[3] = min(merged[2], partial[2]), max(merged[3], partial[3])
+                merged[5], merged[6] = min(merged[5], partial[5]), max(merged[6], partial[6])
+        return merged
+
+    # (time, voltage, setpoint) to plot for t0 <= time <= t1 with at most about max_points
+    # points: the raw samples if they fit, else the min/max envelope of the finest level that
+    # fits (two points per bucket). Also returns the level used (0 = raw).
+    def select(self, t0, t1, max_points=1000):
+        times = self.raw.view('time')
+        first, last = np.searchsorted(times, t0, side='left'), np.searchsorted(times, t1, side='right')
+        covered = len(self.raw) < self.raw.capacity or times[0] <= t0  # Nothing older was overwritten
+        if last - first <= max_points and covered:
+            return (times[first:last], self.raw.view('voltage')[first:last],
+                    self.raw.view('setpoint')[first:last], 0)
+
+        for index, ring in enumerate(self.levels):
+            starts = ring.view('time')
+            first = max(np.searchsorted(starts, t0, side='right') - 1, 0)  # Bucket containing t0
+            last = np.searchsorted(starts, t1, side='right')
+            covered = len(ring) < ring.capacity or starts[0] <= t0
+            if (2 * (last - first) <= max_points and covered) or index == len(self.levels) - 1:
+                break
+        columns = {field: ring.view(field)[first:last] for field in self.BUCKET_FIELDS}
+        open_bucket = self._open_bucket(index)
+        if open_bucket is not None and open_bucket[0] <= t1:
+            columns = {field: np.append(values, open_bucket[i]) for i, (field, values) in enumerate(columns.items())}
+        if 2 * len(columns['time']) > max_points:
+            # Even the coarsest level has too many buckets: merge neighbours
+            edges = np.arange(0, len(columns['time']), -(-2 * len(columns['time']) // max_points))
+            columns = {'time': columns['time'][edges],
+                       'voltage_min': np.minimum.reduceat(columns['voltage_min'], edges),
+                       'voltage_max': np.maximum.reduceat(columns['voltage_max'], edges),
+                       'setpoint_min': np.minimum.reduceat(columns['setpoint_min'], edges),
+                       'setpoint_max': np.maximum.reduceat(columns['setpoint_max'], edges)}
+        # Envelope: each bucket becomes a (min, max) pair at its start time
+        time = np.repeat(columns['time'], 2)
+        voltage = np.column_stack((columns['voltage_min'], columns['voltage_max'])).ravel()
+        setpoint = np.column_stack((columns['setpoint_min'], columns['setpoint_max'])).ravel()
+        return time, voltage, setpoint, index + 1
@@ -0,0 +1,438 @@
+import abc
+import datetime
+import io
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+
+import numpy as np
+
+# One logged sample in the binary formats
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('voltage', '<f4'), ('setpoint', '<f4'), ('error', '<f4')])
+TEXT_BLOCK_SIZE = 1 << 20  # Bytes of a text log read_records() parses at a time
+
+
+# Base class for the data loggers: batches samples in memory, flushes them when
+# flush_records samples are pending or flush_interval seconds have passed, and
+# starts a new file every max_records samples.
+class DataLogger(abc.ABC):
+    extension = ''
+
+    def __init__(self, folder, max_records=50000, flush_records=100, flush_interval=1.0):
+        self.folder = folder
+        self.max_records = max_records
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.filename = None
+        self.record_count = 0  # Samples written to the current file
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self.open_file()
+
+    def _new_filename(self, prefix, extension):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join(self.folder, f"{prefix}_{timestamp}{extension}")
+        suffix = 1
+        while os.path.exists(filename):  # Rotated within the same second
+            filename = os.path.join(self.folder, f"{prefix}_{timestamp}_{suffix}{extension}")
+            suffix += 1
+        return filename
+
+    # Close the current file (if any) and start a new timestamped one
+    def open_file(self):
+        if self.filename:
+            self.close()
+        self.filename = self._new_filename("data_log", self.extension)
+        self.record_count = 0
+        self._open()
+
+    def log(self, time_s, voltage, setpoint, error):
+        self._pending.append((time_s, voltage, setpoint, error))
+        self.record_count += 1
+        if self.record_count >= self.max_records:
+            self.open_file()  # Flushes and closes the full file first
+        elif (len(self._pending) >= self.flush_records
+              or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._write(self._pending)
+            self._pending = []
+        self._sync()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    @abc.abstractmethod
+    def log_event(self, message):
+        pass
+
+    @abc.abstractmethod
+    def _open(self):
+        pass
+
+    @abc.abstractmethod
+    def _write(self, records):
+        pass
+
+    def _sync(self):
+        pass
+
+    @abc.abstractmethod
+    def _close(self):
+        pass
+
+
+# Tab-separated text, the original data_log_*.txt layout. Events stay inline as
+# "Event: ..." lines so existing files and readers keep working.
+class TextLogger(DataLogger):
+    extension = '.txt'
+
+    def _open(self):
+        self.data_file = open(self.filename, "w")
+        self.data_file.write("Time(s)\tVoltage(V)\tSet Point(V)\t Error\n")  # Write headers
+
+    def _write(self, records):
+        self.data_file.write("".join(f"{t:.2f}\t{v:.4f}\t{s:.4f}\t{e:.2f}\n" for t, v, s, e in records))
+
+    def _sync(self):
+        self.data_file.flush()
+
+    def _close(self):
+        self.data_file.close()
+
+    def log_event(self, message):
+        # Write pending samples first so the event lands at the right place in the file
+        if self._pending:
+            self._write(self._pending)
+            self._pending = []
+        self.data_file.write(f"Event: {message}\n")
+        self.flush()  # Events are written immediately
+
+
+# Shared event channel for the binary formats: a data_log_*.events.txt file next to
+# the data file, so free-text events never break the fixed record layout.
+class _EventFileMixin:
+    def _open_events(self):
+        root, _ = os.path.splitext(self.filename)
+        self.event_file = open(root + ".events.txt", "w")
+        self.event_file.write("Time(s)\tEvent\n")
+
+    def log_event(self, message):
+        self.flush()
+        last_time = self._last_time if self.record_count else 0.0
+        self.event_file.write(f"{last_time:.2f}\t{message}\n")
+        self.event_file.flush()
+
+
+# Fixed-size little-endian RECORD_DTYPE records appended to data_log_*.bin.
+# Read with np.fromfile(path, RECORD_DTYPE) or np.memmap(path, RECORD_DTYPE, 'r').
+class RecordLogger(_EventFileMixin, DataLogger):
+    extension = '.bin'
+
+    def _open(self):
+        self.data_file = open(self.filename, "wb")
+        self._last_time = 0.0
+        self._open_events()
+
+    def _write(self, records):
+        array = np.array(records, dtype=RECORD_DTYPE)
+        self.data_file.write(array.tobytes())
+        self._last_time = float(array['time'][-1])
+
+    def _sync(self):
+        self.data_file.flush()
+
+    def _close(self):
+        self.data_file.close()
+        self.event_file.close()
+
+
+# Compressed stream of RECORD_DTYPE chunks in data_log_*.npz. Flushed samples collect in
+# memory and go into the archive as one .npy member per chunk_records samples (or after
+# chunk_interval seconds), so a 50,000-sample file has a handful of members instead of one
+# per flush, each append rewriting the zip's central directory. A crash loses at most the
+# unwritten chunk. np.load(path) lists the chunks; read_records() joins them back together.
+class NpzChunkLogger(_EventFileMixin, DataLogger):
+    extension = '.npz'
+
+    def __init__(self, folder, chunk_records=10000, chunk_interval=60.0, **kwargs):
+        self.chunk_records = chunk_records
+        self.chunk_interval = chunk_interval
+        super().__init__(folder, **kwargs)
+
+    def _open(self):
+        self.chunk_count = 0
+        self._chunk = []
+        self._chunk_started = time.monotonic()
+        self._last_time = 0.0
+        self._open_events()
+        zipfile.ZipFile(self.filename, "w").close()  # Create an empty archive
+
+    def _write(self, records):
+        self._chunk.extend(records)
+        self._last_time = float(records[-1][0])
+        if (len(self._chunk) >= self.chunk_records
+                or time.monotonic() - self._chunk_started >= self.chunk_interval):
+            self._write_chunk()
+
+    def _write_chunk(self):
+        if self._chunk:
+            buffer = io.BytesIO()
+            np.lib.format.write_array(buffer, np.array(self._chunk, dtype=RECORD_DTYPE), allow_pickle=False)
+            with zipfile.ZipFile(self.filename, "a", compression=zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr(f"chunk_{self.chunk_count:06d}.npy", buffer.getvalue())
+            self.chunk_count += 1
+            self._chunk = []
+        self._chunk_started = time.monotonic()
+
+    def _close(self):
+        self._write_chunk()
+        self.event_file.close()
+
+
+LOGGER_FORMATS = {
+    'text': TextLogger,
+    'binary': RecordLogger,
+    'compressed': NpzChunkLogger,
+}
+
+
+# Create the logger for one of the LOGGER_FORMATS names
+def make_logger(log_format, folder, **kwargs):
+    try:
+        logger_class = LOGGER_FORMATS[log_format]
+    except KeyError:
+        raise ValueError(f"Unknown log format {log_format!r}, expected one of {sorted(LOGGER_FORMATS)}")
+    return logger_class(folder, **kwargs)
+
+
+# Runs a DataLogger on a background writer thread so that file I/O (writes, flushes,
+# rotation, settings saves) never blocks the Qt event loop. Nothing here waits on the
+# writer for long: samples go into a bounded queue and, when it is full, log waits at most
+# `put_timeout` seconds for the writer to make room before dropping (and counting) the sample;
+# events, flushes, rotations and submitted functions go into a separate unbounded control
+# queue and are never dropped. Each control item runs after the samples logged before it,
+# so an event still lands at the right place in the file.
+class AsyncLogger:
+    _STOP = object()
+
+    def __init__(self, logger_factory, max_queue_size=10000, batch_size=1000, put_timeout=0.02):
+        self.max_queue_size = max_queue_size
+        self.put_timeout = put_timeout  # Longest log waits on a full queue
+        self.batch_size = batch_size  # Samples the writer takes per pass
+        self.dropped_count = 0  # Samples dropped because the writer could not keep up
+        self.error = None  # Last exception raised on the writer thread
+        self._samples = deque()
+        self._control = deque()  # (samples logged before it, item)
+        self._logged = 0  # Samples queued so far
+        self._written = 0  # Samples taken by the writer so far
+        self._condition = threading.Condition()
+        self._logger_factory = logger_factory
+        self.logger = None  # Created on the writer thread so opening the file cannot block the caller
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def filename(self):
+        return self.logger.filename if self.logger else None
+
+    def qsize(self):
+        with self._condition:
+            return len(self._samples) + len(self._control)
+
+    def log(self, time_s, voltage, setpoint, error):
+        with self._condition:
+            if len(self._samples) >= self.max_queue_size and not self._condition.wait_for(
+                    lambda: len(self._samples) < self.max_queue_size, self.put_timeout):
+                self.dropped_count += 1
+                return
+            self._samples.append((time_s, voltage, setpoint, error))
+            self._logged += 1
+            self._condition.notify()
+
+    def _put_control(self, item):
+        with self._condition:
+            self._control.append((self._logged, item))
+            self._condition.notify()
+
+    # Events are never dropped
+    def log_event(self, message):
+        self._put_control(('log_event', (message,)))
+
+    def flush(self):
+        self._put_control(('flush', ()))
+
+    # Start a new data file on the writer thread
+    def rotate(self):
+        self._put_control(('open_file', ()))
+
+    # Run an arbitrary function (e.g. saving settings) on the writer thread
+    def submit(self, function, *args):
+        self._put_control((None, (function,) + args))
+
+    # Write everything still queued, close the file and stop the writer thread; waits at
+    # most `timeout` seconds (0: return at once and let the writer finish on its own)
+    def close(self, timeout=10.0):
+        self._put_control(self._STOP)
+        if timeout and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    # Next thing to do: ('samples', [...]), ('control', item), or None after flush_interval idle
+    def _next(self, flush_interval):
+        with self._condition:
+            while not self._samples and not self._control:
+                if not self._condition.wait(flush_interval):
+                    return None
+            if self._control and self._control[0][0] <= self._written:
+                return 'control', self._control.popleft()[1]
+            count = len(self._samples)
+            if self._control:
+                count = min(count, self._control[0][0] - self._written)
+            batch = [self._samples.popleft() for _ in range(min(count, self.batch_size))]
+            self._written += len(batch)
+            self._condition.notify_all()  # Room again for a log waiting on a full queue
+            return 'samples', batch
+
+    def _run(self):
+        try:
+            self.logger = self._logger_factory()
+        except Exception as e:
+            self.error = e
+            print(f"Error opening data file: {e}")
+        flush_interval = self.logger.flush_interval if self.logger else None
+        while True:
+            task = self._next(flush_interval)
+            if task is None:
+                self._call('flush', ())  # Time-based flush while idle
+            elif task[0] == 'samples':
+                for sample in task[1]:
+                    self._call('log', sample)
+            elif task[1] is self._STOP:
+                self._call('close', ())
+                return
+            else:
+                self._call(*task[1])
+
+    def _call(self, method, args):
+        try:
+            if method is None:
+                args[0](*args[1:])
+            elif self.logger is None:
+                with self._condition:
+                    self.dropped_count += 1  # No data file could be opened
+            else:
+                getattr(self.logger, method)(*args)
+        except Exception as e:  # Keep the writer alive; report the problem
+            self.error = e
+            print(f"Error writing data file: {e}")
+
+
+# Number of lines of data (a last one without a newline included), or None if any of them
+# does not hold exactly `columns` whitespace-separated fields; checked on the positions of
+# the field starts and newlines only
+def _record_lines(data, columns):
+    chars = np.frombuffer(data, dtype=np.uint8)
+    space = chars <= 0x20
+    starts = np.flatnonzero(space[:-1] > space[1:]) + 1  # Whitespace, then a field
+    if len(chars) and not space[0]:
+        starts = np.concatenate(([0], starts))
+    ends = np.flatnonzero(chars == 0x0A)
+    if len(chars) and chars[-1] != 0x0A:
+        ends = np.append(ends, len(chars))
+    if len(starts) != columns * len(ends):
+        return None
+    # Line k's fields are starts[k * columns:(k + 1) * columns]: all after line k - 1 ended
+    # and before line k ends
+    if np.all(starts[columns - 1::columns] < ends) and np.all(starts[columns::columns] > ends[:-1]):
+        return len(ends)
+    return None
+
+
+# Rows of exactly `columns` numbers from text lines; lines cut off or garbled (e.g. by a
+# crash) are dropped. The slow path of parse_text_records(), for damaged data only.
+def _parse_lines(data, columns):
+    rows = []
+    for line in data.splitlines():
+        fields = line.split()
+        if len(fields) != columns:
+            continue
+        try:
+            rows.append([float(field) for field in fields])
+        except ValueError:
+            continue
+    return np.array(rows, dtype=float).reshape(-1, columns)
+
+
+# Parse complete lines of a text log (bytes, no header) into RECORD_DTYPE records.
+# "Event: ..." lines are cut out with bytes.find() and the remaining numbers are parsed
+# in one np.fromstring() call, which is kept only if every line holds exactly one record's
+# worth of fields and all of them parsed; otherwise the lines are parsed one by one. Returns (records,
+# events) with one (row, byte offset, message) per event, row being the number of samples
+# before it; `offset` is added to the byte offsets.
+def parse_text_records(data, offset=0):
+    pieces, events = [], []
+    start = rows = 0
+    pos = data.find(b"Event:")
+    while pos >= 0:
+        if pos > 0 and data[pos - 1] != 0x0A:  # "Event:" inside a line is not an event
+            pos = data.find(b"Event:", pos + 1)
+            continue
+        piece = data[start:pos]
+        rows += piece.count(b"\n")
+        pieces.append(piece)
+        end = data.find(b"\n", pos)
+        end = len(data) if end < 0 else end + 1
+        events.append((rows, offset + pos, data[pos + 6:end].strip().decode("utf-8", errors="replace")))
+        start = end
+        pos = data.find(b"Event:", start)
+    pieces.append(data[start:])
+    numbers = b"".join(pieces)
+
+    columns = len(RECORD_DTYPE.names)
+    try:
+        values = np.fromstring(numbers, sep=" ")  # Any whitespace separates the numbers
+    except ValueError:
+        values = None
+    lines = _record_lines(numbers, columns)
+    if values is not None and lines is not None and len(values) == lines * columns:
+        table = values.reshape(-1, columns)
+    else:
+        tables = [_parse_lines(piece, columns) for piece in pieces]
+        table = np.concatenate(tables)
+        rows = np.cumsum([len(piece_table) for piece_table in tables])
+        events = [(int(rows[i]), position, message) for i, (_, position, message) in enumerate(events)]
+    records = np.empty(len(table), dtype=RECORD_DTYPE)
+    for column, name in enumerate(RECORD_DTYPE.names):
+        records[name] = table[:, column]
+    return records, events
+
+
+# Load the samples of a .txt, .bin or .npz log file as a RECORD_DTYPE array
+def read_records(path, mmap=False):
+    if path.endswith(".txt"):
+        # Parsed block by block, so only one block of text is in memory next to the records
+        chunks, rest = [], b""
+        with open(path, "rb") as file:
+            file.readline()  # Header
+            for data in iter(lambda: file.read(TEXT_BLOCK_SIZE), b""):
+                data = rest + data
+                cut = data.rfind(b"\n") + 1
+                rest = data[cut:]  # A partly written last line is left out
+                if cut:
+                    chunks.append(parse_text_records(data[:cut])[0])
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+    if path.endswith(".npz"):
+        with np.load(path) as archive:
+            chunks = [archive[name] for name in sorted(archive.files)]
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+    if mmap:
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+    return np.fromfile(path, dtype=RECORD_DTYPE)
@@ -0,0 +1,363 @@
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+import serial
+
+from calibration import CalibrationStore
+from command_channel import COMMANDS, CommandChannel
+from data_history import DataHistory, MultiResolutionHistory
+from data_logger import AsyncLogger, make_logger
+from interlock import Interlock, disable_pid
+from latency_monitor import LatencyMonitor, SettlingTimer
+from serial_reader import SerialReader
+from simulated_arduino import open_transport
+
+# Rigs driven by multi_rig_gui.py: {"Max_fps": 10, "rigs": [{"name": ..., "port": ..., <settings>}, ...]}
+RIGS_FILE = "rigs.json"
+DATA_FOLDER = "Time & Voltage Data"
+POSITION_SAVE_INTERVAL = 10.0  # Seconds between saves of a rig's step position into calibration.json
+
+# Per-rig settings; GUI.py's settings.json holds the same keys for its one rig
+DEFAULT_SETTINGS = {
+    "Setpoint": 2.5,
+    "Kp": 0.8,
+    "Ki": 0.5,
+    "Kd": 0.0,
+    "Sample_time": 2000,
+    "Num_points": 200,
+    "Log_format": 'text',
+    "Log_flush_interval": 1.0,
+    "Log_queue_size": 10000,
+    "Telemetry_format": 'text',
+    "Use_calibration": True,
+    "Control_mode": 'probe',
+    "Oversample": 16,
+    "Filter_mode": 0,
+    "Filter_alpha": 0.3,
+    "Read_interval_settling": 20,
+    "Read_interval_locked": 200,
+    "Trip_level": 4.0,
+    "Trip_clear_level": 3.8,
+}
+
+
+# Settings with the numeric ones converted to the type of their default (settings files
+# written by older versions hold some of them as text)
+def normalize_settings(settings):
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    for key, default in DEFAULT_SETTINGS.items():
+        if isinstance(default, (int, float)) and not isinstance(default, bool):
+            value = float(settings[key])
+            settings[key] = int(value) if isinstance(default, int) else value
+    return settings
+
+
+# One waveplate rig: its serial port and acquisition thread, command channel, plot
+# histories, data logger and settings. Nothing here touches Qt; a GUI (GUI.py for one
+# rig, multi_rig_gui.py for several) calls process() from its timer and reads history,
+# long_history, stats() and the event flags.
+# attached=True: a view of a rig that acquisition_daemon.py owns (a daemon:// port). The daemon
+# pushes the settings, restores the step position and logs the data, so this channel does none of it.
+class RigChannel:
+    def __init__(self, name, port, settings=None, data_folder=DATA_FOLDER, subfolder=True, attached=False):
+        self.name = name
+        self.port_name = port
+        self.attached = attached
+        self.settings = normalize_settings(settings)
+        # Held by DeviceManager.poll() around process() and by acquisition_daemon.py around a
+        # client's request, so the two never interleave
+        self.lock = threading.Lock()
+        self.pid_enabled = False
+        self.last_error = 0.0
+        self.sample_handler = None  # Receives (rig, [(time, voltage, setpoint), ...]) after every process()
+
+        use_calibration = self.settings["Use_calibration"] and not attached
+        self.calibration = CalibrationStore().latest(port) if use_calibration else None
+        if self.calibration and self.calibration.position is None:
+            print(f"{name}: calibration of {port} from {self.calibration.timestamp} has no step position "
+                  f"reference; not used (recalibrate)")
+            self.calibration = None
+        elif self.calibration:
+            print(f"{name}: using calibration of {port} from {self.calibration.timestamp}")
+        # Last known step counter in the calibration's frame, restored with 'Z' after every connect
+        self.position = self.calibration.position if self.calibration else None
+        self.position_synced = False  # The firmware's counter was restored since the port was opened
+        self._position_saved = (self.position, time.monotonic())
+        self.target_position = self.position or 0  # Last step position commanded through the calibration
+        self.history = DataHistory(self.settings["Num_points"])  # The plotted window
+        # Everything since the start at several resolutions, for long windows and toolbar zoom/pan
+        self.long_history = MultiResolutionHistory()
+        self.start_time = time.monotonic()  # Same clock as the serial reader's sample timestamps
+        self.latency = LatencyMonitor()
+        self.settling = SettlingTimer()
+
+        # Every rig logs into its own sub-folder so the files of different rigs never mix
+        # (subfolder=False: straight into data_folder, as GUI.py's single rig does)
+        self.data_folder = os.path.join(data_folder, re.sub(r'[^\w.-]+', '_', name)) if subfolder else data_folder
+        self.data_logger = None  # None while attached: the daemon's log has the data
+        if not attached:
+            os.makedirs(self.data_folder, exist_ok=True)
+            log_format, folder = self.settings["Log_format"], self.data_folder
+            flush_interval = self.settings["Log_flush_interval"]
+            self.data_logger = AsyncLogger(
+                lambda: make_logger(log_format, folder, max_records=50000, flush_interval=flush_interval),
+                max_queue_size=self.settings["Log_queue_size"])
+
+        # The port is opened on the reader thread, so a slow or missing rig never holds up the others
+        self.command_channel = CommandChannel(lambda: self.serial_reader.port)
+        # The interlock disables the PID on the reader thread, without waiting for process()
+        self.interlock = Interlock(self.settings["Trip_level"], self.settings["Trip_clear_level"],
+                                   on_trip=disable_pid(lambda: self.serial_reader.port, self.command_channel))
+        self.interlock_trips = 0  # Trips already logged by process()
+        self.serial_reader = SerialReader(None, reconnect=self._open_port, reply_handler=self.command_channel.handle_reply,
+                                          interlock=self.interlock)
+
+    # The Arduino moves to the model's step position itself on every correction
+    @property
+    def feedforward(self):
+        return self.settings["Control_mode"] == 'feedforward' and self.calibration is not None
+
+    # The calibration can place step positions: the firmware's counter is in its frame
+    @property
+    def calibrated(self):
+        return self.calibration is not None and self.position_synced
+
+    # Set when the interlock disabled the PID; cleared by enabling it again
+    @property
+    def tripped(self):
+        return self.interlock.latched
+
+    def start(self):
+        self.serial_reader.start()
+
+    # Open the port and push this rig's settings (unless attached); also runs after every reconnect
+    def _open_port(self):
+        try:
+            port = open_transport(self.port_name, 9600, timeout=1)
+        except serial.SerialException as e:
+            print(f"{self.name}: error opening serial port: {e}")
+            return None
+        time.sleep(2)  # Wait for the Arduino to reset after the port opens
+        print(f"{self.name}: Arduino connected on {self.port_name}")
+        self.serial_reader.port = port
+        if not self.attached:
+            self.sync_position()
+            self.push_settings()
+        return port
+
+    # The Arduino reset when the port opened, so its step counter reads 0 wherever the motor
+    # is: put back the last known position before anything moves the motor
+    def sync_position(self):
+        self.position_synced = False
+        if self.calibration is None:
+            return
+
+        def synced(ok):
+            if not ok:
+                print(f"{self.name}: step position not restored; the calibration is not used until the next connect")
+                if self.feedforward:
+                    self.update_parameters(M=0)
+                return
+            self.serial_reader.position = None  # Reports sent before the 'Z' still say 0
+            self.position_synced = True
+
+        self.command_channel.submit({'Z': self.position}, synced)
+
+    # Keep the step counter the firmware reports, saved with the calibration now and then
+    def _track_position(self, force=False):
+        position = self.serial_reader.position
+        if self.position_synced and position is not None:
+            self.position = position
+        saved, saved_at = self._position_saved
+        if self.calibration and self.position != saved and (force or time.monotonic() - saved_at >= POSITION_SAVE_INTERVAL):
+            CalibrationStore().set_position(self.port_name, self.position)
+            self._position_saved = (self.position, time.monotonic())
+
+    def push_settings(self):
+        s = self.settings
+        self.update_parameters(S=s["Setpoint"], P=s["Kp"], I=s["Ki"], D=s["Kd"], T=s["Sample_time"],
+                               E=int(self.pid_enabled))
+        if s["Telemetry_format"] == 'binary':
+            self.update_parameters(F=1)
+        self.update_parameters(N=s["Oversample"], L=s["Filter_mode"], A=s["Filter_alpha"],
+                               R=s["Read_interval_settling"], Q=s["Read_interval_locked"])
+        self.update_parameters(H=s["Trip_level"], G=s["Trip_clear_level"])
+        if self.feedforward:
+            a, b, c, d = self.calibration.params
+            self.update_parameters(M=1, a=a, b=b, c=c, d=d)
+
+    def update_parameters(self, **params):
+        params = {c: v for c, v in params.items() if c in COMMANDS}
+        self.command_channel.submit(params)  # Sent and acknowledged on the channel's worker thread
+
+    # Change one of 'S', 'P', 'I', 'D', 'T' and remember it in the settings
+    def set_parameter(self, param, value):
+        key = {'S': "Setpoint", 'P': "Kp", 'I': "Ki", 'D': "Kd", 'T': "Sample_time"}[param]
+        value = int(value) if param == 'T' else float(value)
+        self.settings[key] = value
+        if param == 'S':
+            self.settling.start(time.monotonic() - self.start_time)
+        if param == 'S' and self.calibrated and not self.feedforward:
+            # Jump straight to the step position that gives the new setpoint, then let the PID trim
+            self.target_position = self.calibration.target_step(value, near=self.target_position)
+            self.update_parameters(S=value, X=self.target_position)
+        else:
+            self.update_parameters(**{param: value})
+
+    # Enabling clears an interlock fault, which is refused (returns False) above the clear level
+    def set_pid_enabled(self, enabled, reason="manually"):
+        if enabled and self.interlock.latched:
+            if not self.interlock.reset():
+                print(f"{self.name}: PID not enabled: the voltage is still above {self.interlock.clear_level:.2f} V")
+                return False
+            self.update_parameters(K=1)  # The Arduino refuses 'E1' while its own fault is latched
+        self.pid_enabled = enabled
+        self.update_parameters(E=int(enabled))
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.log_event(f"PID {'Enabled' if enabled else 'Disabled'} {reason} at {current_time}")
+        return True
+
+    def log_event(self, message):
+        if self.data_logger:
+            self.data_logger.log_event(message)
+
+    def resize(self, num_points):
+        self.settings["Num_points"] = num_points
+        self.history.resize(num_points)
+
+    def clear(self):
+        self.history.clear()
+        self.long_history.clear()
+        self.serial_reader.buffer.clear()  # Discard samples received before the clear
+
+    # Move received samples into the history and the logger; returns the number processed.
+    # Only the samples that still fit in the plotted window go into the history, so a rig
+    # that was starved for a while costs no more than one window's worth of pushes.
+    def process(self):
+        self._track_position()
+        if self.interlock.trip_count != self.interlock_trips:
+            # The interlock already sent 'E0'; only record it here
+            self.interlock_trips = self.interlock.trip_count
+            self.pid_enabled = False
+            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            latency = f", trip latency {self.interlock.latencies[-1] * 1000:.1f} ms" if self.interlock.latencies else ""
+            self.log_event(f"PID Disabled due to Voltage Limit at {current_time} ({self.interlock.reason}{latency})")
+        samples = self.serial_reader.buffer.drain()
+        first_plotted = len(samples) - self.history.capacity
+        received = []
+        data_logger = self.data_logger
+        for i, (t_read, voltage, setpoint, t_parse) in enumerate(samples):
+            elapsed_time = t_read - self.start_time
+            error = voltage - setpoint
+            if i >= first_plotted:
+                self.history.push(elapsed_time, voltage, setpoint, error)
+            self.long_history.push(elapsed_time, voltage, setpoint)
+            if self.sample_handler:
+                received.append((elapsed_time, voltage, setpoint))
+
+            if data_logger:
+                data_logger.log(elapsed_time, voltage, setpoint, error)
+            self.latency.record(t_read, t_parse, time.monotonic())
+            settle_time = self.settling.update(elapsed_time, error)
+            if settle_time is not None:
+                self.log_event(f"Settled at {setpoint:.2f} V in {settle_time:.1f} s "
+                               f"({self.settings['Control_mode']} mode)")
+            self.last_error = error
+        if received:
+            self.sample_handler(self, received)
+        return len(samples)
+
+    # Reader counters plus the samples the data logger had to drop
+    def stats(self):
+        stats = self.serial_reader.stats()
+        stats['log_dropped'] = self.data_logger.dropped_count if self.data_logger else 0
+        return stats
+
+    def close(self):
+        self.serial_reader.stop()
+        self._track_position(force=True)
+        if self.data_logger:
+            latency_filename = os.path.join(self.data_folder,
+                                            datetime.datetime.now().strftime("latency_%Y%m%d_%H%M%S.csv"))
+            self.data_logger.submit(self.latency.dump_csv, latency_filename)
+            self.data_logger.close()
+        port = self.serial_reader.port
+        if port and port.is_open:
+            port.close()
+
+    def to_dict(self):
+        return {"name": self.name, "port": self.port_name, **self.settings}
+
+
+# Opens every rig of the configuration and processes them together. Each rig has its own
+# reader, command and logger threads; poll() is the only per-rig work on the caller's thread.
+class DeviceManager:
+    def __init__(self, rigs, data_folder=DATA_FOLDER):
+        self.config = {}  # Options other than the rigs, kept when the configuration is saved
+        self.other_rigs = []  # Rigs of the configuration that were not opened, kept as well
+        self.rigs = []
+        for rig in rigs:
+            settings = {key: value for key, value in rig.items() if key not in ("name", "port")}
+            self.rigs.append(RigChannel(rig.get("name", rig["port"]), rig["port"], settings, data_folder))
+        names = [rig.name for rig in self.rigs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Rig names must be unique: {names}")
+
+    # rigs.json, or a list of ports (named after the port) when given
+    @classmethod
+    def from_config(cls, filename=RIGS_FILE, ports=None, **kwargs):
+        config = {}
+        try:
+            with open(filename, "r") as file:
+                config = json.load(file)
+        except FileNotFoundError:
+            pass
+        rigs = config.get("rigs", [])
+        other_rigs = []
+        if ports:
+            known = {rig["port"]: rig for rig in rigs}
+            other_rigs = [rig for rig in rigs if rig["port"] not in ports]
+            rigs = [known.get(port, {"name": port, "port": port}) for port in ports]
+        if not rigs:
+            raise ValueError(f"No rigs configured: list them in {filename} or pass their ports")
+        manager = cls(rigs, **kwargs)
+        manager.config = {key: value for key, value in config.items() if key != "rigs"}
+        manager.other_rigs = other_rigs
+        return manager
+
+    def __iter__(self):
+        return iter(self.rigs)
+
+    def __len__(self):
+        return len(self.rigs)
+
+    def __getitem__(self, name):
+        for rig in self.rigs:
+            if rig.name == name:
+                return rig
+        raise KeyError(name)
+
+    def start(self):
+        for rig in self.rigs:
+            rig.start()
+
+    # Process new samples of every rig; returns {rig name: samples processed}
+    def poll(self):
+        processed = {}
+        for rig in self.rigs:
+            with rig.lock:
+                processed[rig.name] = rig.process()
+        return processed
+
+    def save(self, filename=RIGS_FILE, **options):
+        config = {**self.config, **options, "rigs": [rig.to_dict() for rig in self.rigs] + self.other_rigs}
+        with open(filename, "w") as file:
+            json.dump(config, file, indent=2)
+
+    def close(self):
+        for rig in self.rigs:
+            rig.close()
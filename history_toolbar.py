@@ -0,0 +1,29 @@
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+
+
+# Navigation toolbar that reports zoom/pan (to show the long history) and Home (back to live)
+class HistoryToolbar(NavigationToolbar):
+    def __init__(self, canvas, parent, on_browse, on_home):
+        super().__init__(canvas, parent)
+        self.on_browse = on_browse
+        self.on_home = on_home
+
+    def release_zoom(self, event):
+        super().release_zoom(event)
+        self.on_browse()
+
+    def release_pan(self, event):
+        super().release_pan(event)
+        self.on_browse()
+
+    def back(self, *args):
+        super().back(*args)
+        self.on_browse()
+
+    def forward(self, *args):
+        super().forward(*args)
+        self.on_browse()
+
+    def home(self, *args):
+        super().home(*args)
+        self.on_home()
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import serial
+
+
+# Host side of the overvoltage interlock. The serial reader calls check() for every parsed
+# sample before it is buffered for the GUI, so a trip never waits for the GUI timer, file
+# writes or a redraw. trip_samples consecutive samples with abs(voltage) > trip_level latch
+# a fault and call on_trip (see disable_pid()). The fault stays latched until reset(),
+# which is refused until the voltage is back below clear_level (hysteresis).
+# The firmware runs its own, faster interlock ('H', 'G', 'K'); its fault reports latch this one
+# too, and carry its current reading, so a reset is possible even when no telemetry arrives.
+# Times (t_read, latencies) are on clock, time.monotonic() unless given.
+class Interlock:
+    def __init__(self, trip_level=4.0, clear_level=3.8, trip_samples=1, on_trip=None, max_records=1000,
+                 clock=time.monotonic):
+        self.trip_level = trip_level
+        self.clear_level = clear_level
+        self.trip_samples = trip_samples
+        self.on_trip = on_trip  # Called on the reader thread with the reason when the interlock trips
+        self.clock = clock
+        self.latched = False
+        self.reason = None
+        self.trip_count = 0
+        self.last_voltage = None  # Latest reading, from telemetry or the firmware's fault reports
+        self.firmware_status = None  # Latest fault report of the firmware (see parse_fault_report())
+        # Seconds from the timestamp of the sample that crossed the trip level (for a firmware
+        # trip: the firmware's crossing, from its reported latency) until on_trip is done
+        self.latencies = deque(maxlen=max_records)
+        self.firmware_latencies = deque(maxlen=max_records)  # Trip latency reported by the firmware (s)
+        self._over = 0
+        self._over_since = None
+        self._lock = threading.Lock()
+
+    # Check one sample taken at t_read; returns True if it tripped the interlock
+    def check(self, voltage, t_read):
+        self.last_voltage = voltage
+        if abs(voltage) <= self.trip_level:
+            self._over = 0
+            return False
+        if self._over == 0:
+            self._over_since = t_read
+        self._over += 1
+        if self._over >= self.trip_samples and not self.latched:
+            return self._trip(f"Voltage {voltage:.3f} V above {self.trip_level:.2f} V", self._over_since)
+        return False
+
+    # check() for an array of samples that arrived together (binary telemetry)
+    def check_array(self, voltages, t_read):
+        if len(voltages) and not np.any(np.abs(voltages) > self.trip_level):
+            self._over = 0
+            self.last_voltage = float(voltages[-1])
+            return False
+        return any([self.check(float(voltage), t_read) for voltage in voltages])
+
+    def _trip(self, reason, t_first):
+        with self._lock:
+            if self.latched:
+                return False
+            self.latched = True
+            self.reason = reason
+            self.trip_count += 1
+        if self.on_trip:
+            self.on_trip(reason)
+        self.latencies.append(self.clock() - t_first)
+        return True
+
+    # A fault report of the firmware, received at t_read; a latched firmware fault latches the
+    # host interlock too
+    def firmware_fault(self, report, t_read=None):
+        t_read = self.clock() if t_read is None else t_read
+        previous, self.firmware_status = self.firmware_status, report
+        if "now" in report:
+            self.last_voltage = report["now"]
+        if report["latched"] and not (previous and previous["latched"]):
+            self.firmware_latencies.append(report["latency_us"] / 1e6)
+        if report["latched"] and not self.latched:
+            # Also after a reset() the firmware refused ('K1' is only accepted below its clear level)
+            self._trip(f"Arduino interlock tripped at {report['voltage']:.3f} V",
+                       t_read - report["latency_us"] / 1e6)
+
+    # Clear the fault; refused (False) while the latest reading is not below clear_level
+    def reset(self):
+        if self.last_voltage is not None and abs(self.last_voltage) >= self.clear_level:
+            return False
+        with self._lock:
+            self.latched = False
+            self.reason = None
+            self._over = 0
+        return True
+
+    def summary(self):
+        latencies = np.asarray(self.latencies) * 1000
+        firmware = np.asarray(self.firmware_latencies) * 1000
+        return {
+            "trips": self.trip_count,
+            "latched": self.latched,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "max_ms": float(latencies.max()) if len(latencies) else None,
+            "firmware_max_ms": float(firmware.max()) if len(firmware) else None,
+        }
+
+    def status_text(self):
+        if self.latched:
+            return f"Interlock: FAULT ({self.reason})"
+        summary = self.summary()
+        if summary["max_ms"] is None:
+            return "Interlock: OK"
+        return f"Interlock: OK  Trip latency max: {summary['max_ms']:.1f} ms"
+
+
+# on_trip action: write a legacy "E0" line straight to the port (no queue, no ACK wait),
+# then also send it through the command channel so it is acknowledged and retried. With a
+# command channel the line goes through its write(), so it never lands inside a frame the
+# channel's worker is writing.
+def disable_pid(get_port, command_channel=None):
+    def trip(reason):
+        try:
+            if command_channel is not None:
+                command_channel.write(b"E0\n")
+            else:
+                port = get_port()
+                if port and port.is_open:
+                    port.write(b"E0\n")
+        except (serial.SerialException, OSError) as e:
+            print(f"Interlock could not write to the serial port: {e}")
+        if command_channel is not None:
+            command_channel.submit({'E': 0})
+        print(f"Warning: interlock tripped: {reason}")
+    return trip
@@ -0,0 +1,114 @@
+import csv
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+STAGES = ('read', 'parse', 'log', 'draw')
+
+
+# Records monotonic timestamps of every sample as it goes through the pipeline
+# (read from serial -> parsed -> handed to the logger -> drawn on screen) and keeps
+# rolling latency percentiles and throughput over the last `window` samples.
+class LatencyMonitor:
+    def __init__(self, window=1000, max_records=100000):
+        self.window = window
+        self.start = time.monotonic()
+        self._pending = []  # Samples logged but not yet drawn: [read, parse, log]
+        self._records = deque(maxlen=max_records)  # Completed samples: (read, parse, log, draw)
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    # A sample has been read, parsed and logged (all time.monotonic() values)
+    def record(self, t_read, t_parse, t_log):
+        with self._lock:
+            self._pending.append((t_read, t_parse, t_log))
+
+    # Everything recorded so far is now on screen
+    def drawn(self, t_draw=None):
+        t_draw = time.monotonic() if t_draw is None else t_draw
+        with self._lock:
+            for t_read, t_parse, t_log in self._pending:
+                row = (t_read, t_parse, t_log, t_draw)
+                self._records.append(row)
+                self._recent.append(row)
+            self._pending = []
+
+    # Rolling latencies (ms, measured from the read) and throughput (samples/s)
+    def summary(self):
+        with self._lock:
+            recent = np.array(self._recent) if self._recent else np.empty((0, len(STAGES)))
+        result = {"samples": len(recent)}
+        for column, stage in enumerate(STAGES[1:], start=1):
+            latency = (recent[:, column] - recent[:, 0]) * 1000 if len(recent) else np.zeros(1)
+            result[f"{stage}_p50_ms"] = float(np.percentile(latency, 50))
+            result[f"{stage}_p99_ms"] = float(np.percentile(latency, 99))
+        span = float(recent[-1, 0] - recent[0, 0]) if len(recent) > 1 else 0.0
+        result["throughput"] = (len(recent) - 1) / span if span > 0 else 0.0
+        return result
+
+    def status_text(self):
+        stats = self.summary()
+        return (f"Latency p50/p99: {stats['draw_p50_ms']:.0f}/{stats['draw_p99_ms']:.0f} ms  "
+                f"Rate: {stats['throughput']:.1f}/s")
+
+    # Write every completed sample (times in seconds since the monitor started) to a CSV file
+    def dump_csv(self, filename):
+        with self._lock:
+            records = list(self._records)
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow([f"{stage}(s)" for stage in STAGES] +
+                            [f"{stage}_latency(ms)" for stage in STAGES[1:]])
+            for row in records:
+                t_read = row[0]
+                writer.writerow([f"{t - self.start:.6f}" for t in row] +
+                                [f"{(t - t_read) * 1000:.3f}" for t in row[1:]])
+
+
+# Time from a setpoint change until |error| stays below `tolerance` for `hold_samples`
+# consecutive samples (measured to the first of those samples)
+class SettlingTimer:
+    def __init__(self, tolerance=0.02, hold_samples=5, max_records=1000):
+        self.tolerance = tolerance
+        self.hold_samples = hold_samples
+        self.settle_times = deque(maxlen=max_records)
+        self._start = None
+        self._in_band = 0
+        self._first_in_band = None
+
+    @property
+    def settling(self):
+        return self._start is not None
+
+    # A new setpoint was sent at time t (same clock as the samples)
+    def start(self, t):
+        self._start = t
+        self._in_band = 0
+
+    # Feed one sample; returns the settling time once the error has settled, otherwise None
+    def update(self, t, error):
+        if self._start is None:
+            return None
+        if abs(error) >= self.tolerance:
+            self._in_band = 0
+            return None
+        if self._in_band == 0:
+            self._first_in_band = t
+        self._in_band += 1
+        if self._in_band < self.hold_samples:
+            return None
+        settle_time = self._first_in_band - self._start
+        self.settle_times.append(settle_time)
+        self._start = None
+        return settle_time
+
+    @property
+    def last(self):
+        return self.settle_times[-1] if self.settle_times else None
+
+    def status_text(self):
+        if self.settling:
+            return "Settling..."
+        return "Settle: -" if self.last is None else f"Settle: {self.last:.1f} s"
@@ -0,0 +1,302 @@
+# Query the data_log_* archives of "Time & Voltage Data" without opening every file.
+# Each log gets a sidecar data_log_*.idx.json holding its time range, voltage min/max,
+# events and per-block byte offsets (blocks of about 16 kB of complete lines), so a
+# time-window or event query only reads the blocks it needs. Text logs are parsed block
+# by block with data_logger.parse_text_records; .bin logs are read by record offset.
+# Indexes are rebuilt when a log changes; a log that only grew is indexed from its last block.
+#
+# Usage: python log_index.py [folder ...] [--events "Voltage Limit"] [--before 10] [--after 10]
+#                            [--since 2024-05-01] [--until 2024-06-01]
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+from data_logger import RECORD_DTYPE, parse_text_records, read_records
+
+LOG_FOLDER = "Time & Voltage Data"
+INDEX_VERSION = 1
+BLOCK_SIZE = 1 << 14  # Bytes of log per index block (about 500 text samples)
+
+
+# Log files (.txt, .bin, .npz) from files, folders or glob patterns, oldest first.
+# With recursive=True folders are searched with their sub-folders (one per rig of multi_rig_gui.py).
+def find_logs(sources, recursive=False):
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            pattern = os.path.join(source, "**", "data_log_*") if recursive else os.path.join(source, "data_log_*")
+            files.extend(path for path in glob.glob(pattern, recursive=recursive)
+                         if path.endswith((".txt", ".bin", ".npz")) and not path.endswith(".events.txt"))
+        else:
+            files.extend(glob.glob(source) if glob.has_magic(source) else [source])
+    return sorted(files, key=os.path.getmtime)
+
+
+def index_filename(path):
+    root, _ = os.path.splitext(path)
+    return root + ".idx.json"
+
+
+# Wall-clock time the log was started, from its data_log_YYYYMMDD_HHMMSS name
+def _file_start(path):
+    match = re.search(r"(\d{8}_\d{6})", os.path.basename(path))
+    if match:
+        return datetime.datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path))
+
+
+# [byte offset, end, rows, first time, last time, min voltage, max voltage]
+def _block(offset, end, records):
+    if not len(records):
+        return [offset, end, 0, None, None, None, None]
+    times, voltages = records["time"], records["voltage"]
+    return [offset, end, len(records), float(times[0]), float(times[-1]),
+            float(voltages.min()), float(voltages.max())]
+
+
+# (byte offset, end, records, events) for consecutive blocks of complete lines of a text
+# log, starting at byte `start` (0: after the header). A partly written last line is left out.
+def iter_text_blocks(path, start=0, end=None, block_size=BLOCK_SIZE):
+    with open(path, "rb") as file:
+        if start == 0:
+            start = len(file.readline())  # Header
+        offset = start
+        while end is None or offset < end:
+            file.seek(offset)
+            data = file.read(block_size if end is None else min(block_size, end - offset))
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                break
+            records, events = parse_text_records(data[:cut], offset)
+            yield offset, offset + cut, records, events
+            offset += cut
+
+
+# Events of the binary formats, from the data_log_*.events.txt file next to the log
+def _event_file_events(path):
+    root, _ = os.path.splitext(path)
+    events = []
+    try:
+        with open(root + ".events.txt", "rb") as file:
+            offset = len(file.readline())  # Header
+            for line in file:
+                time_text, _, message = line.decode("utf-8", errors="replace").rstrip("\n").partition("\t")
+                try:
+                    events.append([offset, float(time_text), message])
+                except ValueError:
+                    pass
+                offset += len(line)
+    except FileNotFoundError:
+        pass
+    return events
+
+
+# Index one log file; `previous` (an older index of the same file) lets a text log that
+# only grew resume from its last block
+def build_index(path, block_size=BLOCK_SIZE, previous=None):
+    stat = os.stat(path)
+    log_format = os.path.splitext(path)[1].lstrip(".")
+    blocks, events = [], []
+
+    if log_format == "txt":
+        start, last_time = 0, None
+        if (previous and previous.get("version") == INDEX_VERSION and previous.get("format") == log_format
+                and previous["size"] <= stat.st_size and previous["blocks"]):
+            blocks = previous["blocks"][:-1]
+            start = previous["blocks"][-1][0]
+            events = [event for event in previous["events"] if event[0] < start]
+            last_time = next((block[4] for block in reversed(blocks) if block[2]), None)
+        for offset, end, records, block_events in iter_text_blocks(path, start, block_size=block_size):
+            times = records["time"]
+            for row, event_offset, message in block_events:
+                row = min(row, len(times))
+                events.append([event_offset, float(times[row - 1]) if row else last_time, message])
+            blocks.append(_block(offset, end, records))
+            if len(times):
+                last_time = float(times[-1])
+    elif log_format == "bin":
+        records = read_records(path, mmap=True)
+        rows_per_block = max(1, block_size // RECORD_DTYPE.itemsize)
+        for first in range(0, len(records), rows_per_block):
+            chunk = records[first:first + rows_per_block]
+            blocks.append(_block(first * RECORD_DTYPE.itemsize, (first + len(chunk)) * RECORD_DTYPE.itemsize, chunk))
+        events = _event_file_events(path)
+    else:
+        blocks.append(_block(0, stat.st_size, read_records(path)))  # Compressed: read as a whole
+        events = _event_file_events(path)
+
+    filled = [block for block in blocks if block[2]]
+    return {
+        "version": INDEX_VERSION,
+        "file": os.path.basename(path),
+        "format": log_format,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "start": _file_start(path).isoformat(),
+        "rows": sum(block[2] for block in blocks),
+        "t_first": filled[0][3] if filled else None,
+        "t_last": filled[-1][4] if filled else None,
+        "v_min": min(block[5] for block in filled) if filled else None,
+        "v_max": max(block[6] for block in filled) if filled else None,
+        "blocks": blocks,
+        "events": events,
+    }
+
+
+# The sidecar index of a log, rebuilt (and saved) if the log changed since it was written
+def load_index(path, block_size=BLOCK_SIZE, save=True):
+    try:
+        with open(index_filename(path), "r") as file:
+            index = json.load(file)
+    except (FileNotFoundError, ValueError):
+        index = None
+    stat = os.stat(path)
+    if (index and index.get("version") == INDEX_VERSION
+            and index["size"] == stat.st_size and index["mtime"] == stat.st_mtime):
+        return index
+    index = build_index(path, block_size, previous=index)
+    if save:
+        try:
+            with open(index_filename(path), "w") as file:
+                json.dump(index, file)
+        except OSError as e:
+            print(f"Could not save index of {path}: {e}")
+    return index
+
+
+# Samples of one log with t0 <= time <= t1 (None: open end), reading only the overlapping blocks
+def read_window(path, index, t0=None, t1=None):
+    blocks = [block for block in index["blocks"]
+              if block[2] and (t0 is None or block[4] >= t0) and (t1 is None or block[3] <= t1)]
+    if not blocks:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    # Overlapping blocks are consecutive, since the logged time only increases within a file
+    offset, end = blocks[0][0], blocks[-1][1]
+    if index["format"] == "txt":
+        with open(path, "rb") as file:
+            file.seek(offset)
+            records = parse_text_records(file.read(end - offset))[0]
+    elif index["format"] == "bin":
+        records = np.fromfile(path, dtype=RECORD_DTYPE, count=(end - offset) // RECORD_DTYPE.itemsize, offset=offset)
+    else:
+        records = read_records(path)
+    mask = np.ones(len(records), dtype=bool)
+    if t0 is not None:
+        mask &= records["time"] >= t0
+    if t1 is not None:
+        mask &= records["time"] <= t1
+    return records[mask]
+
+
+# The indexed logs of one or more folders. Query times are wall-clock datetimes; the logged
+# times (seconds since the GUI started) are mapped to them through each file's start time.
+class LogArchive:
+    def __init__(self, sources=(LOG_FOLDER,), block_size=BLOCK_SIZE, save_index=True):
+        self.files = find_logs(sources, recursive=True)
+        self.indexes = {path: load_index(path, block_size, save_index) for path in self.files}
+
+    def wall_time(self, path, t):
+        index = self.indexes[path]
+        start = datetime.datetime.fromisoformat(index["start"])
+        if t is None or index["t_first"] is None:
+            return start
+        return start + datetime.timedelta(seconds=t - index["t_first"])
+
+    # Logged time of a wall-clock time in one file (None stays None)
+    def logged_time(self, path, when):
+        index = self.indexes[path]
+        if when is None or index["t_first"] is None:
+            return None
+        start = datetime.datetime.fromisoformat(index["start"])
+        return index["t_first"] + (when - start).total_seconds()
+
+    # Logs with samples between the wall-clock times start and end (None: open end); with
+    # `folder`, only the logs in that folder (one rig)
+    def files_between(self, start=None, end=None, folder=None):
+        files = []
+        for path, index in self.indexes.items():
+            if not index["rows"] or (folder is not None and os.path.dirname(path) != folder):
+                continue
+            first, last = self.wall_time(path, index["t_first"]), self.wall_time(path, index["t_last"])
+            if (start is None or last >= start) and (end is None or first <= end):
+                files.append(path)
+        return files
+
+    # [(path, records)] of every log with samples between start and end
+    def window(self, start=None, end=None, folder=None):
+        result = []
+        for path in self.files_between(start, end, folder):
+            records = read_window(path, self.indexes[path], self.logged_time(path, start), self.logged_time(path, end))
+            if len(records):
+                result.append((path, records))
+        return result
+
+    # [(path, logged time, wall-clock time, message)] of the events matching the regular
+    # expression `pattern` (None: all) between start and end
+    def events(self, pattern=None, start=None, end=None):
+        regex = re.compile(pattern) if pattern else None
+        result = []
+        for path, index in self.indexes.items():
+            for _, t, message in index["events"]:
+                when = self.wall_time(path, t)
+                if ((regex is None or regex.search(message)) and (start is None or when >= start)
+                        and (end is None or when <= end)):
+                    result.append((path, t, when, message))
+        return sorted(result, key=lambda event: event[2])
+
+    # [(path, logged time, wall-clock time, message, records)] with the samples from
+    # `before` seconds before to `after` seconds after every matching event. The samples come
+    # from every log of the event's folder in that window (an event just after a rotation
+    # also gets the end of the previous log), with their times on the event's log's clock.
+    def around_events(self, pattern=None, before=10.0, after=10.0, start=None, end=None):
+        result = []
+        for path, t, when, message in self.events(pattern, start, end):
+            if t is None:
+                records = read_window(path, self.indexes[path])
+            else:
+                parts = []
+                for other, records in self.window(when - datetime.timedelta(seconds=before),
+                                                  when + datetime.timedelta(seconds=after), os.path.dirname(path)):
+                    if other != path:
+                        records = records.copy()
+                        records["time"] += self.logged_time(path, self.wall_time(other, 0.0))
+                    parts.append(records)
+                records = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD_DTYPE)
+            result.append((path, t, when, message, records))
+        return result
+
+    def summary(self):
+        return [{"file": path, "start": index["start"], "rows": index["rows"], "t_first": index["t_first"],
+                 "t_last": index["t_last"], "v_min": index["v_min"], "v_max": index["v_max"],
+                 "events": len(index["events"])} for path, index in self.indexes.items()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the data logs and query them by time or event")
+    parser.add_argument('sources', nargs='*', default=[LOG_FOLDER], help="log files, folders or glob patterns")
+    parser.add_argument('--events', help="regular expression of the events to show, e.g. 'Voltage Limit'")
+    parser.add_argument('--before', type=float, default=10.0, help="seconds of data before each event")
+    parser.add_argument('--after', type=float, default=10.0, help="seconds of data after each event")
+    parser.add_argument('--since', type=datetime.datetime.fromisoformat, help="start, e.g. 2024-05-01")
+    parser.add_argument('--until', type=datetime.datetime.fromisoformat, help="end, e.g. 2024-06-01T12:00")
+    args = parser.parse_args()
+
+    archive = LogArchive(args.sources)
+    if args.events is None:
+        selected = set(archive.files_between(args.since, args.until))
+        for row in archive.summary():
+            if row["file"] in selected:
+                print(f"{row['file']}: {row['start']}, {row['rows']} samples, t {row['t_first']:.2f}-{row['t_last']:.2f} s, "
+                      f"V {row['v_min']:.3f}-{row['v_max']:.3f}, {row['events']} events")
+    else:
+        for path, t, when, message, records in archive.around_events(args.events, args.before, args.after,
+                                                                     args.since, args.until):
+            voltage = (f"V {records['voltage'].min():.3f}-{records['voltage'].max():.3f}" if len(records)
+                       else "no samples")
+            print(f"{when:%Y-%m-%d %H:%M:%S} {os.path.basename(path)} t={t}: {message} "
+                  f"({len(records)} samples, {voltage})")
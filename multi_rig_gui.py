@@ -0,0 +1,220 @@
+# One window for several waveplate rigs: a control row and a plot per rig, all fed by
+# device_manager.DeviceManager. Each rig has its own serial reader, command channel,
+# logger and settings; the GUI thread only drains their buffers on one shared timer and
+# blits the changed lines, so the per-rig cost stays small enough for 8+ rigs.
+#
+# Usage: python multi_rig_gui.py [port ...]   (default: the rigs listed in rigs.json;
+#        'sim://?seed=1' etc. run simulated rigs)
+import sys
+
+import matplotlib
+
+matplotlib.use('Qt5Agg')
+import matplotlib.pyplot as plt
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton
+from PyQt5.QtGui import QDoubleValidator
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from device_manager import DeviceManager
+from history_toolbar import HistoryToolbar
+from plot_renderer import BlitRenderer, stepped_limits
+
+
+# Controls and plot lines of one rig
+class RigPanel:
+    def __init__(self, rig, ax):
+        self.rig = rig
+        self.ax = ax
+        self.line1, = ax.plot([], [], 'ro-', label='Actual Voltage', markersize=2, linewidth=1)
+        self.line2, = ax.plot([], [], 'bo-', label='Setpoint', markersize=2, linewidth=1)
+        ax.set_xlim(0, rig.settings["Sample_time"] * rig.settings["Num_points"] / 1000)
+        ax.set_title(f'{rig.name} ({rig.port_name})', fontsize=8)
+        ax.set_ylabel('Voltage (V)', fontsize=8)
+        ax.tick_params(axis='both', which='major', labelsize=8)
+        ax.grid(True)
+
+        self.layout = QHBoxLayout()
+        name_label = QLabel(rig.name)
+        name_label.setStyleSheet("font-size: 14px; font-weight: bold; min-width: 80px;")
+        self.layout.addWidget(name_label)
+
+        self.enable_button = QPushButton('PID Disabled')
+        self.enable_button.clicked.connect(self.toggle_pid)
+        self.layout.addWidget(self.enable_button)
+
+        self.inputs = {}
+        for param, label, key in (('S', 'Set Point:', "Setpoint"), ('P', 'Kp:', "Kp"),
+                                  ('I', 'Ki:', "Ki"), ('D', 'Kd:', "Kd")):
+            line_edit = QLineEdit(str(rig.settings[key]))
+            line_edit.setStyleSheet("width: 60px;")
+            line_edit.setValidator(QDoubleValidator(0.5, 3.5, 3) if param == 'S' else QDoubleValidator(0.0, 1000.0, 3))
+            line_edit.returnPressed.connect(lambda param=param, line_edit=line_edit:
+                                            rig.set_parameter(param, float(line_edit.text())))
+            self.layout.addWidget(QLabel(label))
+            self.layout.addWidget(line_edit)
+            self.inputs[param] = line_edit
+
+        self.error_label = QLabel('Error: 0.00')
+        self.error_label.setStyleSheet("min-width: 80px;")
+        self.layout.addWidget(self.error_label)
+        self.stats_label = QLabel('Samples: 0')
+        self.stats_label.setStyleSheet("font-size: 12px;")
+        self.layout.addWidget(self.stats_label)
+        self.layout.addStretch()
+
+    def toggle_pid(self):
+        self.rig.set_pid_enabled(not self.rig.pid_enabled)
+        self.show_pid_state()
+
+    def show_pid_state(self):
+        self.enable_button.setText('PID Enabled' if self.rig.pid_enabled else 'PID Disabled')
+        self.enable_button.setStyleSheet('background-color: red;' if self.rig.tripped else '')
+
+    # Points the plot can show without decimation: about one per pixel of the axes
+    def plot_width(self):
+        return max(100, int(self.ax.bbox.width))
+
+    # Draw the part of the long history inside this plot's axis limits (toolbar zoom/pan)
+    def browse(self):
+        t, voltage, setpoint, _ = self.rig.long_history.select(*self.ax.get_xlim(), self.plot_width())
+        self.line1.set_data(t, voltage)
+        self.line2.set_data(t, setpoint)
+
+    # Refresh the labels, lines and axis limits after new samples; returns True if the lines changed.
+    # While browsing the lines show the long history inside the limits the user chose.
+    def update(self, received, blit, browsing=False):
+        rig = self.rig
+        stats = rig.stats()
+        noise = f"{stats['noise'] * 1000:.1f} mV" if stats['noise'] is not None else "-"
+        self.stats_label.setText(f"Samples: {stats['received']}  Dropped: {stats['dropped']}  "
+                                 f"Overrun: {stats['overrun']}  Log dropped: {stats['log_dropped']}  Noise: {noise}  {rig.settling.status_text()}  "
+                                 f"{rig.interlock.status_text()}")
+        self.show_pid_state()
+        if not received:
+            return False
+
+        history = rig.history
+        self.error_label.setText(f'Error: {rig.last_error:.2f}')
+        if browsing:
+            self.browse()  # New samples show up if they are in view
+            return True
+        if len(history) > self.plot_width():
+            # More points than pixels: draw the min/max envelope of the window instead
+            t, voltage, setpoint, _ = rig.long_history.select(history.min('time'), history.max('time'),
+                                                               self.plot_width())
+            self.line1.set_data(t, voltage)
+            self.line2.set_data(t, setpoint)
+        else:
+            self.line1.set_data(history.time, history.voltage)
+            self.line2.set_data(history.time, history.setpoint)
+        min_voltage = history.min('voltage', 'setpoint') - 0.1
+        max_voltage = history.max('voltage', 'setpoint') + 0.1
+        min_time, max_time = history.min('time'), history.max('time')
+        if blit:
+            # Only move the limits (and redraw the background) when the data leaves them
+            ylim = stepped_limits(self.ax.get_ylim(), min_voltage, max_voltage)
+            xlim = stepped_limits(self.ax.get_xlim(), min_time, max_time)
+            if ylim:
+                self.ax.set_ylim(ylim)
+            if xlim:
+                self.ax.set_xlim(xlim)
+        else:
+            self.ax.set_ylim(min_voltage, max_voltage)
+            self.ax.set_xlim(min_time, max_time)
+        return True
+
+
+class MultiRigApp(QWidget):
+    def __init__(self, manager, max_fps=10, render_mode='blit'):
+        super().__init__()
+        self.manager = manager
+        self.max_fps = max_fps
+        self.browsing = False  # True while the toolbar shows zoomed/panned views instead of the live windows
+        self.setWindowTitle(f'PID Control ({len(manager)} rigs)')
+        self.setGeometry(100, 100, 1400, 900)
+
+        main_layout = QVBoxLayout()
+        columns = 1 if len(manager) <= 4 else 2
+        rows = -(-len(manager) // columns)
+        fig, axes = plt.subplots(rows, columns, squeeze=False, figsize=(12, 2 * rows))
+        axes = axes.ravel()
+        for ax in axes[len(manager):]:
+            ax.set_visible(False)
+        self.panels = [RigPanel(rig, ax) for rig, ax in zip(manager, axes)]
+        for panel in self.panels:
+            main_layout.addLayout(panel.layout)
+        fig.tight_layout()
+
+        toolbar_layout = QHBoxLayout()
+        clear_graph_button = QPushButton('Clear Graphs')
+        clear_graph_button.clicked.connect(self.clear_graphs)
+        toolbar_layout.addWidget(clear_graph_button)
+        self.render_label = QLabel('Render: 0.0 ms avg')
+        self.render_label.setStyleSheet("font-size: 12px; margin-left: 10px;")
+        toolbar_layout.addWidget(self.render_label)
+        toolbar_layout.addStretch()
+        main_layout.addLayout(toolbar_layout)
+
+        self.canvas = FigureCanvas(fig)
+        main_layout.addWidget(HistoryToolbar(self.canvas, self, on_browse=self.browse_history, on_home=self.show_live))
+        main_layout.addWidget(self.canvas)
+        self.setLayout(main_layout)
+
+        # One renderer for all rigs: a single capped repaint per frame however many rigs changed
+        artists = [line for panel in self.panels for line in (panel.line1, panel.line2)]
+        self.renderer = BlitRenderer(self.canvas, list(axes[:len(manager)]), artists, max_fps=max_fps,
+                                     blit=(render_mode == 'blit'))
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.on_timer)
+        self.timer.start(max(10, int(1000 / max(max_fps, 1))))
+
+    def on_timer(self):
+        received = self.manager.poll()
+        changed = False
+        for panel in self.panels:
+            changed |= panel.update(received[panel.rig.name], self.renderer.blit, self.browsing)
+        if changed:
+            self.renderer.request()
+        if self.renderer.render():
+            for panel in self.panels:
+                panel.rig.latency.drawn()
+            self.render_label.setText(self.renderer.stats_text())
+
+    # Show every rig's long history inside its plot's current limits (toolbar zoom/pan)
+    def browse_history(self):
+        self.browsing = True
+        for panel in self.panels:
+            panel.browse()
+        self.renderer.request()
+
+    # Back to the scrolling live windows (toolbar Home)
+    def show_live(self):
+        self.browsing = False
+        self.renderer.invalidate()
+
+    def clear_graphs(self):
+        self.browsing = False
+        for panel in self.panels:
+            panel.rig.clear()
+            panel.line1.set_data([], [])
+            panel.line2.set_data([], [])
+        self.renderer.invalidate()
+        self.renderer.render(force=True)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.manager.save(Max_fps=self.max_fps)
+        self.manager.close()
+        super().closeEvent(event)
+
+
+if __name__ == "__main__":
+    manager = DeviceManager.from_config(ports=sys.argv[1:])
+    config = manager.config
+    manager.start()
+    app = QApplication(sys.argv)
+    window = MultiRigApp(manager, max_fps=float(config.get("Max_fps", 10)),
+                         render_mode=config.get("Render_mode", 'blit'))
+    window.show()
+    sys.exit(app.exec_())
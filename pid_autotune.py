@@ -0,0 +1,260 @@
+# Offline PID tuning for FINAL_WAVEPLATE_SCRIPT.ino. A plant model (the cos^2 calibration
+# from step position to voltage, the dead time of every correction and the photodiode noise)
+# is identified from "Time & Voltage Data" logs or a live step test, then a grid of Kp/Ki/Kd
+# candidates is simulated against it all at once with NumPy, replicating the firmware's
+# PID_v1 loop and probing corrections. The best gains can be pushed with the S/P/I/D commands.
+#
+# Usage: python pid_autotune.py [log files or folders...] [--port COM6 [--step-test] [--push]]
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from calibration import CalibrationStore
+from data_logger import read_records
+from log_index import find_logs
+from waveplate_fit import INITIAL_GUESS, model_function
+
+LOG_FOLDER = "Time & Voltage Data"
+PROBE_OVERHEAD = 0.2 + 24 * 0.002  # Settles and steps of the direction probe that an 'X' move skips (s)
+
+
+# Everything the simulator needs to know about one rig
+class PlantModel:
+    def __init__(self, a=1.6, b=600.0, c=0.1, d=50.0, dead_time=0.4, step_time=0.002, noise=0.005,
+                 step_scale=50, tolerance=0.01, output_limit=40):
+        self.a, self.b, self.c, self.d = a, b, c, d  # Voltage = a cos^2(2 pi x / b - d) + c
+        self.dead_time = dead_time  # Motor enable/settle time of a correction (s), excluding the steps
+        self.step_time = step_time  # Time per motor step (s)
+        self.noise = noise  # Standard deviation of the voltage the PID sees (V)
+        self.step_scale = step_scale  # Steps per unit of PID output
+        self.tolerance = tolerance  # The firmware skips the PID inside this error band
+        self.output_limit = output_limit
+
+    @property
+    def params(self):
+        return self.a, self.b, self.c, self.d
+
+    def voltage(self, x):
+        return model_function(x, *self.params)
+
+    # Position on a rising slope where the model gives `voltage`, near the middle of the first period
+    def position_for(self, voltage):
+        fraction = np.clip((voltage - self.c) / self.a, 0.0, 1.0)
+        theta = -np.arccos(np.sqrt(fraction)) + np.pi  # cos^2 rises on (pi/2, pi)
+        return (theta + self.d) * self.b / (2 * np.pi)
+
+    def __repr__(self):
+        return (f"PlantModel(a={self.a:.3f}, b={self.b:.1f}, c={self.c:.3f}, d={self.d:.3f}, "
+                f"dead_time={self.dead_time:.2f} s, noise={1000 * self.noise:.1f} mV)")
+
+
+# Identify the dead time and noise from logged samples. The voltage curve comes from the
+# rig's calibration when there is one, otherwise from the logged voltage range.
+def plant_from_records(records, calibration=None, **kwargs):
+    t = np.asarray(records['time'], dtype=float)
+    v = np.asarray(records['voltage'], dtype=float)
+    s = np.asarray(records['setpoint'], dtype=float)
+
+    # Noise from sample-to-sample differences (robust against the occasional move), but no
+    # less than the quantization noise of the logged resolution
+    steps = np.abs(np.diff(v))
+    noise = 1.4826 * np.median(steps) / np.sqrt(2) if len(v) > 2 else 0.005
+    if np.any(steps > 0):
+        noise = max(noise, np.min(steps[steps > 0]) / np.sqrt(12))
+
+    # Dead time: from each setpoint change to the first clear change of the voltage
+    delays = []
+    for index in np.flatnonzero(np.diff(s) != 0) + 1:
+        threshold = max(5 * noise, 0.02)
+        moved = np.flatnonzero(np.abs(v[index:] - v[index - 1]) > threshold)
+        if len(moved):
+            delays.append(t[index + moved[0]] - t[index])
+    kwargs.setdefault('dead_time', float(np.median(delays)) if delays else 0.4)
+    kwargs.setdefault('noise', float(max(noise, 1e-4)))
+
+    if calibration is not None:
+        a, b, c, d = calibration.params
+    elif len(v):
+        a, b, c, d = np.ptp(v), INITIAL_GUESS[1], np.min(v), INITIAL_GUESS[3]
+    else:
+        a, b, c, d = INITIAL_GUESS
+    return PlantModel(a, b, c, d, **kwargs)
+
+
+def plant_from_logs(sources, calibration=None, **kwargs):
+    files = find_logs(sources)
+    if not files:
+        raise ValueError(f"No log files found in {sources}")
+    records = np.concatenate([read_records(path) for path in files])
+    return plant_from_records(records, calibration, **kwargs)
+
+
+# Live step test through the firmware: with the PID disabled, move `step` steps back and forth
+# and time how long each move takes to show up in the telemetry (a correction also probes,
+# which adds PROBE_OVERHEAD). `measurer` is a calibration_sweep.PortMeasurer, `reader` the
+# SerialReader feeding it.
+def step_test(channel, reader, measurer, calibration=None, step=30, repeats=4, quiet=0.5):
+    channel.send({'E': 0})
+    position, voltage = measurer()
+    delays, noise = [], []
+    for repeat in range(repeats):
+        target = position + (step if repeat % 2 == 0 else -step)
+        reader.buffer.drain()
+        sent = time.monotonic()
+        channel.send({'X': target})
+        _, new_voltage = measurer()
+        samples = reader.buffer.drain()
+        threshold = abs(new_voltage - voltage) / 2
+        for t_read, sample_voltage, _, _ in samples:
+            if abs(sample_voltage - voltage) > threshold:
+                delays.append(t_read - sent - step * 0.002)
+                break
+        time.sleep(quiet)  # Noise of the settled reading
+        settled = [sample_voltage for _, sample_voltage, _, _ in reader.buffer.drain()]
+        if len(settled) > 2:
+            noise.append(np.std(settled))
+        position, voltage = target, new_voltage
+    return PlantModel(*(calibration.params if calibration is not None else INITIAL_GUESS),
+                      dead_time=float(np.median(delays)) + PROBE_OVERHEAD if delays else 0.4,
+                      noise=float(np.median(noise)) if noise else 0.005)
+
+
+# Simulate every (Kp, Ki, Kd) candidate at once on a setpoint step from `low` to `high` and back,
+# replicating the firmware: PID_v1 every sample_time, a probing correction of
+# step_scale * |output| steps that ends dead_time + steps * step_time later, and no new
+# PID computation until it has finished. Returns settling time, overshoot and IAE per candidate.
+def simulate(plant, Kp, Ki, Kd, low=0.8, high=1.2, sample_time=2.0, duration=120.0, dt=0.05, band=0.02, seed=0):
+    Kp, Ki, Kd = (np.asarray(gain, dtype=float) for gain in np.broadcast_arrays(Kp, Ki, Kd))
+    n = Kp.size
+    Kp, Ki, Kd = Kp.ravel(), Ki.ravel(), Kd.ravel()
+    ticks = int(round(duration / dt))
+    half = ticks // 2
+    noise = np.random.default_rng(seed).normal(0.0, plant.noise, ticks)  # Same noise for every candidate
+    limit = plant.output_limit
+
+    x = np.full(n, plant.position_for(low))
+    target = x.copy()
+    move_end = np.zeros(n)
+    next_compute = np.zeros(n)
+    integral = np.zeros(n)
+    last_input = plant.voltage(x)
+    overshoot = np.zeros(n)
+    iae = np.zeros(n)
+    last_outside = np.zeros((2, n))  # Last time outside the band, per half
+
+    for k in range(ticks):
+        t = k * dt
+        setpoint = high if k < half else low
+        arrived = t >= move_end
+        x = np.where(arrived, target, x)
+        true_voltage = plant.voltage(x)
+        measured = true_voltage + noise[k]
+        error = setpoint - measured
+
+        compute = arrived & (t >= next_compute) & (np.abs(error) >= plant.tolerance)
+        if compute.any():
+            integral = np.where(compute, np.clip(integral + Ki * sample_time * error, -limit, limit), integral)
+            output = np.clip(Kp * error + integral - Kd / sample_time * (measured - last_input), -limit, limit)
+            last_input = np.where(compute, measured, last_input)
+            steps = np.round(plant.step_scale * np.abs(output))
+            slope = np.sign(plant.voltage(x + 1) - plant.voltage(x))
+            slope[slope == 0] = 1
+            move = compute & (steps > 0)
+            target = np.where(move, x + np.sign(output) * slope * steps, target)
+            move_end = np.where(move, t + plant.dead_time + steps * plant.step_time, move_end)
+            next_compute = np.where(compute, t + sample_time, next_compute)
+
+        true_error = setpoint - true_voltage
+        iae += np.abs(true_error) * dt
+        direction = 1 if k < half else -1
+        overshoot = np.maximum(overshoot, -direction * true_error)
+        segment = 0 if k < half else 1
+        outside = np.abs(true_error) > band
+        last_outside[segment] = np.where(outside, t - (0 if k < half else half * dt), last_outside[segment])
+
+    span = half * dt
+    settling = last_outside.max(axis=0)
+    settled = settling < span - 5 * sample_time  # Still inside the band well before the next step
+    return pd.DataFrame({
+        "Kp": Kp, "Ki": Ki, "Kd": Kd,
+        "settling_s": np.where(settled, settling, np.inf),
+        "overshoot_pct": 100 * overshoot / abs(high - low),
+        "iae": iae,
+        "settled": settled,
+    })
+
+
+# Search a log-spaced grid of gains; returns every candidate, best first (settled, overshoot
+# within max_overshoot_pct, then shortest settling time and smallest IAE)
+def tune(plant, kp_range=(0.05, 10.0), ki_range=(0.005, 2.0), kd_values=(0.0,), n_grid=30,
+         max_overshoot_pct=10.0, **simulate_kwargs):
+    Kp, Ki, Kd = np.meshgrid(np.geomspace(*kp_range, n_grid), np.geomspace(*ki_range, n_grid), kd_values)
+    results = simulate(plant, Kp, Ki, Kd, **simulate_kwargs)
+    results["acceptable"] = results["settled"] & (results["overshoot_pct"] <= max_overshoot_pct)
+    return results.sort_values(["acceptable", "settling_s", "iae"], ascending=[False, True, True]).reset_index(drop=True)
+
+
+# Push gains (and optionally a setpoint) to the firmware in one acknowledged frame
+def push_gains(channel, Kp, Ki, Kd, setpoint=None):
+    params = {'P': round(float(Kp), 4), 'I': round(float(Ki), 4), 'D': round(float(Kd), 4)}
+    if setpoint is not None:
+        params = {'S': setpoint, **params}
+    return channel.send(params)
+
+
+def _current_settings():
+    try:
+        with open("settings.json", "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the waveplate PID offline from logs or a step test")
+    parser.add_argument('logs', nargs='*', default=[LOG_FOLDER], help="log files, folders or glob patterns")
+    parser.add_argument('--port', default=os.environ.get('WAVEPLATE_PORT', 'COM6'), help="rig (serial port)")
+    parser.add_argument('--step-test', action='store_true', help="identify the plant with a live step test")
+    parser.add_argument('--push', action='store_true', help="send the best gains to the Arduino")
+    parser.add_argument('--max-overshoot', type=float, default=10.0, help="largest acceptable overshoot (%%)")
+    args = parser.parse_args()
+
+    settings = _current_settings()
+    sample_time = settings.get("Sample_time", 2000) / 1000
+    calibration = CalibrationStore().latest(args.port)
+    channel = reader = port = None
+    if args.step_test or args.push:
+        from calibration_sweep import PortMeasurer
+        from command_channel import CommandChannel
+        from serial_reader import SerialReader
+        from simulated_arduino import open_transport
+        port = open_transport(args.port, 9600, timeout=0.5)
+        channel = CommandChannel(port)
+        measurer = PortMeasurer(channel)
+        reader = SerialReader(port, reply_handler=channel.handle_reply, scan_handler=measurer.handle_point)
+        reader.start()
+        time.sleep(2)  # Wait for the Arduino to reset after the port opens
+
+    plant = step_test(channel, reader, measurer, calibration) if args.step_test else plant_from_logs(args.logs, calibration)
+    print(plant)
+    results = tune(plant, max_overshoot_pct=args.max_overshoot, sample_time=sample_time)
+    current = simulate(plant, settings.get("Kp", 0.8), settings.get("Ki", 0.5), settings.get("Kd", 0.0),
+                       sample_time=sample_time).iloc[0]
+
+    print(f"{'Kp':>8} {'Ki':>8} {'Kd':>6} {'settling (s)':>13} {'overshoot (%)':>14} {'IAE':>8}")
+    for _, row in results.head(10).iterrows():
+        print(f"{row.Kp:8.3f} {row.Ki:8.3f} {row.Kd:6.2f} {row.settling_s:13.1f} {row.overshoot_pct:14.1f} {row.iae:8.2f}")
+    print(f"current gains Kp={current.Kp} Ki={current.Ki} Kd={current.Kd}: settling {current.settling_s:.1f} s, "
+          f"overshoot {current.overshoot_pct:.1f}%")
+
+    best = results.iloc[0]
+    if args.push and best.acceptable:
+        ok = push_gains(channel, best.Kp, best.Ki, best.Kd)
+        print("Gains pushed" if ok else "Arduino did not acknowledge the gains")
+    if port is not None:
+        reader.stop()
+        port.close()
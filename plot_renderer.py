@@ -0,0 +1,106 @@
+import time
+
+
+# Return new (low, high) axis limits only when the data no longer fits the current ones,
+# padding by pad_fraction of the data span so the limits (and the background) stay put
+# for a while as the trace scrolls. Returns None when the current limits can be kept.
+def stepped_limits(current, lo, hi, pad_fraction=0.2, min_span=1e-3):
+    span = max(hi - lo, min_span)
+    cur_lo, cur_hi = current
+    fits = cur_lo <= lo and hi <= cur_hi
+    too_loose = (cur_hi - cur_lo) > span * (1 + 2 * pad_fraction) * 2
+    if fits and not too_loose:
+        return None
+    return lo - pad_fraction * span, hi + pad_fraction * span
+
+
+# Redraws the live plot by blitting only the data lines over a cached background.
+# The full figure is only redrawn when the axis limits change (or after a resize /
+# toolbar zoom), and repaints are capped at max_fps however fast samples arrive.
+# ax may also be a list of axes sharing the canvas (one plot per rig).
+class BlitRenderer:
+    def __init__(self, canvas, ax, artists, max_fps=10, blit=True):
+        self.canvas = canvas
+        self.axes = list(ax) if isinstance(ax, (list, tuple)) else [ax]
+        self.ax = self.axes[0]
+        self.artists = list(artists)
+        self.max_fps = max_fps
+        self.blit = blit
+        for artist in self.artists:
+            artist.set_animated(blit)
+
+        self._background = None
+        self._limits = None
+        self._dirty = True
+        self._last_render = 0.0
+
+        # Render-time counters
+        self.full_draws = 0
+        self.blits = 0
+        self.skipped = 0
+        self.total_render_time = 0.0
+        self.last_render_time = 0.0
+
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    # Cache the static background after every full draw, then put the lines back on top
+    def _on_draw(self, event):
+        if not self.blit:
+            return
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._limits = self._current_limits()
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+
+    def _current_limits(self):
+        return tuple((ax.get_xlim(), ax.get_ylim()) for ax in self.axes)
+
+    def set_blit(self, blit):
+        self.blit = blit
+        for artist in self.artists:
+            artist.set_animated(blit)
+        self.invalidate()
+
+    # Mark the data as changed; it will be drawn on the next render() call
+    def request(self):
+        self._dirty = True
+
+    # Force a full redraw on the next render() call
+    def invalidate(self):
+        self._background = None
+        self._dirty = True
+
+    # Draw if there is something new and the frame-rate cap allows it; returns True if drawn
+    def render(self, force=False):
+        now = time.perf_counter()
+        if not self._dirty:
+            return False
+        if not force and self.max_fps and now - self._last_render < 1.0 / self.max_fps:
+            self.skipped += 1
+            return False
+
+        start = time.perf_counter()
+        limits = self._current_limits()
+        if not self.blit or self._background is None or limits != self._limits:
+            self.canvas.draw()
+            self.full_draws += 1
+        else:
+            self.canvas.restore_region(self._background)
+            for artist in self.artists:
+                artist.axes.draw_artist(artist)
+            self.canvas.blit(self.canvas.figure.bbox)
+            self.blits += 1
+
+        self.last_render_time = time.perf_counter() - start
+        self.total_render_time += self.last_render_time
+        self._last_render = now
+        self._dirty = False
+        return True
+
+    def mean_render_ms(self):
+        frames = self.full_draws + self.blits
+        return 1000 * self.total_render_time / frames if frames else 0.0
+
+    def stats_text(self):
+        return (f"Render: {self.mean_render_ms():.1f} ms avg  "
+                f"Full: {self.full_draws}  Blit: {self.blits}  Skipped: {self.skipped}")
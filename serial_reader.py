@@ -0,0 +1,249 @@
+import threading
+import time
+from collections import deque
+
+import serial
+
+from command_channel import is_reply
+from telemetry import (FRAME_SIZE, SYNC, TelemetryDecoder, fault_reports, filter_reports, position_reports, scan_points,
+                       split_frames)
+
+
+# Thread-safe ring buffer of (read time, voltage, setpoint, parse time) samples, times from time.monotonic()
+class SampleRingBuffer:
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._samples = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.overrun_count = 0  # Samples overwritten before the GUI took a snapshot
+
+    def push(self, sample):
+        with self._lock:
+            if len(self._samples) == self.capacity:
+                self.overrun_count += 1
+            self._samples.append(sample)
+
+    # Take every buffered sample in arrival order and empty the buffer
+    def drain(self):
+        with self._lock:
+            samples = list(self._samples)
+            self._samples.clear()
+        return samples
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+# Parse a telemetry line into (voltage, setpoint): FINAL_WAVEPLATE_SCRIPT.ino's
+# "Voltage:2.0100 output:0.30 stepsize:15.00 Error:-0.0100" (Error is setpoint - voltage),
+# a daemon's "Voltage:2.0100 Setpoint:2.0000 Error:-0.0100", or the older sketch's "2.01 2.00"
+def parse_line(line):
+    if line.startswith("Voltage:"):
+        try:
+            fields = dict(token.split(':', 1) for token in line.split())
+            voltage = float(fields['Voltage'])
+            if 'Setpoint' in fields:
+                return voltage, float(fields['Setpoint'])
+            return voltage, voltage + float(fields['Error'])
+        except KeyError as e:
+            raise ValueError(f"Missing field {e} in {line!r}")
+    values = line.split()
+    if len(values) != 2:
+        raise ValueError(f"Expected 2 values, got {len(values)}: {values}")
+    actualVoltage, setpoint = map(float, values)
+    return actualVoltage, setpoint
+
+
+# Parse the firmware's "Filter: N16 L1 A0.30 R20 Q200 interval:20 noise:0.0012" acquisition report
+def parse_filter_report(line):
+    fields = dict(token.split(':') if ':' in token else (token[0], token[1:]) for token in line.split()[1:])
+    return {"oversample": int(fields['N']), "filter": int(fields['L']), "alpha": float(fields['A']),
+            "read_interval": float(fields['interval']), "noise": float(fields['noise'])}
+
+
+# Parse the firmware's "Fault: 1 V:4.123 limit:4.00 clear:3.80 latency_us:1024 now:3.912" interlock
+# report ("now", the current interlock reading, is missing from older firmware)
+def parse_fault_report(line):
+    tokens = line.split()
+    fields = dict(token.split(':') for token in tokens[2:])
+    report = {"latched": tokens[1] == '1', "voltage": float(fields['V']), "trip_level": float(fields['limit']),
+              "clear_level": float(fields['clear']), "latency_us": float(fields['latency_us'])}
+    if 'now' in fields:
+        report["now"] = float(fields['now'])
+    return report
+
+
+# Background thread that continuously drains the serial port into a SampleRingBuffer.
+# Understands both the text telemetry lines and the binary frames of telemetry.py and
+# follows the firmware when it switches between them (text telemetry is pure ASCII,
+# so a 0xA5 sync byte means binary frames have started).
+class SerialReader(threading.Thread):
+    def __init__(self, port, reconnect=None, capacity=10000, parse=parse_line, reconnect_delay=2.0,
+                 reply_handler=None, scan_handler=None, interlock=None):
+        super().__init__(daemon=True)
+        self.port = port
+        self.reconnect = reconnect  # Called with no arguments to reopen the port after an error
+        self.reply_handler = reply_handler  # Receives the firmware's ACK/NAK lines
+        self.scan_handler = scan_handler  # Receives (position, voltage) of every measured scan point
+        self.interlock = interlock  # interlock.Interlock, checked here for every sample before it is buffered
+        self.parse = parse
+        self.reconnect_delay = reconnect_delay
+        self.buffer = SampleRingBuffer(capacity)
+        self.received_count = 0
+        self.dropped_count = 0  # Lines that arrived but could not be parsed
+        self.binary = False  # True while the firmware streams binary telemetry frames
+        self.filter_status = None  # Latest acquisition report (oversampling, filter, noise floor)
+        self.position = None  # Latest step counter reported by the firmware
+        self.decoder = TelemetryDecoder()
+        self._text = b''  # Incomplete text line
+        self._probe = b''  # Bytes received in binary mode without any frame in them
+        self._stop_event = threading.Event()
+
+    @property
+    def overrun_count(self):
+        return self.buffer.overrun_count
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if not (self.port and self.port.is_open):
+                self._reopen()
+                continue
+            try:
+                raw = self.port.read(self.port.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                print(f"Error reading from serial port: {e}")
+                try:
+                    self.port.close()
+                except (serial.SerialException, OSError):
+                    pass
+                self._reopen()
+                continue
+            if not raw:
+                continue  # read() timed out without data
+            self.handle_bytes(raw, time.monotonic())  # Chunk arrival time
+
+    # Feed received bytes through the text or binary telemetry path
+    def handle_bytes(self, chunk, t_read):
+        if not self.binary:
+            self._text += chunk
+            sync = self._text.find(bytes([SYNC]))
+            *lines, rest = (self._text if sync < 0 else self._text[:sync]).split(b'\n')
+            for line in lines:
+                self._handle_line(line.decode('utf-8', errors='replace').rstrip(), t_read)
+            if sync < 0:
+                self._text = rest
+                return
+            # Binary telemetry has started
+            chunk, self._text = self._text[sync:], b''
+            self.binary = True
+            self.decoder.reset()
+
+        frames = self.decoder.decode(chunk)
+        if len(frames):
+            self._probe = b''
+        else:
+            # Back to text telemetry once a couple of frames' worth of bytes had no sync byte
+            self._probe += chunk
+            if len(self._probe) >= 2 * FRAME_SIZE and bytes([SYNC]) not in self._probe:
+                self.binary = False
+                probe, self._probe = self._probe, b''
+                self.handle_bytes(probe, t_read)
+            return
+        telemetry, replies = split_frames(frames)
+        reports = filter_reports(frames)
+        if reports:
+            self.filter_status = reports[-1]
+        positions = position_reports(frames)
+        if positions:
+            self.position = positions[-1]
+        if self.interlock:
+            self.interlock.check_array(telemetry['voltage'], t_read)
+            for report in fault_reports(frames):
+                self.interlock.firmware_fault(report, t_read)
+        if self.scan_handler:
+            for position, voltage in scan_points(frames):
+                self.scan_handler(position, voltage)
+        for line in replies:
+            if self.reply_handler:
+                self.reply_handler(line)
+        t_parse = time.monotonic()
+        for actualVoltage, setpoint in zip(telemetry['voltage'].tolist(), telemetry['setpoint'].tolist()):
+            self.buffer.push((t_read, actualVoltage, setpoint, t_parse))
+        self.received_count += len(telemetry)
+
+    def _handle_line(self, line, t_read):
+        if not line:
+            return
+        if is_reply(line):
+            if self.reply_handler:
+                self.reply_handler(line)
+            return
+        if line.startswith("Scan:"):
+            try:
+                position, voltage = line.split()[1:3]
+                point = int(position), float(voltage)
+            except ValueError:
+                self.dropped_count += 1
+                return
+            if self.scan_handler:
+                self.scan_handler(*point)
+            return
+        if line.startswith("Fault:"):
+            try:
+                report = parse_fault_report(line)
+            except (KeyError, ValueError, IndexError):
+                self.dropped_count += 1
+                return
+            if self.interlock:
+                self.interlock.firmware_fault(report, t_read)
+            return
+        if line.startswith("Position:"):
+            try:
+                self.position = int(line.split()[1])
+            except (IndexError, ValueError):
+                self.dropped_count += 1
+            return
+        if line.startswith("Filter:"):
+            try:
+                self.filter_status = parse_filter_report(line)
+            except (KeyError, ValueError):
+                self.dropped_count += 1
+            return
+        try:
+            actualVoltage, setpoint = self.parse(line)
+        except ValueError as e:
+            self.dropped_count += 1
+            print(f"Error parsing data: {e}")
+            return
+        if self.interlock:
+            self.interlock.check(actualVoltage, t_read)
+        self.received_count += 1
+        self.buffer.push((t_read, actualVoltage, setpoint, time.monotonic()))
+
+    # Attempt to reconnect if the COM port is disconnected
+    def _reopen(self):
+        self.port = self.reconnect() if self.reconnect else None
+        if not (self.port and self.port.is_open):
+            self._stop_event.wait(self.reconnect_delay)
+
+    def stats(self):
+        return {
+            "received": self.received_count,
+            "dropped": self.dropped_count,
+            "overrun": self.overrun_count,
+            "pending": len(self.buffer),
+            "mode": "binary" if self.binary else "text",
+            "crc_errors": self.decoder.crc_errors,
+            "lost_frames": self.decoder.lost_frames,
+            "noise": self.filter_status["noise"] if self.filter_status else None,
+        }
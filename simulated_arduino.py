@@ -0,0 +1,619 @@
+# Software stand-in for the waveplate Arduino (FINAL_WAVEPLATE_SCRIPT.ino).
+# Speaks the same serial command protocol and streams its telemetry ("Voltage:.. output:..
+# stepsize:.. Error:.." lines, or binary frames after 'F1') at a configurable rate, with the
+# photodiode voltage given by the cos^2 model
+# fitted in "Data Analaysis Waveplate.py".
+#
+# Use it in place of a COM port through open_transport():
+#     open_transport('sim://?rate=50&noise=0.005')
+# or expose it on a pseudo-terminal for unmodified serial programs:
+#     python simulated_arduino.py --rate 50
+import argparse
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlparse
+
+import serial
+
+from command_channel import MAX_FRAME_LENGTH, ChecksumError, decode_frame
+from daemon_client import daemon_serial_from_url
+import telemetry
+
+ADC_STEP = 5.0 / 1023.0  # Voltage resolution of analogRead()
+
+
+# Photodiode voltage as a function of the motor step position (same model as the analysis scripts)
+def model_function(x, a, b, c, d):
+    return a * (math.cos(2 * math.pi * x / b - d)) ** 2 + c
+
+
+class WaveplateModel:
+    def __init__(self, a=1.6, b=600.0, c=0.1, d=50.0, noise=0.005, seed=None):
+        self.a, self.b, self.c, self.d = a, b, c, d
+        self.noise = noise  # Standard deviation of the photodiode noise (V)
+        self.offset = 0.0  # Added to every reading, e.g. to simulate a voltage spike
+        self._random = random.Random(seed)
+
+    def voltage(self, position):
+        return model_function(position, self.a, self.b, self.c, self.d)
+
+    # One analogRead() converted to volts: noisy and quantized to 10 bits
+    def read(self, position):
+        v = self.voltage(position) + self.offset + self._random.gauss(0.0, self.noise)
+        counts = min(max(round(v / ADC_STEP), 0), 1023)
+        return counts * ADC_STEP
+
+
+# Step position nearest to `position` where a * cos^2(2 pi x / b - d) + c equals `voltage`
+# (the firmware's feedforwardTarget())
+def model_target(voltage, position, a, b, c, d):
+    fraction = min(max((voltage - c) / a, 0.0), 1.0)
+    phase = math.acos(math.sqrt(fraction))
+    k0 = round((2 * math.pi * position / b - d) / math.pi)
+    candidates = [(sign * phase + k * math.pi + d) * b / (2 * math.pi)
+                  for k in (k0 - 1, k0, k0 + 1) for sign in (-1, 1)]
+    return round(min(candidates, key=lambda x: abs(x - position)))
+
+
+# Emulation of Arduino PID_v1 (DIRECT mode) with its sample-time-scaled gains
+class ArduinoPID:
+    def __init__(self, Kp, Ki, Kd, sample_time_ms, out_min=-40, out_max=40):
+        self.out_min, self.out_max = out_min, out_max
+        self.sample_time_ms = sample_time_ms
+        self.set_tunings(Kp, Ki, Kd)
+        self.output_sum = 0.0
+        self.last_input = None
+        self.last_time = None
+
+    def set_tunings(self, Kp, Ki, Kd):
+        self.Kp, self.Ki, self.Kd = Kp, Ki, Kd
+
+    def set_sample_time(self, sample_time_ms):
+        self.sample_time_ms = sample_time_ms
+
+    # Bumpless restart, as SetMode(AUTOMATIC) does
+    def initialize(self, output, value):
+        self.output_sum = min(max(output, self.out_min), self.out_max)
+        self.last_input = value
+
+    # Returns the new output when a sample period has elapsed, otherwise None
+    def compute(self, now_ms, setpoint, value):
+        if self.last_time is not None and now_ms - self.last_time < self.sample_time_ms:
+            return None
+        sample_s = self.sample_time_ms / 1000.0
+        error = setpoint - value
+        d_input = 0.0 if self.last_input is None else value - self.last_input
+        self.output_sum = min(max(self.output_sum + self.Ki * sample_s * error, self.out_min), self.out_max)
+        output = self.Kp * error + self.output_sum - (self.Kd / sample_s) * d_input
+        self.output = min(max(output, self.out_min), self.out_max)
+        self.last_input = value
+        self.last_time = now_ms
+        return self.output
+
+
+# The firmware's control loop and command handling, advanced explicitly with tick().
+# A correction takes as long as the firmware's motion state machine would; sampling and
+# commands continue meanwhile, but the PID waits for the correction to finish.
+class SimulatedFirmware:
+    PROBE_STEPS = 12  # getMotorDirection() steps forward and back by this much
+    PROBE_DELAY_MS = 400  # Motor settle times of a probe-out, probe-back, move sequence
+    MOVE_DELAY_MS = 200  # Motor settle times of a single move
+    MAX_MODEL_RESIDUAL = 0.2  # Probe instead when the reading is further than this from the model
+    INTERLOCK_INTERVAL_MS = 1  # checkInterlock() reads at most this often (and at most once per tick())
+    TRIP_COUNT = 2  # Consecutive readings above the trip level that latch a fault
+    NOISE_WEIGHT = 0.1  # Weight of the newest reading in the noise floor
+    CONVERSION_MS = 0.112  # Time of one analogRead()
+
+    def __init__(self, model=None, setpoint=2.0, Kp=3.0, Ki=0.3, Kd=0.0, sample_time_ms=2000,
+                 step_scale=50, tolerance=0.01, position=0.0, step_time_ms=2.0):
+        self.model = model or WaveplateModel()
+        self.setpoint = setpoint
+        self.pid = ArduinoPID(Kp, Ki, Kd, sample_time_ms)
+        self.step_scale = step_scale  # Steps per unit of PID output
+        self.tolerance = tolerance
+        self.position = position  # Physical motor step position
+        self.position_offset = 0.0  # Physical position where the firmware's step counter reads 0
+        self.pid_enabled = False
+        self.binary_telemetry = False  # Set by the 'F' command
+        self.telemetry_seq = 0
+        self.control_mode = 0  # 'M': 0 probes for the direction, 1 moves to the model's target
+        self.model_params = [0.0, 0.0, 0.0, 0.0]  # 'a', 'b', 'c', 'd' in the firmware's step counter
+        self.step_time_ms = step_time_ms  # Time the stepper takes per step
+        self.busy_until_ms = 0.0
+        self._motion = None  # (start time, start position, target position) of the move in progress
+        self.now_ms = 0.0  # Time of the last tick()
+        self.measure_request = 0  # 'Y': readings to average for a scan point once the motor is idle
+        self.scan_point = None  # Measured (position, voltage) waiting to be sent
+        self._measure_done_ms = None  # Time the scan point in progress is complete
+        self.moved_steps = 0  # Every step taken, including the probing steps
+        self.oversample = 16  # 'N': conversions averaged per reading
+        self.filter_mode = 0  # 'L': 0 none, 1 IIR, 2 median of the last 5 readings
+        self.filter_alpha = 0.3  # 'A': IIR coefficient
+        self.settling_read_interval_ms = 20  # 'R'
+        self.locked_read_interval_ms = 200  # 'Q'
+        self.read_interval_ms = self.settling_read_interval_ms
+        self.noise_floor = 0.0
+        self._last_read_ms = None
+        self._reset_filter()
+        self.trip_level = 4.0  # 'H'
+        self.clear_level = 3.8  # 'G'
+        self.fault_latched = False
+        self.fault_voltage = 0.0
+        self.interlock_voltage = 0.0
+        self.trip_latency_ms = 0.0
+        self.fault_pending = False  # A fault report waiting to be sent (trip or 'K')
+        self._over_count = 0
+        self._over_since_ms = None
+        self._last_interlock_ms = None
+        self.voltage = self.model.read(self.position)
+        self.output = 0.0
+        self.step_size = 0
+
+    # Apply one line of the serial protocol: a legacy "<command><value>" line (no reply)
+    # or a "!<seq> S2.5 P3*HH" frame, answered with "ACK <seq>" or "NAK <seq> <reason>"
+    def handle_command(self, line):
+        too_long = len(line) > MAX_FRAME_LENGTH  # The firmware drops lines longer than its buffer
+        line = line.strip()
+        if not line:
+            return None
+        if too_long:
+            return f"NAK {line[1:].split(' ', 1)[0].split('*')[0]} length\n" if line.startswith('!') else None
+        if line.startswith('!'):
+            try:
+                seq, params = decode_frame(line)
+            except ChecksumError as e:
+                return f"NAK {e.seq} checksum\n"
+            except ValueError:
+                seq = line[1:].split(' ', 1)[0]
+                return f"NAK {seq} format\n"
+            for command, value in params:
+                self.apply_parameter(command, value)
+            return f"ACK {seq}\n"
+        try:
+            value = float(line[1:])
+        except ValueError:
+            value = 0.0  # String.toDouble() returns 0 for garbage
+        self.apply_parameter(line[0], value)
+        return None
+
+    def apply_parameter(self, command, value):
+        if command == 'S':
+            self.setpoint = value
+        elif command == 'P':
+            self.pid.set_tunings(value, self.pid.Ki, self.pid.Kd)
+        elif command == 'I':
+            self.pid.set_tunings(self.pid.Kp, value, self.pid.Kd)
+        elif command == 'D':
+            self.pid.set_tunings(self.pid.Kp, self.pid.Ki, value)
+        elif command == 'E':
+            self.pid_enabled = value != 0 and not self.fault_latched
+            self.pid.initialize(self.output, self.voltage)
+            if not self.pid_enabled:
+                self.busy_until_ms = 0.0  # stopMotion()
+                self._motion = None
+        elif command == 'T':
+            self.pid.set_sample_time(value)
+        elif command == 'F':
+            self.binary_telemetry = value != 0
+        elif command == 'X':
+            self._update_motion(self.now_ms)
+            if round(value) + self.position_offset != self.position:
+                self._start_motion(self.now_ms + self.MOVE_DELAY_MS / 2, round(value) + self.position_offset)
+        elif command == 'Z':
+            self.position_offset = self.position - round(value)
+        elif command == 'M':
+            self.control_mode = int(value)
+        elif command in 'abcd':
+            self.model_params['abcd'.index(command)] = value
+        elif command == 'N':
+            self.oversample = min(max(int(value), 1), 64)
+            self._reset_filter()
+        elif command == 'L':
+            self.filter_mode = min(max(int(value), 0), 2)
+            self._reset_filter()
+        elif command == 'A':
+            self.filter_alpha = min(max(value, 0.01), 1.0)
+            self._reset_filter()
+        elif command == 'R':
+            self.settling_read_interval_ms = max(int(value), 1)
+        elif command == 'Q':
+            self.locked_read_interval_ms = max(int(value), 1)
+        elif command == 'Y':
+            self.measure_request = min(max(int(value), 1), 64)
+            self._measure_done_ms = None
+        elif command == 'H':
+            self.trip_level = value
+        elif command == 'G':
+            self.clear_level = value
+        elif command == 'K':
+            if value != 0 and self.fault_latched and self.interlock_voltage < self.clear_level:
+                self.fault_latched = False
+                self._over_count = 0
+            self.fault_pending = True
+
+    def _reset_filter(self):
+        self._filtered = None
+        self._median = deque(maxlen=5)
+        self._noise_mean = None
+        self._noise_variance = 0.0
+        self.noise_floor = 0.0
+
+    # Mean of `oversample` conversions at a position
+    def _read_average(self, position):
+        return sum(self.model.read(position) for _ in range(self.oversample)) / self.oversample
+
+    # readSensorVoltage(): oversample, filter, and track the noise floor of the result
+    def read_sensor(self):
+        voltage = sum(self.model.read(self.position) for _ in range(self.oversample)) / self.oversample
+        if self.filter_mode == 1:
+            if self._filtered is not None:
+                voltage = self._filtered + self.filter_alpha * (voltage - self._filtered)
+            self._filtered = voltage
+        elif self.filter_mode == 2:
+            self._median.append(voltage)
+            voltage = sorted(self._median)[len(self._median) // 2]
+        self._update_noise_floor(voltage)
+        return voltage
+
+    # updateNoiseFloor(): exponentially weighted standard deviation of the filtered readings
+    def _update_noise_floor(self, voltage):
+        if self._noise_mean is None:
+            self._noise_mean, self._noise_variance = voltage, 0.0
+        else:
+            delta = voltage - self._noise_mean
+            self._noise_mean += self.NOISE_WEIGHT * delta
+            self._noise_variance = (1 - self.NOISE_WEIGHT) * (self._noise_variance + self.NOISE_WEIGHT * delta * delta)
+        self.noise_floor = math.sqrt(self._noise_variance)
+
+    @property
+    def counter(self):
+        return self.position - self.position_offset
+
+    def model_valid(self):
+        return self.model_params[0] != 0 and self.model_params[1] != 0
+
+    # Move the motor by the PID output in the direction found like getMotorDirection():
+    # step forward, read, step back and compare the errors
+    def _probe_move(self, output, now_ms):
+        self.step_size = round(self.step_scale * abs(output))
+        if self.step_size <= 0:
+            return
+        error_gap = self.setpoint - self.voltage
+        new_gap = self.setpoint - self._read_average(self.position + self.PROBE_STEPS)
+        direction = 1 if new_gap > error_gap else 0
+        if output < 0:
+            direction = 1 - direction
+        target = self.position + (self.step_size if direction == 0 else -self.step_size)
+        self.moved_steps += 2 * self.PROBE_STEPS + self.step_size
+        # The correction starts after the enable settle, the probe moves and their settles
+        self._start_motion(now_ms + 3 * self.PROBE_DELAY_MS / 4 + 2 * self.PROBE_STEPS * self.step_time_ms, target)
+
+    # Move straight to the model's step position for the setpoint (feedforwardTarget())
+    def _feedforward_move(self, now_ms):
+        offset = self.voltage - model_function(self.counter, *self.model_params)
+        target = model_target(self.setpoint - offset, self.counter, *self.model_params)
+        self.step_size = abs(target - self.counter)
+        self.moved_steps += self.step_size
+        self._start_motion(now_ms + self.MOVE_DELAY_MS / 2, target + self.position_offset)
+
+    # Step from the current position to `target` one step every step_time_ms from start_ms,
+    # then settle before the PID may run again
+    def _start_motion(self, start_ms, target):
+        self._motion = (start_ms, self.position, target)
+        self.busy_until_ms = start_ms + abs(target - self.position) * self.step_time_ms + self.MOVE_DELAY_MS / 2
+
+    def _update_motion(self, now_ms):
+        if self._motion is None:
+            return
+        start_ms, origin, target = self._motion
+        steps = min(max(int((now_ms - start_ms) / self.step_time_ms), 0), abs(target - origin))
+        self.position = origin + (steps if target >= origin else -steps)
+        if self.position == target:
+            self._motion = None
+
+    # checkInterlock(): a single conversion against the trip level; latches a fault after
+    # TRIP_COUNT consecutive readings above it
+    def _check_interlock(self, now_ms):
+        if self._last_interlock_ms is not None and now_ms - self._last_interlock_ms < self.INTERLOCK_INTERVAL_MS:
+            return
+        self._last_interlock_ms = now_ms
+        self.interlock_voltage = self.model.read(self.position)
+        if self.interlock_voltage <= self.trip_level:
+            self._over_count = 0
+            return
+        if self._over_count == 0:
+            self._over_since_ms = now_ms
+        self._over_count += 1
+        if self._over_count >= self.TRIP_COUNT and not self.fault_latched:
+            # tripInterlock(): PID off, motion cancelled where it is, motor disabled
+            self.fault_latched = True
+            self.fault_voltage = self.interlock_voltage
+            self.pid_enabled = False
+            self.measure_request = 0
+            self._motion = None
+            self.busy_until_ms = 0.0
+            self.trip_latency_ms = now_ms - self._over_since_ms
+            self.fault_pending = True
+
+    # updateMeasurement(): the scan point's conversions are spread over the loop() iterations
+    # after the motor has settled, so it is sent CONVERSION_MS per conversion later
+    def _update_measurement(self, now_ms):
+        if now_ms < self.busy_until_ms:
+            self._measure_done_ms = None  # The motor moved again: start over once it stops
+            return
+        readings = self.measure_request * self.oversample
+        if self._measure_done_ms is None:
+            self._measure_done_ms = now_ms + readings * self.CONVERSION_MS
+        if now_ms >= self._measure_done_ms:
+            voltage = sum(self.model.read(self.position) for _ in range(readings)) / readings
+            self.scan_point = (round(self.counter), voltage)
+            self.measure_request = 0
+            self._measure_done_ms = None
+
+    # Sample the photodiode and run the PID at time now_ms; returns the measured voltage
+    def tick(self, now_ms):
+        self.now_ms = now_ms
+        self._update_motion(now_ms)
+        self._check_interlock(now_ms)
+        if self.measure_request:
+            self._update_measurement(now_ms)
+        if self._last_read_ms is not None and now_ms - self._last_read_ms < self.read_interval_ms:
+            return self.voltage  # Not time for the next reading yet
+        self._last_read_ms = now_ms
+        self.voltage = self.read_sensor()
+        self.step_size = 0
+        locked = abs(self.setpoint - self.voltage) < self.tolerance
+        self.read_interval_ms = self.locked_read_interval_ms if locked else self.settling_read_interval_ms
+        moving = now_ms < self.busy_until_ms  # Correction still in progress
+        if self.pid_enabled and not moving and abs(self.setpoint - self.voltage) >= self.tolerance:
+            output = self.pid.compute(now_ms, self.setpoint, self.voltage)
+            if output is not None:
+                self.output = output
+                residual = self.voltage - model_function(self.counter, *self.model_params) if self.model_valid() else None
+                if self.control_mode == 1 and residual is not None and abs(residual) <= self.MAX_MODEL_RESIDUAL:
+                    self._feedforward_move(now_ms)
+                else:
+                    self._probe_move(output, now_ms)
+        return self.voltage
+
+    # Telemetry line of the older "arduino script" sketch: "voltage setpoint"
+    def status_line(self):
+        return f"{self.voltage:.2f} {self.setpoint:.2f}\n"
+
+    # Binary telemetry frame (see telemetry.py)
+    def status_frame(self):
+        self.telemetry_seq = (self.telemetry_seq + 1) % 65536
+        return telemetry.encode_frame(telemetry.TELEMETRY, self.telemetry_seq, self.voltage, self.setpoint,
+                                      self.output, self.setpoint - self.voltage, self.step_size)
+
+    # Scan point measured after 'Y' as "Scan: <position> <voltage>" or a binary 'P' frame; None if there is none
+    def take_scan_point(self, binary=False):
+        point, self.scan_point = self.scan_point, None
+        if point is None:
+            return None
+        if binary:
+            return telemetry.encode_frame(telemetry.SCAN_POINT, self.telemetry_seq, point[1], point[0])
+        return f"Scan: {point[0]} {point[1]:.4f}\n"
+
+    # Acquisition report in the firmware's text format (see parse_filter_report())
+    def filter_report_line(self):
+        return (f"Filter: N{self.oversample} L{self.filter_mode} A{self.filter_alpha:.2f} "
+                f"R{self.settling_read_interval_ms} Q{self.locked_read_interval_ms} "
+                f"interval:{self.read_interval_ms} noise:{self.noise_floor:.4f}\n")
+
+    def filter_report_frame(self):
+        return telemetry.encode_filter_report(self.telemetry_seq, self.noise_floor, self.filter_alpha,
+                                              self.oversample, self.read_interval_ms, self.filter_mode)
+
+    # Step counter report as "Position: <steps>" or a binary 'O' frame (sendPositionReport())
+    def position_report(self, binary=False):
+        if binary:
+            return telemetry.encode_frame(telemetry.POSITION, self.telemetry_seq, self.voltage, round(self.counter))
+        return f"Position: {round(self.counter)}\n"
+
+    # Interlock state as "Fault: 1 V:4.123 limit:4.00 clear:3.80 latency_us:1000 now:3.912" (see parse_fault_report())
+    def fault_report_line(self):
+        return (f"Fault: {int(self.fault_latched)} V:{self.fault_voltage:.3f} limit:{self.trip_level:.2f} "
+                f"clear:{self.clear_level:.2f} latency_us:{round(self.trip_latency_ms * 1000)} "
+                f"now:{self.interlock_voltage:.3f}\n")
+
+    def fault_report_frame(self):
+        return telemetry.encode_fault(self.telemetry_seq, self.fault_latched, self.fault_voltage, self.trip_level,
+                                      self.clear_level, self.trip_latency_ms * 1000)
+
+    # The fault report waiting after a trip or 'K', in the telemetry format; None if there is none
+    def take_fault_report(self, binary=False):
+        if not self.fault_pending:
+            return None
+        self.fault_pending = False
+        return self.fault_report_frame() if binary else self.fault_report_line()
+
+    # Telemetry line in FINAL_WAVEPLATE_SCRIPT.ino's verbose format
+    def verbose_line(self):
+        return (f"Voltage:{self.voltage:.4f} output:{self.output:.2f} "
+                f"stepsize:{self.step_size:.2f} Error:{self.setpoint - self.voltage:.4f}\n")
+
+
+# Serial-port-like object backed by a SimulatedFirmware running on a background thread.
+# Implements the parts of serial.Serial used by the scripts.
+class SimulatedSerial:
+    REPORT_INTERVAL = 1.0  # Seconds between acquisition reports
+
+    def __init__(self, firmware=None, rate=10.0, line_format='verbose', timeout=None):
+        self.firmware = firmware or SimulatedFirmware()
+        self.rate = rate  # Telemetry lines per second
+        # 'verbose': FINAL_WAVEPLATE_SCRIPT.ino's sendTelemetry(); 'gui': the older sketch's "voltage setpoint"
+        self.line_format = line_format
+        self.timeout = timeout
+        self.port = 'sim://'
+        self.is_open = True
+        self._rx = bytearray()
+        self._tx = bytearray()
+        self._condition = threading.Condition()
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="simulated-arduino", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_time = time.monotonic()
+        next_report = next_time
+        while self.is_open:
+            now_ms = (time.monotonic() - self._start) * 1000.0
+            with self._condition:
+                self.firmware.tick(now_ms)
+                binary = self.firmware.binary_telemetry
+                for message in (self.firmware.take_fault_report(binary), self.firmware.take_scan_point(binary)):
+                    if message:
+                        self._rx += message if isinstance(message, bytes) else message.encode()
+                report = time.monotonic() >= next_report
+                if report:
+                    next_report += self.REPORT_INTERVAL
+                if binary:
+                    self._rx += self.firmware.status_frame()
+                    if report:
+                        self._rx += self.firmware.filter_report_frame()
+                        self._rx += self.firmware.position_report(binary=True)
+                        if self.firmware.fault_latched:
+                            self._rx += self.firmware.fault_report_frame()
+                else:
+                    line = self.firmware.status_line() if self.line_format == 'gui' else self.firmware.verbose_line()
+                    self._rx += line.encode()
+                    if report:
+                        self._rx += self.firmware.filter_report_line().encode()
+                        self._rx += self.firmware.position_report().encode()
+                        if self.firmware.fault_latched:
+                            self._rx += self.firmware.fault_report_line().encode()
+                self._condition.notify_all()
+            next_time += period
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    @staticmethod
+    def _encode_reply(reply):
+        kind, seq = reply.split()[:2]
+        seq = int(seq) if seq.isdigit() else 0
+        return telemetry.encode_frame(telemetry.ACK if kind == 'ACK' else telemetry.NAK, seq)
+
+    @property
+    def in_waiting(self):
+        with self._condition:
+            return len(self._rx)
+
+    def write(self, data):
+        if not self.is_open:
+            raise serial.SerialException("Attempting to use a port that is not open")
+        with self._condition:
+            self._tx += data
+            while b'\n' in self._tx:
+                line, _, rest = bytes(self._tx).partition(b'\n')
+                self._tx = bytearray(rest)
+                was_binary = self.firmware.binary_telemetry
+                reply = self.firmware.handle_command(line.decode('utf-8', errors='replace'))
+                if reply:
+                    # Replies go out in the telemetry format that was active when the command arrived
+                    self._rx += self._encode_reply(reply) if was_binary else reply.encode()
+                    self._condition.notify_all()
+        return len(data)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._condition:
+            while len(self._rx) < size and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+        return data
+
+    def readline(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._condition:
+            while b'\n' not in self._rx and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            end = self._rx.find(b'\n') + 1 or len(self._rx)
+            data = bytes(self._rx[:end])
+            del self._rx[:end]
+        return data
+
+    def reset_input_buffer(self):
+        with self._condition:
+            self._rx.clear()
+
+    def close(self):
+        with self._condition:
+            self.is_open = False
+            self._condition.notify_all()
+
+
+# Build a SimulatedSerial from a "sim://?rate=50&noise=0.01&format=verbose" URL
+def simulated_serial_from_url(url, timeout=None):
+    query = {key: values[-1] for key, values in parse_qs(urlparse(url).query).items()}
+    model = WaveplateModel(
+        a=float(query.get('a', 1.6)), b=float(query.get('b', 600.0)),
+        c=float(query.get('c', 0.1)), d=float(query.get('d', 50.0)),
+        noise=float(query.get('noise', 0.005)),
+        seed=int(query['seed']) if 'seed' in query else None)
+    firmware = SimulatedFirmware(model, position=float(query.get('position', 0.0)))
+    return SimulatedSerial(firmware, rate=float(query.get('rate', 10.0)),
+                           line_format=query.get('format', 'verbose'), timeout=timeout)
+
+
+# Open a real port, any pyserial URL (e.g. loop://, socket://host:port), the simulator (sim://...)
+# or a rig of a running acquisition_daemon.py (daemon://127.0.0.1:8765/rig0)
+def open_transport(port, baudrate=9600, timeout=None):
+    if port.startswith('sim://'):
+        return simulated_serial_from_url(port, timeout=timeout)
+    if port.startswith('daemon://'):
+        return daemon_serial_from_url(port, timeout=timeout)
+    return serial.serial_for_url(port, baudrate, timeout=timeout)
+
+
+# Serve the simulator on a pseudo-terminal so any serial program can open it by path
+def run_pty(firmware, rate, line_format='verbose'):
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(f"Simulated Arduino on {os.ttyname(slave)}  (Ctrl+C to stop)")
+    sim = SimulatedSerial(firmware, rate=rate, line_format=line_format, timeout=0.05)
+
+    def forward_commands():
+        while sim.is_open:
+            try:
+                data = os.read(master, 1024)
+            except OSError:
+                break
+            sim.write(data)
+
+    threading.Thread(target=forward_commands, daemon=True).start()
+    try:
+        while True:
+            data = sim.readline()
+            if data:
+                os.write(master, data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated waveplate Arduino on a pseudo-terminal")
+    parser.add_argument('--rate', type=float, default=10.0, help="telemetry lines per second")
+    parser.add_argument('--noise', type=float, default=0.005, help="photodiode noise (V)")
+    parser.add_argument('--format', choices=['verbose', 'gui'], default='verbose',
+                        help="text telemetry: the firmware's (verbose) or the older sketch's \"voltage setpoint\" (gui)")
+    parser.add_argument('--position', type=float, default=0.0, help="initial motor step position")
+    args = parser.parse_args()
+    run_pty(SimulatedFirmware(WaveplateModel(noise=args.noise), position=args.position),
+            args.rate, args.format)
@@ -0,0 +1,153 @@
+import struct
+
+import numpy as np
+
+# Binary telemetry frame sent by the firmware after the 'F1' command (little-endian, 24 bytes):
+#   sync 0xA5 | type | seq u16 | voltage f32 | setpoint f32 | output f32 | error f32 | step_size i16 | crc u16
+# type is 'T' for telemetry, 'A' / 'N' for the ACK / NAK of command frame <seq>, and 'R' for the
+# periodic acquisition report, which reuses the layout as
+#   voltage = noise floor (V), setpoint = IIR coefficient, output = oversampling count,
+#   error = current read interval (ms), step_size = filter mode
+# 'P' for a scan point measured after the 'Y' command (voltage, setpoint = step position),
+# 'O' for the periodic step position report (voltage, setpoint = step position), and
+# 'F' for the interlock state: voltage = reading that tripped it, setpoint = trip level,
+#   output = trip latency (us), error = clear level, step_size = 1 while the fault is latched.
+# The CRC is CRC-16/CCITT-FALSE over bytes 1..21 (everything between sync and crc).
+SYNC = 0xA5
+FRAME_SIZE = 24
+FRAME_DTYPE = np.dtype([
+    ('sync', 'u1'), ('type', 'u1'), ('seq', '<u2'),
+    ('voltage', '<f4'), ('setpoint', '<f4'), ('output', '<f4'), ('error', '<f4'),
+    ('step_size', '<i2'), ('crc', '<u2'),
+])
+TELEMETRY, ACK, NAK, FILTER_REPORT, SCAN_POINT, FAULT, POSITION = (ord('T'), ord('A'), ord('N'), ord('R'), ord('P'),
+                                                                  ord('F'), ord('O'))
+_STRUCT = struct.Struct('<BBHffffhH')
+
+
+def _crc_table():
+    table = np.zeros(256, dtype=np.uint16)
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[byte] = crc & 0xFFFF
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+# CRC-16/CCITT-FALSE of each row of a 2-D uint8 array, vectorized across rows
+def crc16_rows(rows):
+    crc = np.full(rows.shape[0], 0xFFFF, dtype=np.uint16)
+    for column in range(rows.shape[1]):
+        index = ((crc >> 8) ^ rows[:, column]).astype(np.uint8)
+        crc = (crc << 8) ^ CRC_TABLE[index]
+    return crc
+
+
+def crc16(data):
+    return int(crc16_rows(np.frombuffer(bytes(data), dtype=np.uint8)[None, :])[0])
+
+
+# Build one frame (used by the simulator and for testing the decoder)
+def encode_frame(frame_type, seq, voltage=0.0, setpoint=0.0, output=0.0, error=0.0, step_size=0):
+    body = _STRUCT.pack(SYNC, frame_type, seq & 0xFFFF, voltage, setpoint, output, error, int(step_size), 0)
+    return body[:-2] + struct.pack('<H', crc16(body[1:-2]))
+
+
+# Incremental decoder: feed it byte chunks as they arrive, get whole frames back as a
+# structured NumPy array. Sync search, CRC check and field extraction are all vectorized;
+# an incomplete frame at the end of a chunk is kept for the next call.
+class TelemetryDecoder:
+    def __init__(self):
+        self._leftover = b''
+        self.frame_count = 0
+        self.crc_errors = 0  # Sync bytes whose frame failed the CRC (includes 0xA5 inside payloads)
+        self.lost_frames = 0  # Gaps in the telemetry sequence numbers
+        self._last_seq = None
+
+    def decode(self, chunk):
+        buffer = self._leftover + bytes(chunk)
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        last_start = len(data) - FRAME_SIZE
+        if last_start < 0:
+            self._leftover = buffer
+            return np.empty(0, dtype=FRAME_DTYPE)
+
+        starts = np.flatnonzero(data[:last_start + 1] == SYNC)
+        rows = data[starts[:, None] + np.arange(FRAME_SIZE)] if len(starts) else np.empty((0, FRAME_SIZE), np.uint8)
+        received_crc = rows[:, 22].astype(np.uint16) | (rows[:, 23].astype(np.uint16) << 8)
+        valid = crc16_rows(rows[:, 1:22]) == received_crc
+        self.crc_errors += int(np.count_nonzero(~valid))
+        starts, rows = starts[valid], rows[valid]
+
+        # Drop CRC-valid matches that overlap the previous frame
+        if len(starts) > 1:
+            keep = np.concatenate(([True], np.diff(starts) >= FRAME_SIZE))
+            starts, rows = starts[keep], rows[keep]
+
+        frames = np.ascontiguousarray(rows).view(FRAME_DTYPE).reshape(-1)
+        end = int(starts[-1]) + FRAME_SIZE if len(starts) else 0
+        self._leftover = buffer[max(end, last_start + 1):]
+
+        telemetry_seq = frames['seq'][frames['type'] == TELEMETRY].astype(np.int64)
+        if len(telemetry_seq):
+            previous = telemetry_seq[:-1] if self._last_seq is None else np.concatenate(([self._last_seq], telemetry_seq[:-1]))
+            current = telemetry_seq[1:] if self._last_seq is None else telemetry_seq
+            self.lost_frames += int(np.sum((current - previous - 1) % 65536))
+            self._last_seq = int(telemetry_seq[-1])
+        self.frame_count += len(frames)
+        return frames
+
+    def reset(self):
+        self._leftover = b''
+        self._last_seq = None
+
+
+# Build an acquisition report frame
+def encode_filter_report(seq, noise, alpha, oversample, read_interval, filter_mode):
+    return encode_frame(FILTER_REPORT, seq, noise, alpha, oversample, read_interval, filter_mode)
+
+
+# Acquisition reports among decoded frames, as dicts like parse_filter_report() in serial_reader.py
+def filter_reports(frames):
+    reports = frames[frames['type'] == FILTER_REPORT]
+    return [{"oversample": int(round(oversample)), "filter": int(mode), "alpha": float(alpha),
+             "read_interval": float(interval), "noise": float(noise)}
+            for noise, alpha, oversample, interval, mode in zip(
+                reports['voltage'], reports['setpoint'], reports['output'], reports['error'], reports['step_size'])]
+
+
+# (position, voltage) of every scan point among decoded frames
+def scan_points(frames):
+    points = frames[frames['type'] == SCAN_POINT]
+    return [(int(round(position)), float(voltage)) for position, voltage in zip(points['setpoint'], points['voltage'])]
+
+
+# Step positions of the position reports among decoded frames
+def position_reports(frames):
+    return [int(round(position)) for position in frames['setpoint'][frames['type'] == POSITION]]
+
+
+# Build an interlock state frame
+def encode_fault(seq, latched, voltage, trip_level, clear_level, latency_us):
+    return encode_frame(FAULT, seq, voltage, trip_level, latency_us, clear_level, int(latched))
+
+
+# Interlock state reports among decoded frames, as dicts like parse_fault_report() in serial_reader.py
+def fault_reports(frames):
+    reports = frames[frames['type'] == FAULT]
+    return [{"latched": bool(latched), "voltage": float(voltage), "trip_level": float(trip_level),
+             "clear_level": float(clear_level), "latency_us": float(latency)}
+            for voltage, trip_level, latency, clear_level, latched in zip(
+                reports['voltage'], reports['setpoint'], reports['output'], reports['error'], reports['step_size'])]
+
+
+# Split decoded frames into telemetry arrays and "ACK <seq>" / "NAK <seq>" reply lines
+def split_frames(frames):
+    telemetry = frames[frames['type'] == TELEMETRY]
+    replies = [f"{'ACK' if frame_type == ACK else 'NAK'} {seq}"
+               for frame_type, seq in zip(frames['type'], frames['seq']) if frame_type in (ACK, NAK)]
+    return telemetry, replies
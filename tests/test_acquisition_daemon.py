@@ -0,0 +1,66 @@
+# acquisition_daemon.py with a simulated rig: settings changed by a client are saved into the
+# configuration, and a GUI attached through daemon:// pushes and logs nothing of its own.
+import json
+import os
+import time
+
+import pytest
+
+from acquisition_daemon import AcquisitionDaemon
+from daemon_client import DaemonClient, daemon_status
+from device_manager import DeviceManager, RigChannel
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    config_file = tmp_path / "rigs.json"
+    config_file.write_text(json.dumps({"Max_fps": 5, "rigs": [
+        {"name": "rig0", "port": "sim://?seed=0&rate=100", "Use_calibration": False, "Setpoint": 1.0},
+        {"name": "spare", "port": "COM9"},
+    ]}))
+    manager = DeviceManager.from_config(str(config_file), ports=["sim://?seed=0&rate=100"],
+                                        data_folder=str(tmp_path / "data"))
+    daemon = AcquisitionDaemon(manager, ("127.0.0.1", 0), config_file=str(config_file))
+    daemon.start()
+    rig = manager["rig0"]
+    while rig.serial_reader.port is None:
+        time.sleep(0.05)
+    yield daemon
+    daemon.stop()
+
+
+def test_set_saves_the_settings(daemon):
+    with DaemonClient(daemon.address) as client:
+        client.set("rig0", S=1.5, N=4)
+    with open(daemon.config_file) as file:
+        config = json.load(file)
+    assert config["Max_fps"] == 5
+    rig, spare = config["rigs"]
+    assert rig["Setpoint"] == 1.5 and rig["Oversample"] == 4
+    assert spare == {"name": "spare", "port": "COM9"}
+    firmware = daemon.manager["rig0"].serial_reader.port.firmware
+    time.sleep(0.2)
+    assert firmware.setpoint == 1.5 and firmware.oversample == 4
+
+
+def test_attached_channel_pushes_and_logs_nothing(daemon, tmp_path):
+    url = f"daemon://127.0.0.1:{daemon.address[1]}/rig0"
+    status = daemon_status(url)
+    assert status["settings"]["Setpoint"] == 1.0
+    firmware = daemon.manager["rig0"].serial_reader.port.firmware
+    folder = tmp_path / "attached"
+    rig = RigChannel(url, url, {**status["settings"], "Kp": 9.0}, data_folder=str(folder), attached=True)
+    rig.start()
+    try:
+        while rig.serial_reader.port is None:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        assert rig.process() > 0
+        assert firmware.pid.Kp != 9.0
+        assert rig.data_logger is None and not os.path.exists(folder)
+
+        rig.set_parameter('S', 1.2)  # Forwarded to the daemon, which remembers it
+        time.sleep(0.5)
+        assert daemon.manager["rig0"].settings["Setpoint"] == 1.2
+    finally:
+        rig.close()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from calibration import Calibration, CalibrationStore
+from device_manager import RigChannel
+from waveplate_fit import model_function
+
+PARAMS = (1.6, 600.0, 0.1, 50.0)
+
+
+@pytest.fixture
+def scan_file(tmp_path):
+    x = np.arange(0, 601, 20)
+    y = model_function(x, *PARAMS) + np.random.default_rng(0).normal(0, 0.005, len(x))
+    path = tmp_path / "scan.txt"
+    np.savetxt(path, np.column_stack((x, y)))
+    return str(path)
+
+
+def test_target_step_inverts_the_model():
+    calibration = Calibration(*PARAMS)
+    for voltage in (0.3, 1.0, 1.5):
+        step = calibration.target_step(voltage, near=250)
+        assert abs(step - 250) <= 600
+        assert calibration.voltage(step) == pytest.approx(voltage, abs=0.02)
+
+
+def test_external_scan_has_no_position_unless_given(tmp_path, scan_file):
+    store = CalibrationStore(str(tmp_path / "calibration.json"))
+    assert store.refresh("COM6", scan_file).position is None
+    assert store.refresh("COM6", scan_file, position=0).position == 0
+    assert [entry["valid"] for entry in store.history("COM6")] == [False, True]
+
+
+def test_set_position_updates_the_newest_valid_calibration(tmp_path):
+    filename = str(tmp_path / "calibration.json")
+    store = CalibrationStore(filename)
+    store.add("COM6", PARAMS, position=10)
+    store.add("COM7", PARAMS, position=20)
+    CalibrationStore(filename).set_position("COM6", 250)  # Another RigChannel's store
+    store.set_position("COM7", 30)
+    reloaded = CalibrationStore(filename)
+    assert reloaded.latest("COM6").position == 250
+    assert reloaded.latest("COM7").position == 30
+
+
+def test_rig_uses_a_calibration_only_with_a_position(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = CalibrationStore()
+    store.add("sim://", PARAMS)
+    rig = RigChannel("rig", "sim://", data_folder=str(tmp_path / "data"))
+    assert rig.calibration is None
+    rig.close()
+
+    store.set_position("sim://", 120)
+    rig = RigChannel("rig", "sim://", data_folder=str(tmp_path / "data"))
+    assert rig.calibration is not None and rig.position == 120
+    assert not rig.calibrated  # Not until the firmware's counter was restored with 'Z'
+    rig.close()
@@ -0,0 +1,43 @@
+# CalibrationSweep against the simulated firmware, in simulated time
+import pytest
+
+from calibration_sweep import CalibrationSweep
+from simulated_arduino import SimulatedFirmware, WaveplateModel
+
+
+# measure(position) through the firmware's 'X' and 'Y' commands, ticking until the point is measured
+class SimulatedMeasurer:
+    def __init__(self, firmware, tick_ms=5):
+        self.firmware = firmware
+        self.tick_ms = tick_ms
+        self.now_ms = 0.0
+
+    def __call__(self, position=None):
+        if position is not None:
+            self.firmware.apply_parameter('X', position)
+        self.firmware.apply_parameter('Y', 4)
+        while self.firmware.scan_point is None:
+            self.now_ms += self.tick_ms
+            self.firmware.tick(self.now_ms)
+        point, self.firmware.scan_point = self.firmware.scan_point, None
+        return point
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sweep_converges_on_the_model(seed):
+    model = WaveplateModel(noise=0.01, seed=seed)
+    result = CalibrationSweep(SimulatedMeasurer(SimulatedFirmware(model))).run()
+    assert result["converged"]
+    assert result["n_points"] <= 120
+    assert result["b"] == pytest.approx(model.b, rel=0.02)
+    assert result["a"] == pytest.approx(model.a, abs=0.05)
+    assert result["c"] == pytest.approx(model.c, abs=0.05)
+
+
+def test_points_come_from_the_firmware():
+    points = []
+    firmware = SimulatedFirmware(WaveplateModel(noise=0.01, seed=0))
+    sweep = CalibrationSweep(SimulatedMeasurer(firmware), on_point=lambda *point: points.append(point))
+    sweep.run()
+    assert points == list(zip(sweep.x, sweep.y))
+    assert sweep.x[-1] == round(firmware.counter)
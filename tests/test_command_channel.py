@@ -0,0 +1,59 @@
+import pytest
+
+from command_channel import (MAX_FRAME_LENGTH, ChecksumError, CommandChannel, checksum, decode_frame, encode_frame,
+                             format_value)
+from simulated_arduino import SimulatedFirmware, SimulatedSerial
+
+
+def test_frame_round_trip():
+    frame = encode_frame(7, {'S': 2.5, 'P': 3.3, 'X': 1200, 'E': 1})
+    assert frame.startswith(b"!7 S2.5 P3.3 X1200 E1*") and frame.endswith(b"\n")
+    assert decode_frame(frame.decode()) == (7, [('S', 2.5), ('P', 3.3), ('X', 1200.0), ('E', 1.0)])
+
+
+def test_checksum_is_xor_of_the_payload():
+    assert checksum("1 S2") == ord('1') ^ ord(' ') ^ ord('S') ^ ord('2')
+    assert encode_frame(1, {'S': 2}) == f"!1 S2*{checksum('1 S2'):02X}\n".encode()
+
+
+def test_corrupted_frame_is_rejected_with_its_seq():
+    frame = encode_frame(42, {'S': 2.5}).decode().replace("S2.5", "S3.5")
+    with pytest.raises(ChecksumError) as error:
+        decode_frame(frame)
+    assert error.value.seq == 42
+
+
+@pytest.mark.parametrize("line", ["S2.5", "!*00", "!1 W5*" + f"{checksum('1 W5'):02X}"])
+def test_malformed_frames(line):
+    with pytest.raises(ValueError):
+        decode_frame(line)
+
+
+def test_unknown_command_is_not_encoded():
+    with pytest.raises(ValueError):
+        encode_frame(1, {'W': 1})
+
+
+def test_values_keep_six_digits():
+    assert format_value(1200.0) == "1200"
+    assert format_value(0.123456789) == "0.123457"
+    assert format_value(-2.5e-7) == "-2.5e-07"
+
+
+def test_frame_longer_than_the_firmware_buffer():
+    params = {command: 0.123456789 for command in "SPIDabcdA"}
+    with pytest.raises(ValueError):
+        encode_frame(9999, params)
+    assert len(encode_frame(9999, {'S': 0.123456789, 'P': 3.3})) <= MAX_FRAME_LENGTH + 1
+
+
+def test_send_is_acknowledged_by_the_simulated_firmware():
+    firmware = SimulatedFirmware()
+    port = SimulatedSerial(firmware, rate=20, timeout=0.1)
+    try:
+        channel = CommandChannel(port, read_replies=True)
+        assert channel.send({'S': 1.25, 'P': 2.0})
+        assert firmware.setpoint == 1.25 and firmware.pid.Kp == 2.0
+        assert channel.acked_count == 1 and channel.failed_count == 0
+    finally:
+        port.close()
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from data_history import DataHistory, MultiResolutionHistory
+
+
+def test_views_hold_the_last_samples_in_order():
+    history = DataHistory(capacity=5)
+    for i in range(12):
+        history.push(i, 10 + i, 2.0, -i)
+    assert len(history) == 5
+    assert history.time.tolist() == [7, 8, 9, 10, 11]
+    assert history.voltage.tolist() == [17, 18, 19, 20, 21]
+    assert np.shares_memory(history.time, history._data)  # A view, not a copy
+
+
+def test_min_max_track_the_window():
+    history = DataHistory(capacity=4)
+    values = [5.0, -3.0, 2.0, 8.0, 1.0, 0.5, 0.7, 0.6]
+    for i, value in enumerate(values):
+        history.push(i, value, 1.0, 0.0)
+        window = values[max(0, i - 3):i + 1]
+        assert history.min('voltage') == min(window) and history.max('voltage') == max(window)
+    assert history.min('voltage', 'setpoint') == 0.5 and history.max('voltage', 'setpoint') == 1.0
+
+
+@pytest.mark.parametrize("capacity", [3, 20])
+def test_resize_keeps_the_newest_samples(capacity):
+    history = DataHistory(capacity=10)
+    for i in range(15):
+        history.push(i, i, 0.0, 0.0)
+    history.resize(capacity)
+    expected = list(range(15))[-min(10, capacity):]
+    assert history.time.tolist() == expected and history.max('voltage') == 14
+    history.clear()
+    assert len(history) == 0 and history.capacity == capacity
+
+
+def long_history(n=5000, **kwargs):
+    history = MultiResolutionHistory(**kwargs)
+    t = np.arange(n) * 0.01
+    voltage = np.sin(t)
+    voltage[n // 3] = 9.0  # One-sample spike
+    for time, value in zip(t, voltage):
+        history.push(time, value, 1.0)
+    return history, t, voltage
+
+
+def test_short_span_is_raw():
+    history, t, voltage = long_history()
+    time, v, setpoint, level = history.select(t[100], t[199], max_points=1000)
+    assert level == 0 and time.tolist() == t[100:200].tolist() and v.tolist() == voltage[100:200].tolist()
+
+
+def test_long_span_keeps_the_envelope():
+    history, t, voltage = long_history()
+    time, v, setpoint, level = history.select(t[0], t[-1], max_points=200)
+    assert level > 0 and len(time) <= 200
+    assert v.max() == 9.0 and v.min() == pytest.approx(voltage.min())  # The spike survives
+    assert time[0] == t[0] and time[-1] <= t[-1]
+
+
+def test_buckets_match_the_raw_samples():
+    history, t, voltage = long_history(n=1000, factor=4, levels=3)
+    level = history.levels[1]  # 16 samples per bucket
+    assert len(level) == 1000 // 16
+    assert level.view('count').tolist() == [16] * len(level)
+    assert level.view('voltage_mean') == pytest.approx(voltage[:len(level) * 16].reshape(-1, 16).mean(axis=1))
+    assert level.view('voltage_max').tolist() == voltage[:len(level) * 16].reshape(-1, 16).max(axis=1).tolist()
+
+
+def test_overwritten_raw_samples_fall_back_to_buckets():
+    history, t, voltage = long_history(raw_capacity=1000, bucket_capacity=1000)
+    time, v, setpoint, level = history.select(t[0], t[500], max_points=1000)
+    assert level > 0 and time[0] == t[0]
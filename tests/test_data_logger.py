@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+import pytest
+
+import data_logger
+from data_logger import (LOGGER_FORMATS, RECORD_DTYPE, AsyncLogger, make_logger, parse_text_records,
+                         read_records)
+
+
+def test_parse_text_records():
+    data = b"0.00\t1.0000\t2.0000\t-1.00\n0.05\t1.5000\t2.0000\t-0.50\n"
+    records, events = parse_text_records(data)
+    assert records.dtype == RECORD_DTYPE
+    assert records['time'].tolist() == [0.0, 0.05]
+    assert records['voltage'].tolist() == [1.0, 1.5]
+    assert events == []
+
+
+def test_events_are_cut_out_with_their_row():
+    data = (b"0.00\t1.0000\t2.0000\t-1.00\n"
+            b"Event: PID Enabled manually\n"
+            b"0.05\t1.5000\t2.0000\t-0.50\n"
+            b"0.10\t1.9000\t2.0000\t-0.10\n"
+            b"Event: Settled at 2.00 V\n")
+    records, events = parse_text_records(data, offset=100)
+    assert len(records) == 3
+    assert [(row, message) for row, _, message in events] == [(1, "PID Enabled manually"), (3, "Settled at 2.00 V")]
+    assert events[0][1] == 100 + data.find(b"Event:")
+
+
+def test_damaged_lines_are_dropped():
+    # A line cut off by a crash and one run into the next: the same count of numbers as two good lines
+    data = (b"0.00\t1.0000\t2.0000\t-1.00\n"
+            b"0.05\t1.50\n"
+            b"Event: Reconnected\n"
+            b"0.10\t1.9000\t2.0000\t-0.10\t0.15 1.0\n"
+            b"0.20\t2.0000\t2.0000\t0.00\n")
+    records, events = parse_text_records(data)
+    assert records['time'].tolist() == pytest.approx([0.0, 0.2])
+    assert [(row, message) for row, _, message in events] == [(1, "Reconnected")]
+
+
+def test_garbled_numbers_are_dropped():
+    records, _ = parse_text_records(b"0.00\t1.0000\t2.0000\t-1.00\n0.0x\t1.0\t2.0\t0.0\n")
+    assert records['time'].tolist() == [0.0]
+
+
+@pytest.mark.parametrize("log_format", sorted(LOGGER_FORMATS))
+def test_round_trip(tmp_path, log_format):
+    logger = make_logger(log_format, str(tmp_path))
+    samples = [(0.05 * i, 2.0 + 0.001 * i, 2.0, 0.001 * i) for i in range(250)]
+    for sample in samples:
+        logger.log(*sample)
+    logger.log_event("Halfway")
+    logger.close()
+    records = read_records(logger.filename)
+    assert len(records) == len(samples)
+    assert records['voltage'] == pytest.approx([sample[1] for sample in samples], abs=1e-4)
+
+
+def test_text_log_read_in_blocks(tmp_path, monkeypatch):
+    logger = make_logger('text', str(tmp_path))
+    for i in range(100):
+        logger.log(0.05 * i, 1.0, 2.0, -1.0)
+    logger.close()
+    with open(logger.filename, "ab") as file:
+        file.write(b"5.00\t1.00")  # Partly written last line
+    monkeypatch.setattr(data_logger, "TEXT_BLOCK_SIZE", 37)  # Blocks end in the middle of lines
+    records = read_records(logger.filename)
+    assert np.allclose(records['time'], 0.05 * np.arange(100))
+
+
+# Logger whose writes wait until released, like a stalled disk
+class StalledLogger:
+    flush_interval = None
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.samples = []
+
+    def log(self, *sample):
+        self.released.wait()
+        self.samples.append(sample)
+
+    def close(self):
+        pass
+
+
+def test_full_queue_drops_after_the_timeout():
+    target = StalledLogger()
+    logger = AsyncLogger(lambda: target, max_queue_size=5, batch_size=1, put_timeout=0.01)
+    for i in range(20):
+        logger.log(i, 1.0, 2.0, -1.0)
+    assert logger.dropped_count > 0
+    target.released.set()
+    logger.close()
+    assert len(target.samples) == 20 - logger.dropped_count
+
+
+def test_full_queue_waits_for_the_writer():
+    target = StalledLogger()
+    target.released.set()
+    logger = AsyncLogger(lambda: target, max_queue_size=2, batch_size=1, put_timeout=5.0)
+    for i in range(200):
+        logger.log(i, 1.0, 2.0, -1.0)
+    logger.close()
+    assert logger.dropped_count == 0 and len(target.samples) == 200
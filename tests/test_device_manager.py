@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from device_manager import DeviceManager
+
+RIGS = [{"name": "a", "port": "sim://?seed=0", "Use_calibration": False},
+        {"name": "b", "port": "sim://?seed=1", "Use_calibration": False, "Setpoint": 1.5}]
+
+
+def load(tmp_path, ports=None):
+    return DeviceManager.from_config(str(tmp_path / "rigs.json"), ports=ports, data_folder=str(tmp_path / "data"))
+
+
+@pytest.mark.parametrize("ports", [None, []])
+def test_save_and_reload_every_configured_rig(tmp_path, ports):
+    (tmp_path / "rigs.json").write_text(json.dumps({"Max_fps": 5, "rigs": RIGS}))
+    manager = load(tmp_path, ports)
+    manager["b"].settings["Setpoint"] = 2.0
+    manager.save(str(tmp_path / "rigs.json"))
+    manager.close()
+
+    config = json.loads((tmp_path / "rigs.json").read_text())
+    assert [rig["name"] for rig in config["rigs"]] == ["a", "b"]
+    assert config["Max_fps"] == 5 and config["rigs"][1]["Setpoint"] == 2.0
+    manager = load(tmp_path, ports)
+    assert [rig.name for rig in manager] == ["a", "b"]
+    manager.close()
+
+
+def test_rigs_not_opened_are_kept(tmp_path):
+    (tmp_path / "rigs.json").write_text(json.dumps({"rigs": RIGS}))
+    manager = load(tmp_path, ["sim://?seed=1"])
+    assert [rig.name for rig in manager] == ["b"]
+    manager.save(str(tmp_path / "rigs.json"))
+    manager.close()
+    config = json.loads((tmp_path / "rigs.json").read_text())
+    assert [rig["name"] for rig in config["rigs"]] == ["b", "a"]
+    assert config["rigs"][1] == RIGS[0]
+
+
+def test_stats_report_dropped_log_samples(tmp_path):
+    (tmp_path / "rigs.json").write_text(json.dumps({"rigs": RIGS[:1]}))
+    manager = load(tmp_path)
+    rig = manager["a"]
+    assert rig.stats()["log_dropped"] == 0
+    rig.data_logger.dropped_count = 3
+    assert rig.stats()["log_dropped"] == 3
+    manager.close()
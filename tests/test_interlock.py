@@ -0,0 +1,192 @@
+# The host Interlock against SimulatedFirmware, in simulated time (1 ms ticks): the firmware's
+# telemetry and fault reports go through the serial reader's parsers into the host interlock,
+# and its on_trip writes 'E0' back, as disable_pid() does on a real port.
+import threading
+import time
+
+import pytest
+
+from command_channel import CommandChannel
+from interlock import Interlock, disable_pid
+from serial_reader import SerialReader, parse_fault_report
+from simulated_arduino import SimulatedFirmware, WaveplateModel, open_transport
+
+REPORT_INTERVAL_MS = 1000  # The firmware repeats its fault report once a second while latched
+
+
+class Bench:
+    def __init__(self, streaming=True):
+        self.firmware = SimulatedFirmware(WaveplateModel(noise=0.003, seed=0), setpoint=1.0, position=100,
+                                          sample_time_ms=200)
+        self.streaming = streaming  # False: no telemetry while latched, only the fault reports
+        self.now_ms = 0.0
+        self.interlock = Interlock(trip_level=4.0, clear_level=3.8, on_trip=self.on_trip,
+                                   clock=lambda: self.now_ms / 1000)
+        self.firmware.apply_parameter('E', 1)
+
+    def on_trip(self, reason):
+        self.firmware.apply_parameter('E', 0)
+
+    def run(self, ms):
+        for _ in range(int(ms)):
+            self.now_ms += 1.0
+            voltage = self.firmware.tick(self.now_ms)
+            if self.streaming or not self.firmware.fault_latched:
+                self.interlock.check(voltage, self.now_ms / 1000)
+            line = self.firmware.take_fault_report()
+            if line is None and self.firmware.fault_latched and self.now_ms % REPORT_INTERVAL_MS == 0:
+                line = self.firmware.fault_report_line()
+            if line:
+                self.interlock.firmware_fault(parse_fault_report(line), self.now_ms / 1000)
+
+    # Offset that puts the photodiode at `voltage` where the motor is
+    def hold(self, voltage):
+        self.firmware.model.offset = voltage - self.firmware.model.voltage(self.firmware.position)
+
+    # What RigChannel.set_pid_enabled(True) does: clear the host fault, then 'K1' and 'E1'
+    def enable(self):
+        if self.interlock.latched and not self.interlock.reset():
+            return False
+        self.firmware.apply_parameter('K', 1)
+        self.firmware.apply_parameter('E', 1)
+        return self.firmware.pid_enabled
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_spike_latches_until_below_clear_level(streaming):
+    bench = Bench(streaming)
+    bench.run(2000)
+    assert not bench.interlock.latched and not bench.firmware.fault_latched
+
+    bench.firmware.model.offset = 5.0
+    bench.run(20)
+    assert bench.firmware.fault_latched
+    assert bench.interlock.latched and bench.interlock.trip_count == 1
+    assert not bench.firmware.pid_enabled and bench.firmware._motion is None
+
+    bench.firmware.apply_parameter('E', 1)
+    assert not bench.firmware.pid_enabled  # 'E1' refused while latched
+    assert not bench.enable()
+
+    # Below the trip level but above the clear level: neither side clears
+    bench.hold(3.9)
+    bench.run(REPORT_INTERVAL_MS)
+    assert not bench.enable()
+    bench.firmware.apply_parameter('K', 1)
+    assert bench.firmware.fault_latched and bench.interlock.latched
+
+    bench.hold(1.0)
+    bench.run(REPORT_INTERVAL_MS)
+    assert bench.enable()
+    assert not bench.interlock.latched and not bench.firmware.fault_latched
+    assert bench.firmware.pid_enabled
+    bench.run(500)
+    assert bench.interlock.trip_count == 1
+
+
+def test_fault_report_carries_the_reading_without_telemetry():
+    bench = Bench(streaming=False)
+    bench.firmware.model.offset = 5.0
+    bench.run(20)
+    bench.hold(1.0)
+    bench.run(10)
+    assert not bench.enable()  # Only the reading at the trip is known so far
+    bench.run(REPORT_INTERVAL_MS)
+    assert bench.interlock.last_voltage < bench.interlock.clear_level
+    assert bench.enable()
+
+
+def test_fault_report_without_reading():
+    interlock = Interlock(clock=lambda: 1.0)
+    interlock.firmware_fault(parse_fault_report("Fault: 1 V:4.500 limit:4.00 clear:3.80 latency_us:2000"), 1.0)
+    assert interlock.latched and interlock.last_voltage is None
+    assert interlock.firmware_latencies[-1] == pytest.approx(0.002)
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize("trip_samples", [1, 3])
+def test_latency_from_the_crossing_sample(trip_samples):
+    clock = Clock(10.0)
+
+    def on_trip(reason):
+        clock.now += 0.0005  # Writing 'E0'
+
+    interlock = Interlock(trip_level=4.0, trip_samples=trip_samples, on_trip=on_trip, clock=clock)
+    interlock.check(2.0, 9.98)
+    for i in range(trip_samples):
+        t_read = 10.0 + 0.02 * i
+        clock.now = t_read + 0.003  # Delivered to the reader 3 ms after it was taken
+        interlock.check(4.5, t_read)
+    assert interlock.latched
+    assert interlock.latencies[-1] == pytest.approx(0.02 * (trip_samples - 1) + 0.0035)
+
+
+def test_firmware_trip_latency_includes_the_firmware():
+    clock = Clock(5.0)
+    interlock = Interlock(clock=clock)
+    report = parse_fault_report("Fault: 1 V:4.500 limit:4.00 clear:3.80 latency_us:1000 now:4.400")
+    clock.now = 5.0005
+    interlock.firmware_fault(report, 5.0)
+    assert interlock.latched and interlock.last_voltage == pytest.approx(4.4)
+    assert interlock.latencies[-1] == pytest.approx(0.0015)
+    assert interlock.firmware_latencies[-1] == pytest.approx(0.001)
+
+
+# Port that fails if two writes overlap
+class CheckingPort:
+    is_open = True
+
+    def __init__(self):
+        self.writes = []
+        self._busy = threading.Lock()
+
+    def write(self, data):
+        assert self._busy.acquire(blocking=False), "overlapping writes"
+        time.sleep(0.0005)
+        self.writes.append(bytes(data))
+        self._busy.release()
+        return len(data)
+
+
+def test_trip_never_writes_inside_a_frame():
+    port = CheckingPort()
+    channel = CommandChannel(port, ack_timeout=0.001, retries=0)
+    trip = disable_pid(lambda: port, channel)
+    for i in range(50):
+        channel.submit({'S': 1.0 + i / 100, 'P': 3.0})
+    for _ in range(20):
+        trip("test")
+    deadline = time.monotonic() + 5
+    while channel.failed_count < 70 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert port.writes.count(b"E0\n") == 20
+    assert all(data.endswith(b"\n") for data in port.writes) and len(port.writes) == 90
+
+
+def test_host_interlock_sees_the_voltage_with_the_pid_off():
+    port = open_transport("sim://?seed=1&rate=50", 9600, timeout=1)
+    firmware = port.firmware
+    firmware.apply_parameter('H', 100.0)  # Firmware interlock out of the way
+    firmware.apply_parameter('E', 0)
+    channel = CommandChannel(port)
+    interlock = Interlock(trip_level=4.0, clear_level=3.8, on_trip=disable_pid(lambda: port, channel))
+    reader = SerialReader(port, reply_handler=channel.handle_reply, interlock=interlock)
+    reader.start()
+    try:
+        time.sleep(0.3)
+        assert not interlock.latched and reader.received_count > 0
+        firmware.model.offset = 5.0
+        deadline = time.monotonic() + 2
+        while not interlock.latched and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert interlock.latched
+    finally:
+        reader.stop()
+        port.close()
@@ -0,0 +1,48 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from log_index import LogArchive, build_index, read_window
+
+HEADER = "Time(s)\tVoltage(V)\tSet Point(V)\t Error\n"
+
+
+def write_log(path, times, events=(), mtime=0):
+    lines = [HEADER]
+    for t in times:
+        lines.append(f"{t:.2f}\t{1.0 + t / 1000:.4f}\t2.0000\t{1.0 - t / 1000:.4f}\n")
+        if round(t, 2) in events:
+            lines.append(f"Event: {events[round(t, 2)]}\n")
+    path.write_text("".join(lines))
+    os.utime(path, (1e9 + mtime, 1e9 + mtime))  # Oldest first by modification time
+
+
+def test_window_reads_only_the_requested_samples(tmp_path):
+    path = tmp_path / "data_log_20240501_120000.txt"
+    write_log(path, np.arange(2000) * 0.05, {10.0: "PID Enabled manually"})
+    index = build_index(str(path), block_size=1024)
+    assert index["rows"] == 2000 and len(index["blocks"]) > 10
+    assert [(t, message) for _, t, message in index["events"]] == [(10.0, "PID Enabled manually")]
+    records = read_window(str(path), index, 30.0, 31.0)
+    assert records["time"] == pytest.approx(np.arange(600, 621) * 0.05)
+
+
+# The second log of a rig starts 100 s after the first, on the same clock (rotated) or
+# on a new one (GUI restarted); the event is 1 s into it
+@pytest.mark.parametrize("second_start", [100.0, 0.0])
+def test_around_events_spans_the_previous_log(tmp_path, second_start):
+    rig, other_rig = tmp_path / "rig", tmp_path / "other"
+    rig.mkdir()
+    other_rig.mkdir()
+    write_log(rig / "data_log_20240501_120000.txt", np.arange(2000) * 0.05, mtime=0)
+    second = second_start + np.arange(2000) * 0.05
+    write_log(rig / "data_log_20240501_120140.txt", second, {round(second_start + 1.0, 2): "Voltage Limit"}, mtime=1)
+    write_log(other_rig / "data_log_20240501_120100.txt", np.arange(2000) * 0.05, mtime=2)
+
+    archive = LogArchive([str(tmp_path)], block_size=1024, save_index=False)
+    (path, t, when, message, records), = archive.around_events("Voltage Limit", before=5.0, after=5.0)
+    assert path.endswith("data_log_20240501_120140.txt") and message == "Voltage Limit"
+    assert when == datetime.datetime(2024, 5, 1, 12, 1, 41)
+    assert records["time"] == pytest.approx(second_start + np.arange(-80, 121) * 0.05)
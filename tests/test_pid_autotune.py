@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from data_logger import RECORD_DTYPE
+from pid_autotune import PlantModel, plant_from_records, push_gains, simulate, tune
+
+
+def test_position_for_inverts_the_voltage_curve():
+    plant = PlantModel()
+    for voltage in (0.3, 0.9, 1.5):
+        assert plant.voltage(plant.position_for(voltage)) == pytest.approx(voltage)
+
+
+def test_plant_from_records_finds_dead_time_and_noise():
+    rng = np.random.default_rng(0)
+    records = np.zeros(2000, dtype=RECORD_DTYPE)
+    records['time'] = np.arange(2000) * 0.05
+    records['setpoint'] = np.where((records['time'] >= 20) & (records['time'] < 60), 1.2, 0.8)
+    moved = (records['time'] >= 20.6) & (records['time'] < 60.6)  # 0.6 s behind the setpoint
+    records['voltage'] = np.where(moved, 1.2, 0.8) + rng.normal(0, 0.004, 2000)
+    plant = plant_from_records(records)
+    assert plant.dead_time == pytest.approx(0.6, abs=0.06)
+    assert plant.noise == pytest.approx(0.004, rel=0.2)
+
+
+def test_vectorized_simulation_matches_single_runs():
+    plant = PlantModel(noise=0.002)
+    Kp, Ki = np.array([0.5, 2.0, 0.0]), np.array([0.1, 0.5, 0.0])
+    results = simulate(plant, Kp, Ki, 0.0, duration=60.0)
+    for i in range(3):
+        single = simulate(plant, Kp[i], Ki[i], 0.0, duration=60.0)
+        assert results.iloc[i][["settling_s", "overshoot_pct", "iae"]].tolist() == \
+            single.iloc[0][["settling_s", "overshoot_pct", "iae"]].tolist()
+    assert not results["settled"].iloc[2]  # No gain: never reaches the setpoint
+
+
+def test_tune_ranks_acceptable_gains_first():
+    results = tune(PlantModel(noise=0.002), n_grid=6, duration=60.0)
+    best = results.iloc[0]
+    assert best["acceptable"] and best["overshoot_pct"] <= 10.0
+    assert results["acceptable"].is_monotonic_decreasing
+    acceptable = results[results["acceptable"]]
+    assert acceptable["settling_s"].is_monotonic_increasing
+
+
+def test_push_gains_sends_one_frame():
+    class Channel:
+        def send(self, params):
+            self.params = params
+            return True
+
+    channel = Channel()
+    assert push_gains(channel, 1.23456, 0.5, 0.0, setpoint=1.1)
+    assert channel.params == {'S': 1.1, 'P': 1.2346, 'I': 0.5, 'D': 0.0}
+    assert list(channel.params) == ['S', 'P', 'I', 'D']
@@ -0,0 +1,47 @@
+import pytest
+
+from serial_reader import SerialReader, parse_fault_report, parse_line
+from simulated_arduino import SimulatedFirmware
+
+
+def test_parse_firmware_telemetry():
+    # FINAL_WAVEPLATE_SCRIPT.ino sendTelemetry(): the setpoint is voltage + error
+    voltage, setpoint = parse_line("Voltage:2.0100 output:0.30 stepsize:15.00 Error:-0.0100")
+    assert voltage == pytest.approx(2.01) and setpoint == pytest.approx(2.0)
+
+
+def test_parse_older_telemetry_formats():
+    assert parse_line("Voltage:1.5000 Setpoint:2.0000 Error:0.5000") == (1.5, 2.0)
+    assert parse_line("2.01 2.00") == (2.01, 2.0)
+
+
+@pytest.mark.parametrize("line", ["Voltage:2.01 output:0.30", "Voltage:x Error:0.1", "2.01", "Setup completed"])
+def test_unparsable_lines(line):
+    with pytest.raises(ValueError):
+        parse_line(line)
+
+
+def test_simulated_firmware_line():
+    firmware = SimulatedFirmware(setpoint=1.25)
+    voltage, setpoint = parse_line(firmware.verbose_line())
+    assert voltage == pytest.approx(firmware.voltage, abs=1e-4)
+    assert setpoint == pytest.approx(1.25, abs=1e-4)
+
+
+def test_reader_buffers_firmware_lines_and_handles_reports():
+    reader = SerialReader(None)
+    reader.handle_bytes(b"Voltage:2.0100 output:0.30 stepsize:15.00 Error:-0.0100\r\n"
+                        b"Filter: N16 L1 A0.30 R20 Q200 interval:20 noise:0.0012\r\n"
+                        b"Position: 250\r\n"
+                        b"Voltage:2.0050 output:0.10 step", 1.0)
+    reader.handle_bytes(b"size:0.00 Error:-0.0050\r\n", 1.1)
+    samples = reader.buffer.drain()
+    assert [(t, round(v, 4), round(s, 4)) for t, v, s, _ in samples] == [(1.0, 2.01, 2.0), (1.1, 2.005, 2.0)]
+    assert reader.position == 250 and reader.filter_status["noise"] == pytest.approx(0.0012)
+    assert reader.dropped_count == 0
+
+
+def test_parse_fault_report():
+    report = parse_fault_report("Fault: 1 V:4.123 limit:4.00 clear:3.80 latency_us:1024 now:3.912")
+    assert report == {"latched": True, "voltage": 4.123, "trip_level": 4.0, "clear_level": 3.8,
+                      "latency_us": 1024.0, "now": 3.912}
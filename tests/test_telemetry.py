@@ -0,0 +1,49 @@
+import numpy as np
+
+import telemetry
+from telemetry import FRAME_SIZE, TELEMETRY, TelemetryDecoder, crc16, encode_frame
+
+
+def test_crc16_ccitt_false():
+    assert crc16(b"123456789") == 0x29B1
+
+
+def test_frame_layout():
+    frame = encode_frame(TELEMETRY, 3, 1.5, 2.0, 0.25, 0.5, -12)
+    assert len(frame) == FRAME_SIZE and frame[0] == telemetry.SYNC and frame[1] == TELEMETRY
+    assert int.from_bytes(frame[-2:], 'little') == crc16(frame[1:-2])
+
+
+def test_decode_across_chunks():
+    stream = b"".join(encode_frame(TELEMETRY, i, 0.1 * i, 2.0) for i in range(10))
+    decoder = TelemetryDecoder()
+    frames = [decoder.decode(stream[i:i + 7]) for i in range(0, len(stream), 7)]
+    frames = np.concatenate(frames)
+    assert frames['seq'].tolist() == list(range(10))
+    assert np.allclose(frames['voltage'], 0.1 * np.arange(10))
+    assert decoder.crc_errors == 0 and decoder.lost_frames == 0
+
+
+def test_corrupted_frame_is_skipped():
+    frames = [bytearray(encode_frame(TELEMETRY, i, 1.0, 2.0)) for i in range(3)]
+    frames[1][6] ^= 0x40  # Flipped bit in the voltage
+    decoder = TelemetryDecoder()
+    decoded = decoder.decode(b"\x00\xa5garbage" + b"".join(frames))
+    assert decoded['seq'].tolist() == [0, 2]
+    assert decoder.crc_errors >= 1
+    assert decoder.lost_frames == 1
+
+
+def test_sync_byte_inside_a_payload():
+    frame = encode_frame(TELEMETRY, 0xA5A5, 1.0, 2.0)
+    decoder = TelemetryDecoder()
+    assert decoder.decode(frame + frame)['seq'].tolist() == [0xA5A5, 0xA5A5]
+
+
+def test_reports_among_frames():
+    decoder = TelemetryDecoder()
+    frames = decoder.decode(telemetry.encode_fault(1, True, 4.2, 4.0, 3.8, 1000)
+                            + encode_frame(telemetry.SCAN_POINT, 1, 1.25, 300))
+    report, = telemetry.fault_reports(frames)
+    assert report["latched"] and report["latency_us"] == 1000
+    assert list(telemetry.scan_points(frames)) == [(300, 1.25)]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from waveplate_fit import batch_fit, estimate_parameters, fit_model, model_function, model_jacobian
+
+TRUE_PARAMS = (1.6, 640.0, 0.1, 0.7)
+
+
+def write_scan(path, params=TRUE_PARAMS, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(0, 1600, 20.0)
+    y = model_function(x, *params) + rng.normal(0, 0.005, len(x))
+    np.savetxt(path, np.column_stack((x, y)), fmt="%.6f")
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_batch_fit_reports_one_row_per_scan(tmp_path, processes):
+    for i in range(3):
+        write_scan(tmp_path / f"scan_{i}.txt", seed=i)
+    (tmp_path / "scan_broken.txt").write_text("not a scan\n")
+    rows = batch_fit(str(tmp_path), processes=processes)
+    assert rows["file"].tolist() == sorted(str(path) for path in tmp_path.glob("*.txt"))
+    good = rows[rows["error"] == ""]
+    assert len(good) == 3 and (good["n_points"] == 80).all()
+    assert good["b"].to_numpy() == pytest.approx(TRUE_PARAMS[1], rel=0.01)
+    broken = rows[rows["error"] != ""]
+    assert broken["file"].str.endswith("scan_broken.txt").all() and np.isnan(broken["a"]).all()
+
+
+def test_jacobian_matches_finite_differences():
+    x = np.linspace(0, 1500, 50)
+    jacobian = model_jacobian(x, *TRUE_PARAMS)
+    for i, step in enumerate((1e-6, 1e-3, 1e-6, 1e-6)):
+        up, down = list(TRUE_PARAMS), list(TRUE_PARAMS)
+        up[i] += step
+        down[i] -= step
+        numeric = (model_function(x, *up) - model_function(x, *down)) / (2 * step)
+        assert jacobian[:, i] == pytest.approx(numeric, rel=1e-5, abs=1e-8)
+
+
+@pytest.mark.parametrize("b", [300.0, 640.0, 1200.0])
+def test_fit_recovers_the_model_without_a_guess(b):
+    params = (1.2, b, 0.2, 1.1)
+    rng = np.random.default_rng(1)
+    x = np.sort(rng.uniform(0, 2000, 120))  # Uneven steps: no FFT estimate
+    y = model_function(x, *params) + rng.normal(0, 0.005, len(x))
+    guess = estimate_parameters(x, y)
+    assert guess[1] == pytest.approx(b, rel=0.05)
+    fitted, _, _ = fit_model(x, y)
+    assert fitted[[0, 1, 2]] == pytest.approx(params[:3], rel=0.02, abs=0.01)
+    assert model_function(x, *fitted) == pytest.approx(model_function(x, *params), abs=0.02)
+
+
+def test_unknown_fit_method():
+    with pytest.raises(ValueError):
+        fit_model(np.arange(10.0), np.ones(10), method='newton')
@@ -0,0 +1,180 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import curve_fit
+
+INITIAL_GUESS = [1.6, 600, 0.1, 50]  # Initial guess for the parameters a, b, c, d
+PARAMETERS = ('a', 'b', 'c', 'd')
+
+
+# Define the new model function
+def model_function(x, a, b, c, d):
+    return a * (np.cos(2 * np.pi * x / b - d))**2 + c
+
+
+# Analytic Jacobian of model_function with respect to (a, b, c, d), shape (len(x), 4)
+def model_jacobian(x, a, b, c, d):
+    x = np.asarray(x, dtype=float)
+    theta = 2 * np.pi * x / b - d
+    sin_2theta = np.sin(2 * theta)
+    return np.column_stack((
+        np.cos(theta)**2,                          # dy/da
+        a * sin_2theta * 2 * np.pi * x / b**2,     # dy/db
+        np.ones_like(x),                           # dy/dc
+        a * sin_2theta,                            # dy/dd
+    ))
+
+
+# Since cos^2(t) = (1 + cos(2t)) / 2, for a known period b the model is linear:
+#   y = alpha + beta * cos(4 pi x / b) + gamma * sin(4 pi x / b)
+# with a = 2 sqrt(beta^2 + gamma^2), d = atan2(gamma, beta) / 2 and c = alpha - a / 2.
+# Solves for all candidate periods at once; returns (params with shape (n, 4), sse with shape (n,)).
+def _linear_solve(x, y, periods):
+    periods = np.atleast_1d(np.asarray(periods, dtype=float))
+    omega_x = 4 * np.pi * x[None, :] / periods[:, None]
+    cos, sin = np.cos(omega_x), np.sin(omega_x)
+
+    # Normal equations of the design matrix [1, cos, sin], one 3x3 system per period
+    n = np.full(len(periods), float(len(x)))
+    sum_c, sum_s = cos.sum(axis=1), sin.sum(axis=1)
+    sum_cc, sum_ss, sum_cs = (cos * cos).sum(axis=1), (sin * sin).sum(axis=1), (cos * sin).sum(axis=1)
+    normal = np.stack((np.stack((n, sum_c, sum_s), -1),
+                       np.stack((sum_c, sum_cc, sum_cs), -1),
+                       np.stack((sum_s, sum_cs, sum_ss), -1)), -2)
+    rhs = np.column_stack((np.full(len(periods), y.sum()), cos @ y, sin @ y))
+    coefficients = np.linalg.solve(normal + 1e-12 * np.eye(3), rhs[..., None])[..., 0]
+    sse = np.maximum(y @ y - np.sum(coefficients * rhs, axis=1), 0.0)
+    alpha, beta, gamma = coefficients.T
+    a = 2 * np.hypot(beta, gamma)
+    d = np.mod(np.arctan2(gamma, beta) / 2, np.pi)
+    params = np.column_stack((a, periods, alpha - a / 2, d))
+    return params, sse
+
+
+# Closed-form a, c and phase d for a known period b; returns (a, b, c, d)
+def fit_fixed_period(x, y, b):
+    params, _ = _linear_solve(np.asarray(x, dtype=float), np.asarray(y, dtype=float), [b])
+    return tuple(params[0])
+
+
+# Period estimate from the FFT peak of uniformly spaced data (None if x is not uniform)
+def fft_period_estimate(x, y):
+    step = np.diff(x)
+    if len(x) < 8 or not np.allclose(step, step[0]) or step[0] == 0:
+        return None
+    spectrum = np.abs(np.fft.rfft(y - np.mean(y)))
+    peak = np.argmax(spectrum[1:]) + 1
+    frequency = peak / (len(x) * abs(step[0]))  # Of cos(2 theta), which repeats twice per period b
+    return 2 / frequency
+
+
+# Data-driven initial guess for (a, b, c, d): scan the period over a log grid (plus the FFT
+# estimate when the steps are uniform), solve a, c, d in closed form for each candidate, and
+# repeat on a finer grid between the neighbours of the best one.
+def estimate_parameters(x, y, n_grid=100, n_refine=32):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    span = np.ptp(x)
+    min_step = np.min(np.diff(np.unique(x))) if len(np.unique(x)) > 1 else 1.0
+    low, high = 4 * min_step, 20 * max(span, min_step)  # cos(2 theta) must be sampled above Nyquist
+    candidates = np.geomspace(low, high, n_grid)
+    fft_period = fft_period_estimate(x, y)
+    if fft_period is not None and low < fft_period < high:
+        candidates = np.append(candidates, fft_period)
+    params, sse = _linear_solve(x, y, candidates)
+    best = np.argmin(sse)
+
+    # Refine between the neighbouring grid points
+    grid = np.sort(candidates)
+    index = np.searchsorted(grid, candidates[best])
+    fine = np.linspace(grid[max(index - 1, 0)], grid[min(index + 1, len(grid) - 1)], n_refine)
+    fine_params, fine_sse = _linear_solve(x, y, fine)
+    if fine_sse.min() < sse[best]:
+        return tuple(fine_params[np.argmin(fine_sse)])
+    return tuple(params[best])
+
+
+# Read a scan file with two columns (step, voltage) separated by whitespace
+def load_scan(file):
+    data = pd.read_csv(file, sep=r'\s+', header=None, usecols=[0, 1], names=['x', 'y'])
+    return data['x'].to_numpy(dtype=float), data['y'].to_numpy(dtype=float)
+
+
+# Fit the model to one scan. method='analytic' starts from estimate_parameters() and uses
+# the analytic Jacobian; method='legacy' is the original fixed guess with finite differences.
+# Returns (params, covariance, number of function evaluations).
+def fit_model(x_data, y_data, method='analytic', initial_guess=INITIAL_GUESS):
+    if method == 'analytic':
+        p0 = estimate_parameters(x_data, y_data)
+        jac = model_jacobian
+    elif method == 'legacy':
+        p0 = initial_guess
+        jac = None
+    else:
+        raise ValueError(f"Unknown fit method {method!r}, expected 'analytic' or 'legacy'")
+    params, params_covariance, infodict, _, _ = curve_fit(
+        model_function, x_data, y_data, p0=p0, jac=jac, full_output=True)
+    return params, params_covariance, int(infodict['nfev'])
+
+
+# Fit one scan and summarise it: fitted parameters, their standard errors and covariance,
+# the mean squared error and the average percent difference between fit and data
+def fit_scan(file, initial_guess=INITIAL_GUESS, method='analytic'):
+    row = {"file": str(file)}
+    try:
+        x_data, y_data = load_scan(file)
+        params, params_covariance, nfev = fit_model(x_data, y_data, method, initial_guess)
+    except (OSError, ValueError, RuntimeError) as e:  # Unreadable file or fit that did not converge
+        row.update({name: np.nan for name in PARAMETERS})
+        row.update({"covariance": None, "mse": np.nan, "percent_error": np.nan, "n_points": 0, "nfev": 0,
+                    "error": str(e)})
+        return row
+
+    y_fitted = model_function(x_data, *params)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_difference = np.abs((y_fitted - y_data) / y_data) * 100
+    row.update(dict(zip(PARAMETERS, params)))
+    row.update({f"{name}_err": err for name, err in zip(PARAMETERS, np.sqrt(np.diag(params_covariance)))})
+    row.update({
+        "covariance": params_covariance,
+        "mse": float(np.mean((y_fitted - y_data)**2)),
+        "percent_error": float(np.mean(percent_difference)),
+        "n_points": len(x_data),
+        "nfev": nfev,
+        "error": "",
+    })
+    return row
+
+
+# Expand a directory, glob pattern or list of either into a sorted list of scan files
+def find_scans(sources, pattern="*.txt"):
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    files = []
+    for source in sources:
+        source = str(source)
+        if os.path.isdir(source):
+            files.extend(glob.glob(os.path.join(source, pattern)))
+        elif glob.has_magic(source):
+            files.extend(glob.glob(source))
+        else:
+            files.append(source)
+    return sorted(files)
+
+
+# Fit every scan in parallel across a process pool and return one row per file.
+# Each worker loads, fits and discards its own scan, so only the summaries are kept.
+def batch_fit(sources, pattern="*.txt", initial_guess=INITIAL_GUESS, processes=None, chunksize=4, method='analytic'):
+    files = find_scans(sources, pattern)
+    if processes == 1 or len(files) <= 1:
+        rows = [fit_scan(file, initial_guess, method) for file in files]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            rows = list(pool.map(fit_scan, files, [initial_guess] * len(files), [method] * len(files),
+                                 chunksize=chunksize))
+    return pd.DataFrame(rows, columns=[
+        "file", *PARAMETERS, *(f"{name}_err" for name in PARAMETERS),
+        "covariance", "mse", "percent_error", "n_points", "nfev", "error"])